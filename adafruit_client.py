@@ -0,0 +1,358 @@
+"""
+Adafruit IO Client
+Pooled, rate-limited and circuit-broken HTTP access to Adafruit IO feeds
+"""
+
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import fcntl
+except ImportError:  # Windows: the rate budget is only shared within a process
+    fcntl = None
+
+try:
+    import httpx
+except ImportError:  # only needed by the async (ASGI) serving mode
+    httpx = None
+
+from metrics import observe_adafruit
+from structured_log import add_span
+
+RETRYABLE_STATUS = {500, 502, 503, 504}
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Requests-per-minute budget shared by every worker process on this host.
+
+    The bucket state lives in a small file guarded by flock, so all gunicorn
+    workers draw from one quota instead of each assuming they own it.
+    """
+
+    def __init__(self, rate_per_minute, burst, path):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _update(self, change):
+        """Apply `change(tokens, paused_until, now)` to the shared state atomically"""
+        with self._lock, open(self.path, 'a+') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                now = time.time()
+                try:
+                    tokens, updated, paused_until = (float(part) for part in f.read().split())
+                except ValueError:
+                    tokens, updated, paused_until = float(self.burst), now, 0.0
+                tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+                tokens, paused_until, result = change(tokens, paused_until, now)
+                f.seek(0)
+                f.truncate()
+                f.write(f"{tokens} {now} {paused_until}")
+                f.flush()
+                return result
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def take(self):
+        """Take one token if available; returns 0.0 or the seconds until one is"""
+        def take(tokens, paused_until, now):
+            if now < paused_until:
+                return tokens, paused_until, paused_until - now
+            if tokens >= 1:
+                return tokens - 1, paused_until, 0.0
+            return tokens, paused_until, (1 - tokens) / self.rate
+
+        return self._update(take)
+
+    def acquire(self, max_wait=0.0):
+        """Take one token, waiting up to `max_wait` seconds; returns False if none came"""
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.take()
+            if wait == 0.0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop every worker from calling upstream for `seconds` (after a 429)"""
+        self._update(lambda tokens, paused_until, now: (0.0, max(paused_until, now + seconds), None))
+
+    def available(self):
+        return self._update(lambda tokens, paused_until, now: (tokens, paused_until, round(tokens, 2)))
+
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream failures instead of waiting on timeouts.
+
+    closed -> open after `failure_threshold` consecutive failures; after
+    `reset_timeout` seconds one trial call is let through (half-open) and its
+    outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._trial_in_flight = False
+            if self.state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def release(self):
+        """Give back a half-open trial slot that was not used for a call"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    log.warning('Adafruit IO circuit opened', extra={'failures': self.failures})
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class AdafruitClient:
+    """Thin Adafruit IO REST client used by the web app.
+
+    Reads (`get_last`) are idempotent and retried with jittered exponential
+    backoff; writes (`send`) are sent once so a command is never duplicated.
+    Both return None/False on failure like the original helpers did.
+    """
+
+    def __init__(self, username, key, timeout=5.0, pool_size=8, retries=2, backoff=0.25,
+                 rate_per_minute=60, burst=10, write_wait=2.0,
+                 breaker_threshold=5, breaker_reset=30.0, bucket_path=None,
+                 api_url='https://io.adafruit.com/api/v2'):
+        self.base_url = f'{api_url}/{username}'
+        self.key = key or ''
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.write_wait = write_wait
+
+        # Keep-alive session shared by every Adafruit IO call in this worker
+        self.session = requests.Session()
+        self.session.headers.update({'X-AIO-Key': self.key})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        bucket_path = bucket_path or os.path.join(tempfile.gettempdir(), f'adafruit-io-{username}.bucket')
+        self.bucket = TokenBucket(rate_per_minute, burst, bucket_path)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+
+        self._lock = threading.Lock()
+        self.counters = {
+            'requests': 0,
+            'retries': 0,
+            'errors': 0,
+            'throttled': 0,
+            'rate_limited': 0,
+            'circuit_rejected': 0
+        }
+        self.latency_ms = {'last': 0.0, 'total': 0.0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _request(self, method, path, max_wait, **kwargs):
+        """One guarded HTTP call.
+
+        Returns (response, transient): response is None when the call was not
+        made or failed, transient is True when retrying could help.
+        """
+        if not self.breaker.allow():
+            self._count('circuit_rejected')
+            return None, False
+        if not self.bucket.acquire(max_wait):
+            self._count('rate_limited')
+            self.breaker.release()
+            return None, False
+
+        self._count('requests')
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}', timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            return self._record(method, path, started, error=e)
+        return self._record(method, path, started, response)
+
+    def _record(self, method, path, started, response=None, error=None):
+        """Update latency, counters, breaker and rate budget after a call"""
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.latency_ms['last'] = round(elapsed, 2)
+            self.latency_ms['total'] += elapsed
+        add_span('adafruit', elapsed, f'{method} {path}')
+        observe_adafruit(method, 'error' if error is not None else response.status_code, elapsed / 1000)
+
+        if error is not None:
+            self._count('errors')
+            self.breaker.record_failure()
+            log.warning('Adafruit IO call failed', extra={'method': method, 'path': path, 'error': str(error)})
+            return None, True
+
+        if response.status_code == 429:
+            self._count('throttled')
+            retry_after = response.headers.get('Retry-After')
+            self.bucket.pause(float(retry_after) if retry_after and retry_after.isdigit() else 60.0)
+            self.breaker.record_success()
+        elif response.status_code in RETRYABLE_STATUS:
+            self._count('errors')
+            self.breaker.record_failure()
+            return response, True
+        else:
+            self.breaker.record_success()
+        return response, False
+
+    def get_last(self, feed_key):
+        """Fetch the latest value of a feed (None if unavailable)"""
+        for attempt in range(self.retries + 1):
+            response, transient = self._request('GET', f'/feeds/{feed_key}/data/last', max_wait=0.0)
+            if response is not None and response.status_code == 200:
+                return response.json()
+            if not transient or attempt == self.retries:
+                if response is not None:
+                    log.warning('Adafruit IO feed read failed', extra={'feed': feed_key, 'status': response.status_code})
+                return None
+            self._count('retries')
+            # Full jitter: sleep a random time up to the exponential step
+            time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+        return None
+
+    def send(self, feed_key, value):
+        """Post a value to a feed; returns True if Adafruit IO accepted it"""
+        response, _ = self._request(
+            'POST', f'/feeds/{feed_key}/data',
+            max_wait=self.write_wait,
+            json={'value': str(value)}
+        )
+        return response is not None and response.status_code == 200
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            requests_made = counters['requests']
+            latency = {
+                'last': self.latency_ms['last'],
+                'avg': round(self.latency_ms['total'] / requests_made, 2) if requests_made else 0.0
+            }
+        return {
+            **counters,
+            'latency_ms': latency,
+            'circuit': self.breaker.state,
+            'tokens_available': self.bucket.available()
+        }
+
+
+class AsyncAdafruitClient:
+    """asyncio counterpart of AdafruitClient for the ASGI serving mode.
+
+    Shares the sync client's rate budget, circuit breaker and counters, so
+    both serving paths in one process see the same upstream state.
+    """
+
+    def __init__(self, client, max_connections=100):
+        if httpx is None:
+            raise RuntimeError('Async mode requires the httpx package')
+        self.client = client
+        self.http = httpx.AsyncClient(
+            base_url=client.base_url,
+            headers={'X-AIO-Key': client.key},
+            timeout=client.timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+    async def _acquire(self, max_wait):
+        deadline = time.monotonic() + max_wait
+        while True:
+            # take() holds a flock and does file I/O, so it runs off the event loop
+            wait = await asyncio.to_thread(self.client.bucket.take)
+            if wait == 0.0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    async def _request(self, method, path, max_wait, **kwargs):
+        client = self.client
+        if not client.breaker.allow():
+            client._count('circuit_rejected')
+            return None, False
+        if not await self._acquire(max_wait):
+            client._count('rate_limited')
+            client.breaker.release()
+            return None, False
+
+        client._count('requests')
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            return client._record(method, path, started, error=e)
+        return client._record(method, path, started, response)
+
+    async def get_last(self, feed_key):
+        """Fetch the latest value of a feed (None if unavailable)"""
+        for attempt in range(self.client.retries + 1):
+            response, transient = await self._request('GET', f'/feeds/{feed_key}/data/last', max_wait=0.0)
+            if response is not None and response.status_code == 200:
+                return response.json()
+            if not transient or attempt == self.client.retries:
+                if response is not None:
+                    log.warning('Adafruit IO feed read failed', extra={'feed': feed_key, 'status': response.status_code})
+                return None
+            self.client._count('retries')
+            await asyncio.sleep(random.uniform(0, self.client.backoff * (2 ** attempt)))
+        return None
+
+    async def send(self, feed_key, value):
+        """Post a value to a feed; returns True if Adafruit IO accepted it"""
+        response, _ = await self._request(
+            'POST', f'/feeds/{feed_key}/data',
+            max_wait=self.client.write_wait,
+            json={'value': str(value)}
+        )
+        return response is not None and response.status_code == 200
+
+    async def aclose(self):
+        await self.http.aclose()
@@ -0,0 +1,444 @@
+"""
+Alert Engine
+Threshold and anomaly rules evaluated on sensor readings as they are ingested
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from series_format import EPOCH, ONE_SECOND
+
+try:
+    import fcntl
+except ImportError:  # without flock every worker would evaluate; see AlertFollower
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# Used when ALERT_RULES is not set
+DEFAULT_RULES = [
+    {'name': 'temperature-high', 'sensor': 'temperature', 'kind': 'threshold', 'above': 35, 'for': 60},
+    {'name': 'temperature-low', 'sensor': 'temperature', 'kind': 'threshold', 'below': 5, 'for': 300},
+    {'name': 'temperature-rate', 'sensor': 'temperature', 'kind': 'rate', 'limit': 5, 'per': 300},
+    {'name': 'temperature-anomaly', 'sensor': 'temperature', 'kind': 'zscore', 'limit': 4, 'window': 900},
+    {'name': 'humidity-high', 'sensor': 'humidity', 'kind': 'threshold', 'above': 85, 'for': 300},
+    {'name': 'humidity-anomaly', 'sensor': 'humidity', 'kind': 'zscore', 'limit': 4, 'window': 900},
+]
+
+
+class RollingWindow:
+    """Readings from the last `seconds`, with a running sum and sum of squares.
+
+    Each reading is appended once and expired once, so keeping the mean and
+    standard deviation current costs O(1) amortised per reading. Sums are
+    kept relative to the first value seen, which keeps the variance accurate
+    for readings far from zero.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.points = deque()  # (ts, value)
+        self._shift = None
+        self._sum = 0.0
+        self._sum_sq = 0.0
+
+    def __len__(self):
+        return len(self.points)
+
+    def expire(self, ts):
+        """Drop readings older than `seconds` before `ts`"""
+        while self.points and self.points[0][0] <= ts - self.seconds:
+            _, value = self.points.popleft()
+            delta = value - self._shift
+            self._sum -= delta
+            self._sum_sq -= delta * delta
+        if not self.points:
+            # Start the sums afresh rather than carry rounding error forward
+            self._shift = None
+            self._sum = self._sum_sq = 0.0
+
+    def append(self, ts, value):
+        if self._shift is None:
+            self._shift = value
+        delta = value - self._shift
+        self.points.append((ts, value))
+        self._sum += delta
+        self._sum_sq += delta * delta
+
+    def oldest(self):
+        return self.points[0]
+
+    def mean(self):
+        return self._shift + self._sum / len(self.points)
+
+    def std(self):
+        count = len(self.points)
+        if count < 2:
+            return 0.0
+        variance = (self._sum_sq - self._sum * self._sum / count) / (count - 1)
+        return max(variance, 0.0) ** 0.5
+
+
+class Rule:
+    """One named condition on one sensor.
+
+    `breach(ts, value)` returns a description while the condition holds and
+    None otherwise. A rule fires once when its condition starts to hold and
+    re-arms when it clears; a condition that returns within `cooldown`
+    seconds of the last alert is not reported again.
+    """
+
+    kind = None
+
+    def __init__(self, name, sensor, cooldown=300):
+        self.name = name
+        self.sensor = sensor
+        self.cooldown = cooldown
+        self.reset()
+
+    def reset(self):
+        self.active = False
+        self.last_fired = None
+
+    def breach(self, ts, value):
+        raise NotImplementedError
+
+    def check(self, ts, value):
+        """Evaluate one reading; returns an alert description or None"""
+        detail = self.breach(ts, value)
+        if detail is None:
+            self.active = False
+            return None
+        if self.active:
+            return None
+        self.active = True
+        if self.last_fired is not None and ts - self.last_fired < self.cooldown:
+            return None
+        self.last_fired = ts
+        return detail
+
+    def describe(self):
+        return {'name': self.name, 'sensor': self.sensor, 'kind': self.kind, 'cooldown': self.cooldown}
+
+
+class ThresholdRule(Rule):
+    """Value above `above` (or below `below`) for at least `duration` seconds"""
+
+    kind = 'threshold'
+
+    def __init__(self, name, sensor, above=None, below=None, duration=0, cooldown=300):
+        if above is None and below is None:
+            raise ValueError(f"rule {name!r} needs 'above' or 'below'")
+        self.above = above
+        self.below = below
+        self.duration = duration
+        super().__init__(name, sensor, cooldown)
+
+    def reset(self):
+        super().reset()
+        self.since = None
+
+    def breach(self, ts, value):
+        if self.above is not None and value > self.above:
+            bound = f"above {self.above:g}"
+        elif self.below is not None and value < self.below:
+            bound = f"below {self.below:g}"
+        else:
+            self.since = None
+            return None
+        if self.since is None:
+            self.since = ts
+        if ts - self.since < self.duration:
+            return None
+        return f"{self.sensor} {value:g} {bound} for {ts - self.since:.0f}s"
+
+    def describe(self):
+        return {**super().describe(), 'above': self.above, 'below': self.below, 'for': self.duration}
+
+
+class RateRule(Rule):
+    """Value changed by more than `limit` within the last `per` seconds"""
+
+    kind = 'rate'
+
+    def __init__(self, name, sensor, limit, per=60, cooldown=300):
+        self.limit = limit
+        self.per = per
+        super().__init__(name, sensor, cooldown)
+
+    def reset(self):
+        super().reset()
+        self.window = RollingWindow(self.per)
+
+    def breach(self, ts, value):
+        self.window.expire(ts)
+        detail = None
+        if self.window:
+            first_ts, first_value = self.window.oldest()
+            change = value - first_value
+            if abs(change) > self.limit:
+                direction = 'rose' if change > 0 else 'fell'
+                detail = (f"{self.sensor} {direction} {abs(change):.2f} to {value:g} in {ts - first_ts:.0f}s "
+                          f"(limit {self.limit:g} per {self.per:g}s)")
+        self.window.append(ts, value)
+        return detail
+
+    def describe(self):
+        return {**super().describe(), 'limit': self.limit, 'per': self.per}
+
+
+class ZScoreRule(Rule):
+    """Value more than `limit` standard deviations from the mean of the last `window` seconds"""
+
+    kind = 'zscore'
+
+    def __init__(self, name, sensor, limit=4, window=900, min_samples=30, cooldown=300):
+        self.limit = limit
+        self.window_seconds = window
+        self.min_samples = min_samples
+        super().__init__(name, sensor, cooldown)
+
+    def reset(self):
+        super().reset()
+        self.window = RollingWindow(self.window_seconds)
+
+    def breach(self, ts, value):
+        self.window.expire(ts)
+        detail = None
+        # Scored against the window before the reading joins it
+        if len(self.window) >= self.min_samples:
+            std = self.window.std()
+            if std > 1e-9:
+                mean = self.window.mean()
+                score = (value - mean) / std
+                if abs(score) > self.limit:
+                    detail = (f"{self.sensor} {value:g} is {score:+.1f} standard deviations from "
+                              f"the {self.window_seconds:g}s mean {mean:.2f}")
+        self.window.append(ts, value)
+        return detail
+
+    def describe(self):
+        return {**super().describe(), 'limit': self.limit, 'window': self.window_seconds,
+                'min_samples': self.min_samples}
+
+
+RULE_KINDS = {'threshold': ThresholdRule, 'rate': RateRule, 'zscore': ZScoreRule}
+
+
+def build_rules(specs):
+    """Rules from a list of dicts such as DEFAULT_RULES (e.g. parsed from ALERT_RULES)"""
+    rules = []
+    for spec in specs:
+        spec = dict(spec)
+        kind = spec.pop('kind', None)
+        if kind not in RULE_KINDS:
+            raise ValueError(f"unknown rule kind {kind!r}; expected one of {', '.join(RULE_KINDS)}")
+        if 'for' in spec:
+            spec['duration'] = spec.pop('for')
+        spec.setdefault('name', f"{spec.get('sensor')}-{kind}")
+        rules.append(RULE_KINDS[kind](**spec))
+    return rules
+
+
+def to_seconds(timestamp):
+    return (timestamp - EPOCH) / ONE_SECOND
+
+
+class AlertEngine:
+    """Evaluates rules against each accepted reading, in arrival order.
+
+    Every rule keeps only its own rolling state, so a reading costs O(1) per
+    rule and history is never re-read. State lives in this process, so the
+    engine must see every reading of a sensor: AlertFollower feeds it from
+    sensor_data in the one worker that holds the follower lock.
+
+    `on_alert(alert)` is called outside the lock for every alert fired.
+    Readings older than the newest one already seen for their sensor
+    (retries, backfills) are skipped so they cannot rewind the windows.
+    """
+
+    def __init__(self, rules, on_alert, history=100):
+        self.rules = list(rules)
+        self.on_alert = on_alert
+        self.history = history
+        self._by_sensor = {}
+        for rule in self.rules:
+            self._by_sensor.setdefault(rule.sensor, []).append(rule)
+        self._init_state()
+        os.register_at_fork(after_in_child=self._init_state)
+
+    def _init_state(self):
+        # Also run in a forked child: windows start empty in every worker
+        self._lock = threading.Lock()
+        self._latest = {}  # sensor -> newest reading time evaluated
+        self._recent = deque(maxlen=self.history)
+        self.counters = {'evaluated': 0, 'out_of_order': 0, 'fired': 0, 'notify_errors': 0}
+        for rule in self.rules:
+            rule.reset()
+
+    def horizon(self):
+        """Seconds of history the rules need to rebuild their state"""
+        seconds = [0]
+        for rule in self.rules:
+            seconds.append(getattr(rule, 'duration', 0))
+            seconds.append(getattr(rule, 'per', 0))
+            seconds.append(getattr(rule, 'window_seconds', 0))
+        return max(seconds)
+
+    def evaluate(self, rows):
+        """Run the rules over (timestamp, sensor_type, value, unit) rows"""
+        rows = [row for row in rows if row[1] in self._by_sensor]
+        if not rows:
+            return []
+
+        alerts = []
+        with self._lock:
+            for timestamp, sensor, value, *_ in sorted(rows, key=lambda row: row[0]):
+                ts = to_seconds(timestamp)
+                latest = self._latest.get(sensor)
+                if latest is not None and ts <= latest:
+                    self.counters['out_of_order'] += 1
+                    continue
+                self._latest[sensor] = ts
+                self.counters['evaluated'] += 1
+                value = float(value)
+                for rule in self._by_sensor[sensor]:
+                    detail = rule.check(ts, value)
+                    if detail is not None:
+                        alerts.append({
+                            'rule': rule.name,
+                            'kind': rule.kind,
+                            'sensor': sensor,
+                            'value': value,
+                            'timestamp': timestamp.isoformat(),
+                            'details': f"{rule.name}: {detail}"
+                        })
+            self.counters['fired'] += len(alerts)
+            self._recent.extend(alerts)
+
+        for alert in alerts:
+            try:
+                self.on_alert(alert)
+            except Exception:
+                with self._lock:
+                    self.counters['notify_errors'] += 1
+                log.exception('Alert notification failed', extra={'rule': alert['rule']})
+        return alerts
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counters,
+                'rules': [rule.describe() for rule in self.rules],
+                'active': [rule.name for rule in self.rules if rule.active],
+                'recent': list(self._recent)[::-1]
+            }
+
+
+class AlertFollower:
+    """Feeds an AlertEngine every reading that reaches PostgreSQL, in one worker per host.
+
+    Readings arrive through whichever worker (or host, or sync_data.py)
+    accepted them, so the engine follows sensor_data instead. The first
+    worker to take the flock on `lock_path` keeps it for its lifetime; the
+    others retry every `interval` seconds and take over if it exits. A new
+    leader rebuilds the rule windows from the last `engine.horizon()`
+    seconds, then follows sensor_data.id.
+
+    `load(after_id, since, limit)` and `load_window(since, after, limit)`
+    have the HotStore contract. Alerts re-fired while rebuilding carry the
+    same timestamp and details, so the security_events key discards them.
+    """
+
+    def __init__(self, engine, load, load_window, lock_path, interval=2.0,
+                 batch_size=10000, id_overlap=5000):
+        self.engine = engine
+        self.load = load
+        self.load_window = load_window
+        self.lock_path = lock_path
+        self.interval = interval
+        self.batch_size = batch_size
+        self.id_overlap = id_overlap
+        self._init_state()
+        os.register_at_fork(after_in_child=self._init_state)
+
+    def _init_state(self):
+        # Also run in a forked child: the thread and the lock stay with the parent
+        self._lock = threading.Lock()
+        self._thread = None
+        self.leader = False
+        self.last_id = None
+        self.counters = {'rows_followed': 0, 'follow_errors': 0}
+
+    def start(self):
+        if not self.engine.rules:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='alert-follower', daemon=True)
+                    self._thread.start()
+
+    def _evaluate(self, rows):
+        self.engine.evaluate([(timestamp, sensor, value, None) for _, timestamp, sensor, value in rows])
+        with self._lock:
+            self.counters['rows_followed'] += len(rows)
+        return max(row[0] for row in rows)
+
+    def catch_up(self):
+        """Rebuild the windows (first call) or evaluate rows past the last id seen"""
+        since = datetime.now() - timedelta(seconds=self.engine.horizon())
+        if self.last_id is None:
+            after, last_id = None, 0
+            while True:
+                rows = self.load_window(since, after, self.batch_size)
+                if not rows:
+                    break
+                last_id = max(last_id, self._evaluate(rows))
+                after = (rows[-1][1], rows[-1][0])
+                if len(rows) < self.batch_size:
+                    break
+            self.last_id = last_id
+            return
+
+        # Re-read a few ids back: ids from concurrent transactions can commit
+        # out of order, and rows already evaluated are skipped as out of order
+        after_id = max(0, self.last_id - self.id_overlap)
+        while True:
+            rows = self.load(after_id, since, self.batch_size)
+            if not rows:
+                break
+            self.last_id = max(self.last_id, self._evaluate(rows))
+            after_id = rows[-1][0]
+            if len(rows) < self.batch_size:
+                break
+
+    def _run(self):
+        lock_file = open(self.lock_path, 'a') if fcntl else None
+        while True:
+            try:
+                if not self.leader:
+                    self.leader = lock_file is None or self._try_lock(lock_file)
+                if self.leader:
+                    self.catch_up()
+            except Exception as e:
+                with self._lock:
+                    self.counters['follow_errors'] += 1
+                log.warning('Alert follower failed', extra={'error': str(e)})
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _try_lock(lock_file):
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, 'leader': self.leader, 'last_id': self.last_id}
@@ -1,11 +1,48 @@
-from flask import Flask, render_template, request, jsonify
-from datetime import datetime
-import requests
+from flask import Flask, Response, render_template, request, jsonify
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+import asyncio
+import atexit
+import base64
+import contextvars
+import csv
+import hmac
+import io
+import json
+import logging
+import math
 import os
+import queue
+import tempfile
+import threading
+import time
 from dotenv import load_dotenv
-import psycopg
+from psycopg.errors import InvalidColumnReference
 from psycopg.rows import dict_row
-import traceback
+from psycopg_pool import ConnectionPool
+
+from adafruit_client import AdafruitClient
+from alert_engine import DEFAULT_RULES, AlertEngine, AlertFollower, build_rules
+from batch_writer import BatchWriter
+from command_queue import TERMINAL_STATES, CommandQueue
+from db_schema import SECURITY_EVENTS_KEY, STAGING_SQL
+from downsample import DOWNSAMPLE_METHODS, bucket_width, lttb
+from hot_store import HotStore
+from metrics import ENABLED as METRICS_ENABLED, StatsExporter, observe_request, render_metrics
+from ingest import IngestError, decode_body, parse_readings
+from response_cache import ResponseCache
+from structured_log import configure_logging, current_timings, span, start_request
+from series_format import (
+    BINARY_MIMETYPE,
+    COMPACT_MIMETYPE,
+    compress,
+    dumps_compact,
+    encode_binary,
+    encode_compact,
+    negotiate_format,
+    preferred_encoding
+)
 
 load_dotenv()
 
@@ -14,66 +51,1182 @@ app = Flask(__name__)
 # Configuration
 ADAFRUIT_USERNAME = os.getenv('MQTT_USERNAME')
 ADAFRUIT_KEY = os.getenv('MQTT_KEY')
-ADAFRUIT_IO_URL = f'https://io.adafruit.com/api/v2/{ADAFRUIT_USERNAME}'
 
 # Database configuration (Neon.tech PostgreSQL)
 DATABASE_URL = os.getenv('DATABASE_URL')
 
-print(f"=== APP STARTUP ===")
-print(f"DATABASE_URL configured: {DATABASE_URL is not None}")
-print(f"ADAFRUIT configured: {ADAFRUIT_USERNAME is not None}")
+# Connection pool configuration (one pool per gunicorn worker process)
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', '300'))
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '3600'))
+DB_POOL_RECONNECT_TIMEOUT = float(os.getenv('DB_POOL_RECONNECT_TIMEOUT', '300'))
+
+# Adafruit IO HTTP client (seconds); the API URL can point at a local stand-in
+ADAFRUIT_IO_API_URL = os.getenv('ADAFRUIT_IO_API_URL', 'https://io.adafruit.com/api/v2')
+ADAFRUIT_TIMEOUT = float(os.getenv('ADAFRUIT_TIMEOUT', '5'))
+ADAFRUIT_FETCH_DEADLINE = float(os.getenv('ADAFRUIT_FETCH_DEADLINE', '6'))
+ADAFRUIT_FETCH_WORKERS = int(os.getenv('ADAFRUIT_FETCH_WORKERS', '8'))
+ADAFRUIT_RETRIES = int(os.getenv('ADAFRUIT_RETRIES', '2'))
+ADAFRUIT_RETRY_BACKOFF = float(os.getenv('ADAFRUIT_RETRY_BACKOFF', '0.25'))
+# Request budget shared by all workers on this host (Adafruit IO throttles per account)
+ADAFRUIT_RATE_LIMIT = float(os.getenv('ADAFRUIT_RATE_LIMIT', '60'))
+ADAFRUIT_RATE_BURST = int(os.getenv('ADAFRUIT_RATE_BURST', '10'))
+ADAFRUIT_WRITE_WAIT = float(os.getenv('ADAFRUIT_WRITE_WAIT', '2'))
+ADAFRUIT_BREAKER_THRESHOLD = int(os.getenv('ADAFRUIT_BREAKER_THRESHOLD', '5'))
+ADAFRUIT_BREAKER_RESET = float(os.getenv('ADAFRUIT_BREAKER_RESET', '30'))
+
+# Adafruit IO live feed cache (seconds)
+FEED_CACHE_TTL = float(os.getenv('FEED_CACHE_TTL', '5'))
+FEED_CACHE_MAX_STALE = float(os.getenv('FEED_CACHE_MAX_STALE', '300'))
+# Per-feed overrides, e.g. "status=2,temperature=10,humidity=10"
+FEED_CACHE_TTLS = {
+    feed.strip(): float(ttl)
+    for feed, ttl in (
+        item.split('=', 1) for item in os.getenv('FEED_CACHE_TTLS', '').split(',') if '=' in item
+    )
+}
+
+# Server-push live stream (seconds)
+LIVE_STREAM_INTERVAL = float(os.getenv('LIVE_STREAM_INTERVAL', '5'))
+LIVE_STREAM_KEEPALIVE = float(os.getenv('LIVE_STREAM_KEEPALIVE', '15'))
+LIVE_STREAM_MAX_AGE = float(os.getenv('LIVE_STREAM_MAX_AGE', '600'))
+# Each stream holds a worker thread under gthread; beyond this many per worker
+# clients are told to poll instead, leaving threads for every other route
+LIVE_STREAM_MAX_CLIENTS = int(os.getenv('LIVE_STREAM_MAX_CLIENTS', '16'))
+LIVE_FEEDS = ['status', 'temperature', 'humidity']
+
+# Sensors stored in sensor_data that the chart endpoints may query
+SENSOR_TYPES = ['temperature', 'humidity']
+
+# Device names accepted by /api/control and their Adafruit IO feeds
+DEVICE_FEEDS = {
+    'system': 'system',
+    'screen': 'screen',
+    'light': 'light',
+    'buzzer': 'buzzer',
+    'clock': 'clock',
+    'dht': 'dht'
+}
+
+# Security event types counted as alerts on the chart page
+ALERT_EVENT_TYPES = ['alert', 'intrusion']
+
+# Rollup grains maintained by the sensor_data trigger, coarsest first
+ROLLUP_GRAINS = [('day', 86400), ('hour', 3600), ('minute', 60)]
+
+# Chart downsampling (points returned per series)
+CHART_MAX_POINTS = int(os.getenv('CHART_MAX_POINTS', '1000'))
+CHART_MAX_POINTS_LIMIT = int(os.getenv('CHART_MAX_POINTS_LIMIT', '10000'))
+
+# Intrusion history paging (events per page)
+INTRUSIONS_PAGE_SIZE = int(os.getenv('INTRUSIONS_PAGE_SIZE', '50'))
+INTRUSIONS_MAX_PAGE_SIZE = int(os.getenv('INTRUSIONS_MAX_PAGE_SIZE', '500'))
+
+# Bulk export (rows fetched per round trip / bytes per streamed chunk)
+EXPORT_ITERSIZE = int(os.getenv('EXPORT_ITERSIZE', '5000'))
+EXPORT_CHUNK_BYTES = int(os.getenv('EXPORT_CHUNK_BYTES', str(64 * 1024)))
+
+# Chart response cache (MB / seconds)
+RESPONSE_CACHE_MAX_MB = float(os.getenv('RESPONSE_CACHE_MAX_MB', '64'))
+RESPONSE_CACHE_OPEN_TTL = float(os.getenv('RESPONSE_CACHE_OPEN_TTL', '30'))
+# Browser max-age for ranges that ended before today (late rows reach browsers within it)
+RESPONSE_CACHE_MAX_AGE = int(os.getenv('RESPONSE_CACHE_MAX_AGE', '300'))
+# Seconds between polls of the day rollups for rows written by other hosts (0 disables)
+RESPONSE_CACHE_CHANGE_POLL = float(os.getenv('RESPONSE_CACHE_CHANGE_POLL', '30'))
+# Optional on-disk tier shared by the workers on this host
+RESPONSE_CACHE_DIR = os.getenv('RESPONSE_CACHE_DIR')
+RESPONSE_CACHE_DISK_MAX_MB = float(os.getenv('RESPONSE_CACHE_DISK_MAX_MB', '512'))
+
+# Local hot tier of recent readings (hours kept, 0 disables / seconds between catch-ups)
+HOT_TIER_HOURS = float(os.getenv('HOT_TIER_HOURS', '48'))
+HOT_TIER_PATH = os.getenv('HOT_TIER_PATH', os.path.join(tempfile.gettempdir(), 'iot-hot-tier.sqlite3'))
+HOT_TIER_REFRESH = float(os.getenv('HOT_TIER_REFRESH', '60'))
+
+# Device ingestion (rows / seconds / bytes)
+INGEST_TOKEN = os.getenv('INGEST_TOKEN')
+INGEST_BUFFER_MAX_ROWS = int(os.getenv('INGEST_BUFFER_MAX_ROWS', '50000'))
+INGEST_FLUSH_ROWS = int(os.getenv('INGEST_FLUSH_ROWS', '1000'))
+INGEST_FLUSH_INTERVAL = float(os.getenv('INGEST_FLUSH_INTERVAL', '1'))
+INGEST_MAX_BATCH = int(os.getenv('INGEST_MAX_BATCH', '5000'))
+INGEST_MAX_BODY_BYTES = int(os.getenv('INGEST_MAX_BODY_BYTES', str(2 * 1024 * 1024)))
+
+# Control command audit log (rows / seconds)
+AUDIT_BUFFER_MAX_ROWS = int(os.getenv('AUDIT_BUFFER_MAX_ROWS', '10000'))
+AUDIT_FLUSH_ROWS = int(os.getenv('AUDIT_FLUSH_ROWS', '100'))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', '2'))
+
+# Device command debounce (seconds / commands)
+COMMAND_DEBOUNCE = float(os.getenv('COMMAND_DEBOUNCE', '0.3'))
+COMMAND_MAX_DELAY = float(os.getenv('COMMAND_MAX_DELAY', '1'))
+COMMAND_HISTORY = int(os.getenv('COMMAND_HISTORY', '1000'))
+COMMAND_WAIT_MAX = float(os.getenv('COMMAND_WAIT_MAX', '30'))
+# Command status shared by the workers on a host
+COMMAND_STATE_DIR = os.getenv('COMMAND_STATE_DIR', os.path.join(tempfile.gettempdir(), 'iot-commands'))
+
+# Alert rules run on every stored reading: a JSON list like alert_engine.DEFAULT_RULES ([] disables)
+ALERT_RULES = json.loads(os.getenv('ALERT_RULES', 'null'))
+ALERT_RULES = DEFAULT_RULES if ALERT_RULES is None else ALERT_RULES
+# Seconds between reads of new sensor_data rows by the worker evaluating the rules
+ALERT_POLL_INTERVAL = float(os.getenv('ALERT_POLL_INTERVAL', '2'))
+ALERT_LOCK_PATH = os.getenv('ALERT_LOCK_PATH', os.path.join(tempfile.gettempdir(), 'iot-alert-engine.lock'))
+
+# Logging (DEBUG adds per-query detail) and Server-Timing response headers
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'true').lower() in ('1', 'true', 'yes')
+# Seconds between exports of component counters to /metrics
+METRICS_EXPORT_INTERVAL = float(os.getenv('METRICS_EXPORT_INTERVAL', '10'))
+
+configure_logging(LOG_LEVEL)
+log = logging.getLogger(__name__)
+
+log.info('App startup', extra={
+    'database_configured': DATABASE_URL is not None,
+    'adafruit_configured': ADAFRUIT_USERNAME is not None
+})
+
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+def _reset_db_pool():
+    """Forget a pool inherited across fork so the child opens its own"""
+    global _db_pool, _db_pool_lock
+    # The parent's pool threads do not exist in the child and its sockets
+    # are shared with the parent, so drop it without closing anything.
+    _db_pool = None
+    _db_pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_db_pool)
+
+
+def _on_db_reconnect_failed(pool):
+    log.error('Database pool could not reconnect, will retry on next checkout', extra={'pool': pool.name})
+
+
+def get_db_pool():
+    """Return this process's connection pool, creating it on first use"""
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = ConnectionPool(
+                    DATABASE_URL,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    max_idle=DB_POOL_MAX_IDLE,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                    reconnect_timeout=DB_POOL_RECONNECT_TIMEOUT,
+                    reconnect_failed=_on_db_reconnect_failed,
+                    check=ConnectionPool.check_connection,
+                    kwargs={'autocommit': True},
+                    name=f'web-{os.getpid()}',
+                    open=True
+                )
+                log.info('Database pool created', extra={'min_size': DB_POOL_MIN_SIZE, 'max_size': DB_POOL_MAX_SIZE})
+    return _db_pool
+
+
+@contextmanager
+def get_db_connection():
+    """Borrow a pooled database connection (yields None if unavailable)"""
+    try:
+        with span('db-connect'):
+            pool = get_db_pool()
+            conn = pool.getconn()
+    except Exception:
+        log.exception('Database connection error')
+        yield None
+        return
+
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+def get_db_pool_stats():
+    """Return wait-time and usage counters for this worker's pool"""
+    if _db_pool is None:
+        return {'pid': os.getpid(), 'initialized': False}
+
+    stats = _db_pool.get_stats()
+    pool_size = stats.get('pool_size', 0)
+    pool_available = stats.get('pool_available', 0)
+    requests_num = stats.get('requests_num', 0)
+    requests_wait_ms = stats.get('requests_wait_ms', 0)
+
+    return {
+        'pid': os.getpid(),
+        'initialized': True,
+        'min_size': _db_pool.min_size,
+        'max_size': _db_pool.max_size,
+        'pool_size': pool_size,
+        'in_use': pool_size - pool_available,
+        'available': pool_available,
+        'requests_waiting': stats.get('requests_waiting', 0),
+        'requests_num': requests_num,
+        'requests_queued': stats.get('requests_queued', 0),
+        'requests_errors': stats.get('requests_errors', 0),
+        'requests_wait_ms': requests_wait_ms,
+        'avg_wait_ms': round(requests_wait_ms / requests_num, 3) if requests_num else 0.0,
+        'connections_num': stats.get('connections_num', 0),
+        'connections_errors': stats.get('connections_errors', 0),
+        'connections_lost': stats.get('connections_lost', 0)
+    }
 
 
-def get_db_connection():
-    """Create a database connection"""
+# Keep-alive, retrying, rate-limited Adafruit IO client for this worker
+adafruit = AdafruitClient(
+    ADAFRUIT_USERNAME,
+    ADAFRUIT_KEY,
+    timeout=ADAFRUIT_TIMEOUT,
+    pool_size=ADAFRUIT_FETCH_WORKERS,
+    retries=ADAFRUIT_RETRIES,
+    backoff=ADAFRUIT_RETRY_BACKOFF,
+    rate_per_minute=ADAFRUIT_RATE_LIMIT,
+    burst=ADAFRUIT_RATE_BURST,
+    write_wait=ADAFRUIT_WRITE_WAIT,
+    breaker_threshold=ADAFRUIT_BREAKER_THRESHOLD,
+    breaker_reset=ADAFRUIT_BREAKER_RESET,
+    api_url=ADAFRUIT_IO_API_URL
+)
+
+# Bounded pool used to read several feeds at once
+feed_executor = ThreadPoolExecutor(
+    max_workers=ADAFRUIT_FETCH_WORKERS,
+    thread_name_prefix='adafruit-feed'
+)
+
+
+def fetch_adafruit_feed_data(feed_key):
+    """Fetch latest data from Adafruit IO feed"""
     try:
-        print(f"Attempting database connection...")
-        conn = psycopg.connect(DATABASE_URL)
-        print(f"✓ Database connected successfully")
-        return conn
-    except Exception as e:
-        print(f"✗ Database connection error: {e}")
-        traceback.print_exc()
+        return adafruit.get_last(feed_key)
+    except Exception:
+        log.exception('Error fetching Adafruit data', extra={'feed': feed_key})
         return None
 
 
+def _resolve_future(future, value):
+    if not future.done():
+        future.set_result(value)
+
+
+class FeedFlight:
+    """A single in-progress upstream read that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.async_waiters = []  # (loop, future) pairs from async callers
+
+
+class FeedCache:
+    """TTL cache in front of Adafruit IO feed reads.
+
+    Concurrent misses for the same feed share a single upstream call, and
+    when the upstream fails the last good value is served for up to
+    ``max_stale`` seconds.
+    """
+
+    def __init__(self, fetch, default_ttl, ttls=None, max_stale=0):
+        self.fetch = fetch
+        self.default_ttl = default_ttl
+        self.ttls = ttls or {}
+        self.max_stale = max_stale
+        self._lock = threading.Lock()
+        self._entries = {}   # feed_key -> (value, fetched_at)
+        self._inflight = {}  # feed_key -> FeedFlight
+        self.counters = {'hits': 0, 'misses': 0, 'stale': 0, 'coalesced': 0, 'errors': 0}
+
+    def ttl_for(self, feed_key):
+        return self.ttls.get(feed_key, self.default_ttl)
+
+    def _begin(self, feed_key, loop=None):
+        """Return ('hit', value), ('wait', flight or future) or ('lead', flight)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(feed_key)
+            if entry and now - entry[1] < self.ttl_for(feed_key):
+                self.counters['hits'] += 1
+                return 'hit', entry[0]
+
+            flight = self._inflight.get(feed_key)
+            if flight is None:
+                flight = self._inflight[feed_key] = FeedFlight()
+                return 'lead', flight
+
+            self.counters['coalesced'] += 1
+            if loop is None:
+                return 'wait', flight
+            future = loop.create_future()
+            flight.async_waiters.append((loop, future))
+            return 'wait', future
+
+    def get(self, feed_key):
+        state, flight = self._begin(feed_key)
+        if state == 'hit':
+            return flight
+        if state == 'wait':
+            flight.done.wait()
+            return flight.value
+
+        try:
+            value = self.fetch(feed_key)
+        except Exception:
+            log.exception('Error fetching Adafruit feed', extra={'feed': feed_key})
+            value = None
+        return self._complete(feed_key, flight, value)
+
+    async def aget(self, feed_key, fetch):
+        """Async variant of get() for the ASGI app; shares entries and flights with it"""
+        state, flight = self._begin(feed_key, asyncio.get_running_loop())
+        if state == 'hit':
+            return flight
+        if state == 'wait':
+            return await flight
+
+        try:
+            value = await fetch(feed_key)
+        except Exception:
+            log.exception('Error fetching Adafruit feed', extra={'feed': feed_key})
+            value = None
+        return self._complete(feed_key, flight, value)
+
+    def _complete(self, feed_key, flight, value):
+        with self._lock:
+            self.counters['misses'] += 1
+            if value is not None:
+                self._entries[feed_key] = (value, time.monotonic())
+            else:
+                self.counters['errors'] += 1
+                entry = self._entries.get(feed_key)
+                if entry and time.monotonic() - entry[1] < self.max_stale:
+                    self.counters['stale'] += 1
+                    value = entry[0]
+            del self._inflight[feed_key]
+            flight.value = value
+        flight.done.set()
+        for loop, future in flight.async_waiters:
+            loop.call_soon_threadsafe(_resolve_future, future, value)
+        return value
+
+    def invalidate(self, feed_key):
+        with self._lock:
+            self._entries.pop(feed_key, None)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            feeds = {
+                feed_key: round(time.monotonic() - fetched_at, 3)
+                for feed_key, (_, fetched_at) in self._entries.items()
+            }
+        lookups = counters['hits'] + counters['misses'] + counters['coalesced']
+        counters['hit_ratio'] = round((counters['hits'] + counters['coalesced']) / lookups, 3) if lookups else 0.0
+        counters['entry_age_seconds'] = feeds
+        return counters
+
+
+feed_cache = FeedCache(
+    fetch_adafruit_feed_data,
+    default_ttl=FEED_CACHE_TTL,
+    ttls=FEED_CACHE_TTLS,
+    max_stale=FEED_CACHE_MAX_STALE
+)
+
+
 def get_adafruit_feed_data(feed_key):
-    """Fetch latest data from Adafruit IO feed"""
+    """Get latest data for an Adafruit IO feed through the shared cache"""
+    return feed_cache.get(feed_key)
+
+
+def get_adafruit_feeds(feed_keys, deadline=ADAFRUIT_FETCH_DEADLINE):
+    """Read several feeds concurrently under one overall deadline.
+
+    Feeds that fail or miss the deadline map to None so callers can still
+    return whatever did arrive.
+    """
+    # Each fetch runs in a copy of this context so its spans land on the current request
+    futures = {
+        feed_key: feed_executor.submit(contextvars.copy_context().run, get_adafruit_feed_data, feed_key)
+        for feed_key in feed_keys
+    }
+    wait(futures.values(), timeout=deadline)
+
+    results = {}
+    for feed_key, future in futures.items():
+        if future.done() and not future.exception():
+            results[feed_key] = future.result()
+        else:
+            # A late fetch keeps running and will still populate the cache
+            results[feed_key] = None
+    return results
+
+
+def feed_value_as_float(feed_data):
+    """Parse a numeric feed value, returning None if missing or malformed"""
     try:
-        headers = {'X-AIO-Key': ADAFRUIT_KEY}
-        response = requests.get(
-            f'{ADAFRUIT_IO_URL}/feeds/{feed_key}/data/last',
-            headers=headers,
-            timeout=5
-        )
-        if response.status_code == 200:
-            return response.json()
-        return None
-    except Exception as e:
-        print(f"Error fetching Adafruit data: {e}")
+        return float(feed_data.get('value')) if feed_data else None
+    except (TypeError, ValueError):
         return None
 
 
 def send_adafruit_command(feed_key, value):
     """Send command to Adafruit IO feed"""
     try:
-        headers = {
-            'X-AIO-Key': ADAFRUIT_KEY,
-            'Content-Type': 'application/json'
-        }
-        data = {'value': str(value)}
-        response = requests.post(
-            f'{ADAFRUIT_IO_URL}/feeds/{feed_key}/data',
-            headers=headers,
-            json=data,
-            timeout=5
-        )
-        return response.status_code == 200
+        if adafruit.send(feed_key, value):
+            # The next live read should reflect the value we just wrote
+            feed_cache.invalidate(feed_key)
+            if feed_key in LIVE_FEEDS:
+                live_broadcaster.wake()
+            return True
+        return False
+    except Exception:
+        log.exception('Error sending command', extra={'feed': feed_key})
+        return False
+
+
+def build_live_snapshot(feeds):
+    """Shape a set of live feed reads the way /api/live-data returns them"""
+    alarm_status = feeds.get('status')
+    return {
+        'alarm_status': alarm_status.get('value') if alarm_status else 'unknown',
+        'temperature': feed_value_as_float(feeds.get('temperature')),
+        'humidity': feed_value_as_float(feeds.get('humidity'))
+    }
+
+
+class LiveSubscriber:
+    """One connected live-stream client"""
+
+    def __init__(self, maxsize=32):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def push(self, message):
+        """Hand an (event, data) message to the client; False if it is not keeping up"""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except queue.Full:
+            return False
+
+
+class LiveBroadcaster:
+    """Polls the live feeds once per worker and pushes changes to every client.
+
+    The poller only runs while at least one client is connected, so upstream
+    load stays at one feed fan-out per interval no matter how many dashboards
+    are open. Alerts are fired in a single worker, so each poll also reads
+    alerts stored since the last one with `load_alerts(after_id)`, which
+    returns (last_id, rows); with after_id None it only returns the current
+    last id.
+    """
+
+    def __init__(self, feed_keys, interval, load_alerts=None):
+        self.feed_keys = feed_keys
+        self.interval = interval
+        self.load_alerts = load_alerts
+        self._alert_id = None
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._snapshot = {}
+        self._thread = None
+        self._wake = threading.Event()
+
+    def subscribe(self, subscriber=None):
+        subscriber = subscriber or LiveSubscriber()
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._snapshot:
+                subscriber.push(('live', dict(self._snapshot)))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='live-broadcaster', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def wake(self):
+        """Poll again now instead of waiting for the next interval"""
+        self._wake.set()
+
+    def publish(self, event, data):
+        """Send an SSE `event` to every client connected to this worker"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if not subscriber.push((event, data)):
+                # A client that cannot keep up is disconnected; it will
+                # reconnect and receive a fresh full snapshot.
+                subscriber.dropped = True
+                self.unsubscribe(subscriber)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    self._snapshot = {}
+                    self._alert_id = None
+                    return
+
+            try:
+                snapshot = build_live_snapshot(get_adafruit_feeds(self.feed_keys))
+                delta = {key: value for key, value in snapshot.items() if self._snapshot.get(key) != value}
+                if delta:
+                    delta['timestamp'] = datetime.now().isoformat()
+                    with self._lock:
+                        self._snapshot.update(delta)
+                    self.publish('live', delta)
+            except Exception:
+                log.exception('Error polling live feeds')
+
+            if self.load_alerts is not None:
+                try:
+                    # Start from the alerts stored now, not from the whole history
+                    self._alert_id, rows = self.load_alerts(self._alert_id)
+                    for row in rows:
+                        self.publish('alert', {
+                            'id': row['id'],
+                            'timestamp': row['timestamp'].isoformat(),
+                            'details': row['details']
+                        })
+                except Exception as e:
+                    log.warning('Error polling alerts', extra={'error': str(e)})
+
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+def load_new_alerts(after_id):
+    """Alerts stored after `after_id` as (last_id, rows); with None, just the current last id"""
+    with get_db_connection() as conn:
+        if not conn:
+            raise RuntimeError('Database connection failed')
+        with conn.cursor(row_factory=dict_row) as cursor:
+            if after_id is None:
+                cursor.execute("SELECT COALESCE(MAX(id), 0) AS id FROM security_events")
+                return cursor.fetchone()['id'], []
+            cursor.execute("""
+                SELECT id, timestamp, details
+                FROM security_events
+                WHERE id > %s AND event_type = 'alert'
+                ORDER BY id
+                LIMIT 100
+            """, (after_id,))
+            rows = cursor.fetchall()
+            return (rows[-1]['id'] if rows else after_id), rows
+
+
+live_broadcaster = LiveBroadcaster(LIVE_FEEDS, LIVE_STREAM_INTERVAL, load_alerts=load_new_alerts)
+live_stream_slots = threading.BoundedSemaphore(LIVE_STREAM_MAX_CLIENTS)
+
+
+def write_sensor_rows(rows):
+    """Bulk-load buffered readings into sensor_data (runs on the ingest writer thread)"""
+    staging_ddl, copy_sql, merge_sql = STAGING_SQL['sensor']
+    with get_db_connection() as conn:
+        if not conn:
+            raise RuntimeError('Database connection failed')
+        with conn.transaction(), conn.cursor() as cursor:
+            cursor.execute(staging_ddl)
+            with cursor.copy(copy_sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+            cursor.execute(merge_sql)
+
+
+ingest_writer = BatchWriter(
+    'ingest',
+    write_sensor_rows,
+    max_rows=INGEST_BUFFER_MAX_ROWS,
+    flush_rows=INGEST_FLUSH_ROWS,
+    flush_interval=INGEST_FLUSH_INTERVAL
+)
+atexit.register(ingest_writer.close)
+
+def load_rollup_changes(since, lookback):
+    """(sensor_type, day, updated_at) for day rollups changed after `since` minus `lookback` seconds"""
+    with get_db_connection() as conn:
+        if not conn:
+            raise RuntimeError('Database connection failed')
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT sensor_type, bucket::date, updated_at
+                FROM sensor_rollups
+                WHERE grain = 'day'
+                  AND updated_at > COALESCE(%s::timestamp, LOCALTIMESTAMP) - make_interval(secs => %s)
+            """, (since, lookback))
+            return cursor.fetchall()
+
+
+# Rendered chart responses; new readings invalidate the sensor-days they land in,
+# whether written by this host or found by polling the day rollups
+response_cache = ResponseCache(
+    max_bytes=int(RESPONSE_CACHE_MAX_MB * 1024 * 1024),
+    open_ttl=RESPONSE_CACHE_OPEN_TTL,
+    disk_dir=RESPONSE_CACHE_DIR,
+    disk_max_bytes=int(RESPONSE_CACHE_DISK_MAX_MB * 1024 * 1024),
+    load_changes=load_rollup_changes if RESPONSE_CACHE_CHANGE_POLL > 0 else None,
+    poll_interval=RESPONSE_CACHE_CHANGE_POLL
+)
+
+
+def load_recent_rows(after_id, since, limit):
+    """sensor_data rows since `since` past after_id, in id order (hot tier and alert catch-up)"""
+    with get_db_connection() as conn:
+        if not conn:
+            raise RuntimeError('Database connection failed')
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT id, timestamp, sensor_type, value
+                FROM sensor_data
+                WHERE id > %s AND timestamp >= %s
+                ORDER BY id
+                LIMIT %s
+            """, (after_id, since, limit))
+            return cursor.fetchall()
+
+
+def load_recent_window(since, after, limit):
+    """sensor_data rows since `since` in (timestamp, id) order, after `after` (warm-ups)"""
+    with get_db_connection() as conn:
+        if not conn:
+            raise RuntimeError('Database connection failed')
+        with conn.cursor() as cursor:
+            if after is None:
+                cursor.execute("""
+                    SELECT id, timestamp, sensor_type, value
+                    FROM sensor_data
+                    WHERE timestamp >= %s
+                    ORDER BY timestamp, id
+                    LIMIT %s
+                """, (since, limit))
+            else:
+                after_timestamp, after_id = after
+                # The plain timestamp bound lets the index skip straight to the page
+                cursor.execute("""
+                    SELECT id, timestamp, sensor_type, value
+                    FROM sensor_data
+                    WHERE timestamp >= %s AND (timestamp, id) > (%s, %s)
+                    ORDER BY timestamp, id
+                    LIMIT %s
+                """, (after_timestamp, after_timestamp, after_id, limit))
+            return cursor.fetchall()
+
+
+# Recent readings kept on local disk so recent charts skip the WAN round trip
+hot_store = None
+if HOT_TIER_HOURS > 0:
+    hot_store = HotStore(
+        HOT_TIER_PATH,
+        load_recent_rows,
+        load_recent_window,
+        window_hours=HOT_TIER_HOURS,
+        refresh_interval=HOT_TIER_REFRESH
+    )
+    # Fed from the writer thread once rows are in PostgreSQL, never on the request path
+    ingest_writer.add_listener(hot_store.add)
+
+# Registered after the hot tier so a marker is only touched once its rows are there
+ingest_writer.add_listener(response_cache.mark_rows)
+
+
+def hot_tier_covers(start, end):
+    """True when the hot tier can answer [start, end) without PostgreSQL"""
+    if hot_store is None:
+        return False
+    try:
+        return hot_store.covers(start, end)
     except Exception as e:
-        print(f"Error sending command: {e}")
+        log.warning('Hot tier unavailable', extra={'error': str(e)})
         return False
 
 
+_security_events_key_missing = False
+
+
+def insert_security_events(cursor, rows):
+    """Insert security_events rows, skipping ones already stored.
+
+    The ON CONFLICT target needs the natural key from migration 006. Without
+    it PostgreSQL rejects the statement, which would fail every flush and
+    keep the batch retrying forever, so the rows are inserted without
+    de-duplication and the missing migration is logged.
+    """
+    global _security_events_key_missing
+    if not _security_events_key_missing:
+        try:
+            with cursor.connection.transaction():
+                cursor.executemany("""
+                    INSERT INTO security_events (timestamp, event_type, details)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT """ + SECURITY_EVENTS_KEY + """ DO NOTHING
+                """, rows)
+            return
+        except InvalidColumnReference:
+            _security_events_key_missing = True
+            log.error(
+                'security_events has no natural key; inserting without de-duplication. '
+                'Apply migrations/006_security_events_details_hash_key.sql and restart'
+            )
+    cursor.executemany("""
+        INSERT INTO security_events (timestamp, event_type, details)
+        VALUES (%s, %s, %s)
+    """, rows)
+
+
+def write_audit_rows(rows):
+    """Write buffered device_logs / system_status / security_events rows in one transaction"""
+    by_table = {}
+    for table, values in rows:
+        by_table.setdefault(table, []).append(values)
+
+    with get_db_connection() as conn:
+        if not conn:
+            raise RuntimeError('Database connection failed')
+        with conn.transaction(), conn.cursor() as cursor:
+            if 'device_logs' in by_table:
+                cursor.executemany("""
+                    INSERT INTO device_logs (timestamp, device_name, action, status)
+                    VALUES (%s, %s, %s, %s)
+                """, by_table['device_logs'])
+            if 'system_status' in by_table:
+                cursor.executemany("""
+                    INSERT INTO system_status (timestamp, alarm_status, last_armed, last_disarmed)
+                    VALUES (%s, %s, %s, %s)
+                """, by_table['system_status'])
+            if 'security_events' in by_table:
+                insert_security_events(cursor, by_table['security_events'])
+
+
+audit_writer = BatchWriter(
+    'audit',
+    write_audit_rows,
+    max_rows=AUDIT_BUFFER_MAX_ROWS,
+    flush_rows=AUDIT_FLUSH_ROWS,
+    flush_interval=AUDIT_FLUSH_INTERVAL
+)
+atexit.register(audit_writer.close)
+
+
+def record_device_command(device, action, status):
+    """Queue a device_logs row for a command's final status; never blocks or fails the request.
+
+    Delivered commands are logged as 'sent'; 'failed' and 'superseded' are
+    logged as they are, so every click leaves a row.
+    """
+    status = 'sent' if status == 'delivered' else status
+    row = ('device_logs', (datetime.now(), device, str(action)[:50], status))
+    if not audit_writer.offer([row]):
+        log.warning('Audit buffer full, dropped device log', extra={'device': device, 'action': action})
+
+
+def record_alarm_status(alarm_status):
+    """Queue a system_status row for an arm/disarm command"""
+    now = datetime.now()
+    row = ('system_status', (
+        now,
+        alarm_status,
+        now if alarm_status == 'armed' else None,
+        now if alarm_status == 'disarmed' else None
+    ))
+    if not audit_writer.offer([row]):
+        log.warning('Audit buffer full, dropped alarm status', extra={'alarm': alarm_status})
+
+
+def raise_alert(alert):
+    """Store a fired rule as a security_events 'alert'.
+
+    Every worker's live broadcaster picks the row up and pushes it to its
+    own live-stream clients.
+    """
+    log.warning('Alert', extra=alert)
+    row = ('security_events', (datetime.fromisoformat(alert['timestamp']), 'alert', alert['details']))
+    if not audit_writer.offer([row]):
+        log.warning('Audit buffer full, dropped alert', extra={'rule': alert['rule']})
+
+
+# Rolling-window rules, evaluated in one worker per host over every reading
+# that reaches sensor_data (from /api/ingest on any worker or sync_data.py)
+alert_engine = AlertEngine(build_rules(ALERT_RULES), raise_alert)
+alert_follower = AlertFollower(
+    alert_engine,
+    load_recent_rows,
+    load_recent_window,
+    ALERT_LOCK_PATH,
+    interval=ALERT_POLL_INTERVAL
+)
+
+# Collapses rapid toggles per feed before they reach Adafruit IO
+command_queue = CommandQueue(
+    send_adafruit_command,
+    debounce=COMMAND_DEBOUNCE,
+    max_delay=COMMAND_MAX_DELAY,
+    history=COMMAND_HISTORY,
+    state_dir=COMMAND_STATE_DIR
+)
+atexit.register(command_queue.close)
+
+# Component counters and levels published on /metrics
+stats_exporter = StatsExporter(METRICS_EXPORT_INTERVAL)
+stats_exporter.register('adafruit', adafruit.stats, counters=adafruit.counters)
+stats_exporter.register('feed_cache', feed_cache.stats, counters=feed_cache.counters)
+stats_exporter.register(
+    'response_cache', response_cache.stats,
+    counters=response_cache.counters, levels=('entries', 'bytes')
+)
+stats_exporter.register(
+    'db_pool', lambda: get_db_pool_stats() if _db_pool is not None else {},
+    counters=('requests_num', 'requests_queued', 'requests_errors', 'requests_wait_ms',
+              'connections_num', 'connections_errors', 'connections_lost'),
+    levels=('pool_size', 'in_use', 'requests_waiting')
+)
+for writer in (ingest_writer, audit_writer):
+    stats_exporter.register(f'{writer.name}_writer', writer.stats, counters=writer.counters, levels=('depth',))
+stats_exporter.register(
+    'command_queue', command_queue.stats,
+    counters=command_queue.counters, levels=('pending', 'in_flight')
+)
+if hot_store is not None:
+    stats_exporter.register('hot_tier', hot_store.stats, counters=hot_store.counters)
+stats_exporter.register('alert_engine', alert_engine.stats, counters=alert_engine.counters)
+stats_exporter.register('alert_follower', alert_follower.stats, counters=alert_follower.counters)
+
+
+def parse_date_range(start_date, end_date=None):
+    """Turn inclusive YYYY-MM-DD dates into a half-open [start, end) timestamp range"""
+    try:
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.strptime(end_date, '%Y-%m-%d') if end_date else start
+    except ValueError:
+        raise ValueError('dates must be in YYYY-MM-DD format') from None
+    if end < start:
+        raise ValueError('End date must not be before start date')
+    return start, end + timedelta(days=1)
+
+
+def sensor_range_query(sensor, start, end, limit=None):
+    """Query for one sensor's readings in [start, end) using the (sensor_type, timestamp) index"""
+    query = """
+        SELECT timestamp, value
+        FROM sensor_data
+        WHERE sensor_type = %s
+          AND timestamp >= %s
+          AND timestamp < %s
+        ORDER BY timestamp ASC
+        LIMIT %s
+    """
+
+    log.debug('Executing query', extra={'query': query})
+
+    return query, (sensor, start, end, limit)
+
+
+def sensor_minmax_query(sensor, start, end, width):
+    """Query keeping the lowest and highest reading of every time bucket, in time order"""
+    if rollup_grain_for(width, start):
+        # Buckets of whole minutes can be answered from the minute rollup; each
+        # extreme is placed at the middle of the minute it was recorded in.
+        query = """
+            WITH ranked AS (
+                SELECT bucket + INTERVAL '30 seconds' AS timestamp, min_value, max_value,
+                       ROW_NUMBER() OVER (PARTITION BY date_bin(%s, bucket, %s) ORDER BY min_value ASC, bucket) AS low_rank,
+                       ROW_NUMBER() OVER (PARTITION BY date_bin(%s, bucket, %s) ORDER BY max_value DESC, bucket) AS high_rank
+                FROM sensor_rollups
+                WHERE grain = 'minute'
+                  AND sensor_type = %s
+                  AND bucket >= %s
+                  AND bucket < %s
+            )
+            SELECT timestamp, min_value AS value FROM ranked WHERE low_rank = 1
+            UNION ALL
+            SELECT timestamp, max_value AS value FROM ranked WHERE high_rank = 1 AND low_rank <> 1
+            ORDER BY timestamp ASC
+        """
+
+        log.debug('Executing query', extra={'query': query})
+
+        return query, (width, start, width, start, sensor, start, end)
+
+    query = """
+        WITH ranked AS (
+            SELECT timestamp, value,
+                   ROW_NUMBER() OVER (PARTITION BY bucket ORDER BY value ASC, timestamp) AS low_rank,
+                   ROW_NUMBER() OVER (PARTITION BY bucket ORDER BY value DESC, timestamp) AS high_rank
+            FROM (
+                SELECT date_bin(%s, timestamp, %s) AS bucket, timestamp, value
+                FROM sensor_data
+                WHERE sensor_type = %s
+                  AND timestamp >= %s
+                  AND timestamp < %s
+            ) binned
+        )
+        SELECT timestamp, value
+        FROM ranked
+        WHERE low_rank = 1 OR high_rank = 1
+        ORDER BY timestamp ASC
+    """
+
+    log.debug('Executing query', extra={'query': query})
+
+    return query, (width, start, sensor, start, end)
+
+
+def align_to_rollups(width):
+    """Round bucket widths of a minute or more up to whole minutes so rollups can serve them"""
+    if width < timedelta(minutes=1):
+        return width
+    return timedelta(minutes=math.ceil(width.total_seconds() / 60))
+
+
+def rollup_grain_for(width, start):
+    """Pick the coarsest rollup grain whose buckets tile both `width` and `start`"""
+    seconds = int(width.total_seconds())
+    offset = int((start - datetime(start.year, start.month, start.day)).total_seconds())
+    for grain, grain_seconds in ROLLUP_GRAINS:
+        if seconds % grain_seconds == 0 and offset % grain_seconds == 0:
+            return grain
+    return None
+
+
+def sensor_buckets_query(sensor, start, end, width):
+    """Query aggregating readings into fixed-width time buckets (avg/min/max per bucket)"""
+    grain = rollup_grain_for(width, start)
+    if grain:
+        # Re-bucket the pre-aggregated rollups: cost is O(rollup buckets), not O(rows)
+        query = """
+            SELECT date_bin(%s, bucket, %s) + %s / 2 AS timestamp,
+                   SUM(value_sum) / SUM(reading_count) AS value,
+                   MIN(min_value) AS min_value,
+                   MAX(max_value) AS max_value
+            FROM sensor_rollups
+            WHERE grain = %s
+              AND sensor_type = %s
+              AND bucket >= %s
+              AND bucket < %s
+            GROUP BY 1
+            ORDER BY 1 ASC
+        """
+
+        log.debug('Executing query', extra={'query': query})
+
+        return query, (width, start, width, grain, sensor, start, end)
+
+    query = """
+        SELECT date_bin(%s, timestamp, %s) + %s / 2 AS timestamp,
+               AVG(value) AS value,
+               MIN(value) AS min_value,
+               MAX(value) AS max_value
+        FROM sensor_data
+        WHERE sensor_type = %s
+          AND timestamp >= %s
+          AND timestamp < %s
+        GROUP BY 1
+        ORDER BY 1 ASC
+    """
+
+    log.debug('Executing query', extra={'query': query})
+
+    return query, (width, start, width, sensor, start, end)
+
+
+def format_chart_series(rows, label_format):
+    """Shape rows as Chart.js labels/values (plus min/max bands for bucket averages)"""
+    data = {
+        'labels': [row['timestamp'].strftime(label_format) for row in rows],
+        'values': [float(row['value']) for row in rows]
+    }
+    if rows and 'min_value' in rows[0]:
+        data['min'] = [float(row['min_value']) for row in rows]
+        data['max'] = [float(row['max_value']) for row in rows]
+    return data
+
+
+def series_encoding(series_format, accept_encodings):
+    """Content-Encoding for a series body, or None when it is sent as is.
+
+    Only the compact and binary formats are compressed, so for 'json' the
+    Accept-Encoding header does not split the response cache.
+    """
+    if series_format == 'json':
+        return None
+    return preferred_encoding(accept_encodings)
+
+
+def render_series(rows, label_format, downsampled, series_format, encoding):
+    """Body and headers of a chart series response in the negotiated format.
+
+    'json' keeps the Chart.js labels/values shape; 'compact' and 'binary'
+    send delta-encoded timestamps and value columns (see series_format.py),
+    compressed with `encoding` (from series_encoding) when it is set.
+    """
+    if series_format == 'json':
+        body = json.dumps({
+            'success': True,
+            'data': format_chart_series(rows, label_format),
+            'downsampled': downsampled
+        }).encode()
+        headers = [('Content-Type', 'application/json')]
+    else:
+        if series_format == 'binary':
+            body, mimetype = encode_binary(rows), BINARY_MIMETYPE
+        else:
+            body = dumps_compact({'success': True, 'data': encode_compact(rows), 'downsampled': downsampled})
+            mimetype = COMPACT_MIMETYPE
+        body, content_encoding = compress(body, encoding)
+        headers = [('Content-Type', mimetype)]
+        if content_encoding:
+            headers.append(('Content-Encoding', content_encoding))
+        if series_format == 'binary':
+            # A binary body has nowhere else to carry the downsampling details
+            headers.append(('X-Downsampled', json.dumps(downsampled)))
+    headers.append(('Vary', 'Accept, Accept-Encoding'))
+    return body, headers
+
+
+def series_cache_control(entry):
+    """Cache-Control for a cached series response"""
+    if entry['closed']:
+        # Not immutable: rows written on another host can still land in a closed range
+        return f'public, max-age={RESPONSE_CACHE_MAX_AGE}'
+    return 'no-cache'
+
+
+def cached_response(entry):
+    """Build a response from a cache entry, answering 304 when the client's copy is current"""
+    response = Response(entry['body'], headers=entry['headers'])
+    response.set_etag(entry['etag'])
+    response.last_modified = entry['last_modified']
+    response.headers['Cache-Control'] = series_cache_control(entry)
+    return response.make_conditional(request)
+
+
+def store_series_response(key, body, headers, sensor, start, end, created_ns, hot=False):
+    """Cache a freshly rendered series response; returns the cache entry.
+
+    Hot-tier answers may predate the catch-up of rows already committed (and
+    marked) in PostgreSQL, so they only get the open-range TTL.
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return response_cache.put(
+        key, body, headers, sensor, start, end,
+        closed=end <= today and not hot,
+        created_ns=created_ns
+    )
+
+
+def int_arg(args, name, default=None):
+    """Read an integer query parameter; raises ValueError naming the parameter"""
+    value = args.get(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer') from None
+
+
+def parse_downsample_args(args):
+    """Read max_points / resolution / downsample query parameters"""
+    max_points = int_arg(args, 'max_points', CHART_MAX_POINTS)
+    max_points = max(10, min(max_points, CHART_MAX_POINTS_LIMIT))
+    resolution = int_arg(args, 'resolution')
+    if resolution is not None and resolution <= 0:
+        raise ValueError('resolution must be a positive number of seconds')
+    method = args.get('downsample', 'lttb')
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"downsample must be one of {', '.join(DOWNSAMPLE_METHODS)}")
+    return max_points, resolution, method
+
+
+def reduction_query(sensor, start, end, max_points, resolution=None, method='lttb'):
+    """(query, params, bucket width) reducing [start, end) to about max_points points.
+
+    The range is reduced in SQL with date_bin, either to per-bucket averages
+    or to per-bucket min/max points (over-sampled for LTTB to choose from).
+    Buckets of a minute or more are served from sensor_rollups instead of raw
+    rows.
+    """
+    if method == 'avg':
+        width = align_to_rollups(bucket_width(start, end, max_points, resolution))
+        return (*sensor_buckets_query(sensor, start, end, width), width)
+    if method == 'minmax':
+        # Two points per bucket
+        width = align_to_rollups(bucket_width(start, end, max_points // 2, resolution))
+    else:
+        width = align_to_rollups(bucket_width(start, end, max_points * 2, resolution))
+    return (*sensor_minmax_query(sensor, start, end, width), width)
+
+
+def finish_reduction(rows, max_points, method, width):
+    """Apply LTTB to the min/max candidates if asked for; returns (rows, downsample_info)"""
+    if method == 'lttb':
+        rows = lttb(rows, max_points)
+    return rows, {
+        'method': method,
+        'bucket_seconds': int(width.total_seconds()),
+        'points': len(rows)
+    }
+
+
+def fetch_sensor_series(cursor, sensor, start, end, max_points, resolution=None, method='lttb'):
+    """Fetch a sensor series bounded to at most max_points points.
+
+    Small ranges are returned raw; larger ones go through reduction_query.
+    Returns (rows, downsample_info or None).
+    """
+    if resolution is None:
+        # Cheap probe: one row past the limit tells us if reduction is needed
+        cursor.execute(*sensor_range_query(sensor, start, end, limit=max_points + 1))
+        rows = cursor.fetchall()
+        if len(rows) <= max_points:
+            return rows, None
+
+    query, params, width = reduction_query(sensor, start, end, max_points, resolution, method)
+    cursor.execute(query, params)
+    return finish_reduction(cursor.fetchall(), max_points, method, width)
+
+
+@app.before_request
+def begin_request_timing():
+    start_request()
+    stats_exporter.start()
+    alert_follower.start()
+
+
+@app.after_request
+def finish_request_timing(response):
+    """Attach Server-Timing and write one access record per request"""
+    timings = current_timings()
+    if timings is None:
+        return response
+    total = timings.elapsed_ms()
+    spans = timings.summary()
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = timings.header(total)
+    log.info('Request', extra={
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round(total, 2),
+        'spans': spans
+    })
+    # Label by route pattern so ids in the path do not create new series
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    observe_request(route, request.method, response.status_code, total / 1000, spans)
+    return response
+
+
 @app.route('/')
 def index():
     """Home page / Main Dashboard"""
@@ -106,80 +1259,116 @@ def controls():
 def get_live_data():
     """Get live data from Adafruit IO for multiple sensors"""
     try:
-        # Fetch data from Adafruit IO feeds
-        alarm_status = get_adafruit_feed_data('status')
-        temperature = get_adafruit_feed_data('temperature')
-        humidity = get_adafruit_feed_data('humidity')
+        # Fetch data from Adafruit IO feeds in parallel
+        feeds = get_adafruit_feeds(LIVE_FEEDS)
+        data = build_live_snapshot(feeds)
+        data['timestamp'] = datetime.now().isoformat()
 
         return jsonify({
             'success': True,
-            'data': {
-                'alarm_status': alarm_status.get('value') if alarm_status else 'unknown',
-                'temperature': float(temperature.get('value')) if temperature else None,
-                'humidity': float(humidity.get('value')) if humidity else None,
-                'timestamp': datetime.now().isoformat()
-            }
+            'partial': any(value is None for value in feeds.values()),
+            'data': data
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/live-stream')
+def live_stream():
+    """Stream live sensor changes and alerts as Server-Sent Events"""
+    if not live_stream_slots.acquire(blocking=False):
+        # The client falls back to polling /api/live-data
+        response = jsonify({'success': False, 'error': 'Too many live streams, poll /api/live-data'})
+        response.headers['Retry-After'] = str(int(LIVE_STREAM_MAX_AGE))
+        return response, 503
+
+    subscriber = live_broadcaster.subscribe()
+
+    def generate():
+        # Ask the browser to reconnect quickly if the stream is closed
+        yield f"retry: {int(LIVE_STREAM_INTERVAL * 1000)}\n\n"
+        started = time.monotonic()
+        try:
+            # Streams are recycled periodically so a thread is never held forever
+            while not subscriber.dropped and time.monotonic() - started < LIVE_STREAM_MAX_AGE:
+                try:
+                    event, data = subscriber.queue.get(timeout=LIVE_STREAM_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            live_broadcaster.unsubscribe(subscriber)
+
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(live_stream_slots.release)
+    return response
+
+
 @app.route('/api/historical-data')
 def get_historical_data():
-    """Get historical sensor data from database for a specific date (returns all records for today)"""
+    """Get historical sensor data from database for a specific date"""
     date = request.args.get('date')
     sensor = request.args.get('sensor', 'temperature')
 
-    print(f"\n=== HISTORICAL DATA REQUEST ===")
-    print(f"Date: {date}")
-    print(f"Sensor: {sensor}")
-
     if not date:
         return jsonify({'success': False, 'error': 'Date parameter required'}), 400
 
     # Validate sensor type
-    if sensor not in ['temperature', 'humidity']:
+    if sensor not in SENSOR_TYPES:
         return jsonify({'success': False, 'error': 'Invalid sensor type'}), 400
 
     try:
-        conn = get_db_connection()
-        if not conn:
-            print("✗ Database connection failed")
-            return jsonify({'success': False, 'error': 'Database connection failed'}), 500
-
-        cursor = conn.cursor(row_factory=dict_row)
+        start, end = parse_date_range(date)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Date must be in YYYY-MM-DD format'}), 400
 
-        # Since we only have TIME column, fetch all records and return them
-        # This will show the pattern for a typical day
-        query = f"""
-            SELECT time, value 
-            FROM {sensor} 
-            ORDER BY time ASC
-        """
-
-        print(f"Executing query: {query}")
+    try:
+        max_points, resolution, method = parse_downsample_args(request.args)
+        series_format = negotiate_format(request.args.get('format'), request.accept_mimetypes)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    encoding = series_encoding(series_format, request.accept_encodings)
+    cache_key = response_cache.key_for(
+        'historical-data', sensor, start, end, max_points, resolution, method, series_format, encoding
+    )
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached_response(cached)
+    # Taken before querying so readings committed meanwhile invalidate the entry
+    created_ns = time.time_ns()
 
-        cursor.execute(query)
-        results = cursor.fetchall()
+    try:
+        hot = hot_tier_covers(start, end)
+        if hot:
+            # Recent days are answered locally, without a round trip to PostgreSQL
+            with span('hot-tier'):
+                results, downsampled = hot_store.series(sensor, start, end, max_points, resolution, method)
+        else:
+            with get_db_connection() as conn:
+                if not conn:
+                    return jsonify({'success': False, 'error': 'Database connection failed'}), 500
 
-        print(f"✓ Query executed successfully")
-        print(f"Rows returned: {len(results)}")
+                cursor = conn.cursor(row_factory=dict_row)
 
-        cursor.close()
-        conn.close()
+                # Only the requested day is read from the table
+                with span('db-query'):
+                    results, downsampled = fetch_sensor_series(cursor, sensor, start, end, max_points, resolution, method)
 
-        # Format data for Chart.js
-        data = {
-            'labels': [row['time'].strftime('%H:%M:%S') for row in results],
-            'values': [float(row['value']) for row in results]
-        }
+                cursor.close()
 
-        print(f"✓ Response data formatted")
-        return jsonify({'success': True, 'data': data})
+        log.debug('Historical data', extra={'sensor': sensor, 'date': date, 'rows': len(results), 'format': series_format})
+        with span('serialize'):
+            body, headers = render_series(results, '%H:%M:%S', downsampled, series_format, encoding)
+        return cached_response(store_series_response(cache_key, body, headers, sensor, start, end, created_ns, hot))
 
     except Exception as e:
-        print(f"✗ ERROR in historical-data: {e}")
-        traceback.print_exc()
+        log.exception('Error in historical-data')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
@@ -190,164 +1379,377 @@ def get_daily_averages():
     end_date = request.args.get('end_date')
     sensor = request.args.get('sensor', 'temperature')
 
-    print(f"\n=== DAILY DATA REQUEST ===")
-    print(f"Start Date: {start_date}")
-    print(f"End Date: {end_date}")
-    print(f"Sensor: {sensor}")
-
     if not start_date or not end_date:
         return jsonify({'success': False, 'error': 'Start and end dates required'}), 400
 
     # Validate sensor type
-    if sensor not in ['temperature', 'humidity']:
+    if sensor not in SENSOR_TYPES:
         return jsonify({'success': False, 'error': 'Invalid sensor type'}), 400
 
     try:
-        conn = get_db_connection()
-        if not conn:
-            print("✗ Database connection failed")
-            return jsonify({'success': False, 'error': 'Database connection failed'}), 500
-
-        cursor = conn.cursor(row_factory=dict_row)
+        start, end = parse_date_range(start_date, end_date)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid date range: {e}'}), 400
 
-        # Get all data points with their exact time
-        query = f"""
-            SELECT time, value
-            FROM {sensor} 
-            ORDER BY time ASC
-        """
-
-        print(f"Executing query: {query}")
+    try:
+        max_points, resolution, method = parse_downsample_args(request.args)
+        series_format = negotiate_format(request.args.get('format'), request.accept_mimetypes)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    encoding = series_encoding(series_format, request.accept_encodings)
+    cache_key = response_cache.key_for(
+        'daily-averages', sensor, start, end, max_points, resolution, method, series_format, encoding
+    )
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached_response(cached)
+    # Taken before querying so readings committed meanwhile invalidate the entry
+    created_ns = time.time_ns()
 
-        cursor.execute(query)
-        results = cursor.fetchall()
+    try:
+        hot = hot_tier_covers(start, end)
+        if hot:
+            with span('hot-tier'):
+                results, downsampled = hot_store.series(sensor, start, end, max_points, resolution, method)
+        else:
+            with get_db_connection() as conn:
+                if not conn:
+                    return jsonify({'success': False, 'error': 'Database connection failed'}), 500
 
-        print(f"✓ Query executed successfully")
-        print(f"Rows returned: {len(results)}")
+                cursor = conn.cursor(row_factory=dict_row)
 
-        if results:
-            print(f"Sample row: {results[0]}")
+                # Get data points within the range, downsampled to max_points
+                with span('db-query'):
+                    results, downsampled = fetch_sensor_series(cursor, sensor, start, end, max_points, resolution, method)
 
-        cursor.close()
-        conn.close()
+                cursor.close()
 
         # Format data for Chart.js - showing all data points with exact times
-        data = {
-            'labels': [row['time'].strftime('%H:%M:%S') for row in results],
-            'values': [float(row['value']) for row in results]
-        }
-
-        print(f"✓ Response data formatted: {len(data['labels'])} data points")
-        return jsonify({'success': True, 'data': data})
+        # (multi-day ranges include the date so labels stay unambiguous)
+        label_format = '%H:%M:%S' if end - start <= timedelta(days=1) else '%m-%d %H:%M'
+
+        log.debug('Daily data', extra={
+            'sensor': sensor,
+            'start_date': start_date,
+            'end_date': end_date,
+            'rows': len(results),
+            'format': series_format
+        })
+        with span('serialize'):
+            body, headers = render_series(results, label_format, downsampled, series_format, encoding)
+        return cached_response(store_series_response(cache_key, body, headers, sensor, start, end, created_ns, hot))
 
     except Exception as e:
-        print(f"✗ ERROR in daily-data: {e}")
-        traceback.print_exc()
+        log.exception('Error in daily-averages')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# Hour-of-day alert pattern over a range, read from the hourly rollup
+DAILY_ALERTS_SQL = """
+    SELECT 
+        EXTRACT(HOUR FROM bucket) as hour,
+        SUM(event_count) as alert_count
+    FROM security_event_rollups
+    WHERE grain = 'hour'
+      AND event_type = ANY(%s)
+      AND bucket >= %s
+      AND bucket < %s
+    GROUP BY EXTRACT(HOUR FROM bucket)
+    ORDER BY hour ASC
+"""
+
+
+def format_daily_alerts(rows):
+    """Format hourly alert counts for Chart.js"""
+    return {
+        'labels': [f"{int(row['hour']):02d}:00" for row in rows],
+        'values': [int(row['alert_count']) for row in rows]
+    }
+
+
 @app.route('/api/daily-alerts')
 def get_daily_alerts():
     """Get alert counts grouped by hour"""
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
 
-    print(f"\n=== DAILY ALERTS REQUEST ===")
-    print(f"Start Date: {start_date}")
-    print(f"End Date: {end_date}")
-
     if not start_date or not end_date:
         return jsonify({'success': False, 'error': 'Start and end dates required'}), 400
 
     try:
-        conn = get_db_connection()
-        if not conn:
-            print("✗ Database connection failed")
-            return jsonify({'success': False, 'error': 'Database connection failed'}), 500
+        start, end = parse_date_range(start_date, end_date)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid date range: {e}'}), 400
 
-        cursor = conn.cursor(row_factory=dict_row)
+    try:
+        with get_db_connection() as conn:
+            if not conn:
+                return jsonify({'success': False, 'error': 'Database connection failed'}), 500
 
-        # Since we only have TIME, group by hour to show alert pattern
-        query = """
-            SELECT 
-                EXTRACT(HOUR FROM time) as hour,
-                COUNT(*) as alert_count
-            FROM status 
-            WHERE value = 'alert' OR value = 'armed'
-            GROUP BY EXTRACT(HOUR FROM time)
-            ORDER BY hour ASC
-        """
+            cursor = conn.cursor(row_factory=dict_row)
 
-        print(f"Executing query: {query}")
+            with span('db-query'):
+                cursor.execute(DAILY_ALERTS_SQL, (ALERT_EVENT_TYPES, start, end))
+                results = cursor.fetchall()
 
-        cursor.execute(query)
-        results = cursor.fetchall()
+            cursor.close()
 
-        print(f"✓ Query executed successfully")
-        print(f"Rows returned: {len(results)}")
+        with span('serialize'):
+            return jsonify({'success': True, 'data': format_daily_alerts(results)})
 
-        if results:
-            print(f"Sample row: {results[0]}")
+    except Exception as e:
+        log.exception('Error in daily-alerts')
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        cursor.close()
-        conn.close()
 
-        # Format data for Chart.js - showing hourly alert counts
-        data = {
-            'labels': [f"{int(row['hour']):02d}:00" for row in results],
-            'values': [int(row['alert_count']) for row in results]
-        }
+def encode_page_cursor(timestamp, event_id):
+    """Opaque keyset cursor for the last row of a page"""
+    raw = f"{timestamp.isoformat()}|{event_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
 
-        print(f"✓ Response data formatted: {len(data['labels'])} data points")
-        return jsonify({'success': True, 'data': data})
 
-    except Exception as e:
-        print(f"✗ ERROR in daily-alerts: {e}")
-        traceback.print_exc()
-        return jsonify({'success': False, 'error': str(e)}), 500
+def decode_page_cursor(cursor):
+    """Inverse of encode_page_cursor; raises ValueError for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, event_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(event_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
 
 
-@app.route('/api/intrusions')
-def get_intrusions():
-    """Get intrusion/alert events"""
-    date = request.args.get('date')
+def parse_intrusions_args(args):
+    """(start, end, limit, after, event_types) from /api/intrusions query parameters.
 
-    if not date:
-        return jsonify({'success': False, 'error': 'Date parameter required'}), 400
+    Returns None without a date; raises ValueError for malformed ones.
+    """
+    start_date = args.get('start_date') or args.get('date')
+    end_date = args.get('end_date') or start_date
+    if not start_date:
+        return None
 
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'success': False, 'error': 'Database connection failed'}), 500
+        start, end = parse_date_range(start_date, end_date)
+    except ValueError as e:
+        raise ValueError(f'Invalid date range: {e}') from None
+    limit = int_arg(args, 'limit', INTRUSIONS_PAGE_SIZE)
+    limit = max(1, min(limit, INTRUSIONS_MAX_PAGE_SIZE))
+    after = args.get('cursor')
+    after = decode_page_cursor(after) if after else None
+
+    event_types = [value.strip() for value in args.get('event_type', '').split(',') if value.strip()]
+    return start, end, limit, after, event_types or ALERT_EVENT_TYPES
+
+
+def intrusions_query(start, end, limit, after, event_types):
+    """Query for one page of security events, newest first"""
+    query = """
+        SELECT id, timestamp, event_type, details
+        FROM security_events
+        WHERE event_type = ANY(%s)
+          AND timestamp >= %s
+          AND timestamp < %s
+    """
+    params = [event_types, start, end]
+    if after:
+        # Keyset: continue strictly after the previous page's last row. The
+        # plain timestamp bound lets the timestamp index start the scan there,
+        # so deep pages cost the same as the first one.
+        query += """
+          AND timestamp <= %s
+          AND (timestamp, id) < (%s, %s)
+        """
+        params += [after[0], after[0], after[1]]
+    query += """
+        ORDER BY timestamp DESC, id DESC
+        LIMIT %s
+    """
+    # One extra row tells us whether another page exists
+    params.append(limit + 1)
+    return query, params
+
+
+def format_intrusions_page(results, limit):
+    """Response payload for a page fetched with intrusions_query"""
+    has_more = len(results) > limit
+    results = results[:limit]
+
+    intrusions = [{
+        'id': row['id'],
+        'timestamp': row['timestamp'].isoformat(),
+        'time': row['timestamp'].strftime('%H:%M:%S'),
+        'event_type': row['event_type'],
+        'details': row['details']
+    } for row in results]
+
+    last = results[-1] if results else None
+    return {
+        'success': True,
+        'data': intrusions,
+        'has_more': has_more,
+        'next_cursor': encode_page_cursor(last['timestamp'], last['id']) if has_more else None
+    }
 
-        cursor = conn.cursor(row_factory=dict_row)
 
-        # Query alert events from status table (all records since we don't have dates)
-        query = """
-            SELECT time, value 
-            FROM status 
-            WHERE value = 'alert'
-            ORDER BY time DESC
-            LIMIT 50
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
+@app.route('/api/intrusions')
+def get_intrusions():
+    """Get security events for a date range, newest first, one keyset page at a time"""
+    try:
+        page = parse_intrusions_args(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if page is None:
+        return jsonify({'success': False, 'error': 'Date parameter required'}), 400
 
-        cursor.close()
-        conn.close()
+    start, end, limit, after, event_types = page
+    query, params = intrusions_query(start, end, limit, after, event_types)
 
-        intrusions = [{
-            'timestamp': row['time'].strftime('%H:%M:%S'),
-            'event_type': 'alert' if row['value'] == 'alert' else 'armed',
-            'details': f"System status: {row['value']}"
-        } for row in results]
+    try:
+        with get_db_connection() as conn:
+            if not conn:
+                return jsonify({'success': False, 'error': 'Database connection failed'}), 500
+
+            cursor = conn.cursor(row_factory=dict_row)
+            cursor.execute(query, params)
+            results = cursor.fetchall()
+            cursor.close()
 
-        return jsonify({'success': True, 'data': intrusions})
+        return jsonify(format_intrusions_page(results, limit))
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# Exportable tables: output columns, filter column (and its query parameter), sort order
+EXPORT_DATASETS = {
+    'sensor_data': {
+        'columns': ['timestamp', 'sensor_type', 'value', 'unit'],
+        'filter': ('sensor_type', 'sensor'),
+        'order': 'timestamp, sensor_type'
+    },
+    'security_events': {
+        'columns': ['id', 'timestamp', 'event_type', 'details'],
+        'filter': ('event_type', 'event_type'),
+        'order': 'timestamp, id'
+    }
+}
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+
+def build_export_query(dataset, start, end, values):
+    """SQL and parameters for one export (identifiers only come from EXPORT_DATASETS)"""
+    spec = EXPORT_DATASETS[dataset]
+    filter_column = spec['filter'][0]
+    query = f"""
+        SELECT {', '.join(spec['columns'])}
+        FROM {dataset}
+        WHERE timestamp >= %s
+          AND timestamp < %s
+    """
+    params = [start, end]
+    if values:
+        query += f"      AND {filter_column} = ANY(%s)\n"
+        params.append(values)
+    query += f"        ORDER BY {spec['order']}"
+    return query, params
+
+
+def stream_export(conn, query, params, columns, export_format):
+    """Yield an export body in chunks read from a server-side cursor.
+
+    Rows are fetched EXPORT_ITERSIZE at a time and flushed every
+    EXPORT_CHUNK_BYTES, so worker memory stays flat however long the range.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == 'csv':
+        writer.writerow(columns)
+
+    rows = 0
+    try:
+        # Named cursors only live inside a transaction (the pool runs in autocommit)
+        with conn.transaction(), conn.cursor(name='export') as cursor:
+            cursor.itersize = EXPORT_ITERSIZE
+            cursor.execute(query, params)
+            for row in cursor:
+                row = [value.isoformat() if isinstance(value, datetime) else value for value in row]
+                if export_format == 'csv':
+                    writer.writerow(row)
+                else:
+                    buffer.write(json.dumps(dict(zip(columns, row)), default=float))
+                    buffer.write('\n')
+                rows += 1
+                if buffer.tell() >= EXPORT_CHUNK_BYTES:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+        log.info('Export finished', extra={'rows': rows})
+    except GeneratorExit:
+        log.info('Export cancelled by client', extra={'rows': rows})
+        raise
+    except Exception:
+        # Headers are already sent; the truncated body is all we can signal
+        log.exception('Error in export', extra={'rows': rows})
+
+
+@app.route('/api/export')
+def export_data():
+    """Stream sensor_data or security_events rows for a date range as CSV or NDJSON"""
+    dataset = request.args.get('dataset', 'sensor_data')
+    export_format = request.args.get('format', 'csv')
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date', start_date)
+
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({'success': False, 'error': f"dataset must be one of {', '.join(EXPORT_DATASETS)}"}), 400
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    if not start_date:
+        return jsonify({'success': False, 'error': 'start_date parameter required'}), 400
+
+    try:
+        start, end = parse_date_range(start_date, end_date)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid date range: {e}'}), 400
+
+    filter_param = EXPORT_DATASETS[dataset]['filter'][1]
+    values = [value.strip() for value in request.args.get(filter_param, '').split(',') if value.strip()]
+    query, params = build_export_query(dataset, start, end, values)
+
+    # The connection is held for the whole stream and returned when the
+    # response is closed (finished or client gone)
+    try:
+        pool = get_db_pool()
+        conn = pool.getconn()
+    except Exception:
+        log.exception('Database connection error')
+        return jsonify({'success': False, 'error': 'Database connection failed'}), 500
+
+    log.info('Export started', extra={
+        'dataset': dataset,
+        'start_date': start_date,
+        'end_date': end_date,
+        'format': export_format
+    })
+    columns = EXPORT_DATASETS[dataset]['columns']
+    response = Response(
+        stream_export(conn, query, params, columns, export_format),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={
+            'Content-Disposition': f'attachment; filename="{dataset}_{start_date}_{end_date}.{export_format}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    response.call_on_close(lambda: pool.putconn(conn))
+    return response
+
+
 @app.route('/api/control', methods=['POST'])
 def control_device():
     """Control devices via Adafruit IO"""
@@ -359,28 +1761,82 @@ def control_device():
     device = data['device']
     action = data['action']
 
-    # Map device names to Adafruit IO feed names
-    device_feeds = {
-        'system': 'system',
-        'screen': 'screen',
-        'light': 'light',
-        'buzzer': 'buzzer',
-        'clock': 'clock',
-        'dht': 'dht'
-    }
-
-    if device not in device_feeds:
+    if device not in DEVICE_FEEDS:
         return jsonify({'success': False, 'error': 'Unknown device'}), 400
 
-    feed_key = device_feeds[device]
+    feed_key = DEVICE_FEEDS[device]
 
-    # Send command to Adafruit IO
-    success = send_adafruit_command(feed_key, action)
+    def on_done(command):
+        # Superseded commands never reached the device but are still audited
+        record_device_command(device, action, command['status'])
 
-    if success:
-        return jsonify({'success': True, 'message': f'Command sent to {device}'})
-    else:
-        return jsonify({'success': False, 'error': 'Failed to send command'}), 500
+    # Queue the command; bursts for the same feed collapse to the last value
+    command = command_queue.submit(feed_key, action, on_done=on_done)
+
+    return jsonify({
+        'success': True,
+        'message': f'Command queued for {device}',
+        'command': command,
+        'status_url': f"/api/control/commands/{command['id']}"
+    }), 202
+
+
+@app.route('/api/control/devices/<device>')
+def get_device_state(device):
+    """Get the last value written to a device's feed"""
+    if device not in DEVICE_FEEDS:
+        return jsonify({'success': False, 'error': 'Unknown device'}), 404
+
+    feed_data = get_adafruit_feed_data(DEVICE_FEEDS[device])
+    if feed_data is None:
+        return jsonify({'success': False, 'error': 'Device state unavailable'}), 503
+    return jsonify({
+        'success': True,
+        'device': device,
+        'value': feed_data.get('value'),
+        'updated_at': feed_data.get('created_at')
+    })
+
+
+@app.route('/api/control/commands/<command_id>')
+def get_command_status(command_id):
+    """Get the delivery status of a queued command (?wait=seconds to long-poll)"""
+    try:
+        wait = min(float(request.args.get('wait', 0)), COMMAND_WAIT_MAX)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'wait must be a number of seconds'}), 400
+
+    command = command_queue.wait(command_id, wait) if wait > 0 else command_queue.get(command_id)
+    if command is None:
+        return jsonify({'success': False, 'error': 'Unknown command'}), 404
+    return jsonify({'success': True, 'command': command})
+
+
+@app.route('/api/control/commands/<command_id>/stream')
+def stream_command_status(command_id):
+    """Stream a queued command's status changes as Server-Sent Events"""
+    command = command_queue.get(command_id)
+    if command is None:
+        return jsonify({'success': False, 'error': 'Unknown command'}), 404
+
+    def generate():
+        current = command
+        started = time.monotonic()
+        yield f"event: command\ndata: {json.dumps(current)}\n\n"
+        while current['status'] not in TERMINAL_STATES and time.monotonic() - started < COMMAND_WAIT_MAX:
+            latest = command_queue.wait(command_id, LIVE_STREAM_KEEPALIVE, previous=current['status'])
+            if latest is None:
+                return
+            if latest['status'] == current['status']:
+                yield ": keepalive\n\n"
+                continue
+            current = latest
+            yield f"event: command\ndata: {json.dumps(current)}\n\n"
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 
 @app.route('/api/security-toggle', methods=['POST'])
@@ -394,28 +1850,36 @@ def toggle_security():
     enabled = data['enabled']
     value = 'armed' if enabled else 'disarmed'
 
-    success = send_adafruit_command('status', value)
+    def on_done(command):
+        record_device_command('security', value, command['status'])
+        if command['status'] == 'delivered':
+            record_alarm_status(value)
 
-    if success:
-        return jsonify({'success': True, 'message': f'Security system {"enabled" if enabled else "disabled"}'})
-    else:
-        return jsonify({'success': False, 'error': 'Failed to toggle security system'}), 500
+    # Same queue as /api/control, so arm/disarm toggles are debounced and ordered too
+    command = command_queue.submit('status', value, on_done=on_done)
+
+    return jsonify({
+        'success': True,
+        'message': f'Security system {"enable" if enabled else "disable"} queued',
+        'command': command,
+        'status_url': f"/api/control/commands/{command['id']}"
+    }), 202
 
 
 @app.route('/api/system-status')
 def get_system_status():
     """Get current system status"""
     try:
-        alarm_status = get_adafruit_feed_data('status')
-        temperature = get_adafruit_feed_data('temperature')
-        humidity = get_adafruit_feed_data('humidity')
+        feeds = get_adafruit_feeds(['status', 'temperature', 'humidity'])
+        alarm_status = feeds['status']
 
         return jsonify({
             'success': True,
+            'partial': any(value is None for value in feeds.values()),
             'status': {
                 'alarm': alarm_status.get('value') if alarm_status else 'unknown',
-                'temperature': float(temperature.get('value')) if temperature else None,
-                'humidity': float(humidity.get('value')) if humidity else None,
+                'temperature': feed_value_as_float(feeds['temperature']),
+                'humidity': feed_value_as_float(feeds['humidity']),
                 'last_update': datetime.now().isoformat()
             }
         })
@@ -423,5 +1887,104 @@ def get_system_status():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/ingest', methods=['POST'])
+def ingest_readings():
+    """Accept a batch of device readings and queue them for bulk insert"""
+    if INGEST_TOKEN and not hmac.compare_digest(request.headers.get('X-Ingest-Token', ''), INGEST_TOKEN):
+        return jsonify({'success': False, 'error': 'Invalid ingest token'}), 401
+
+    if request.content_length and request.content_length > INGEST_MAX_BODY_BYTES:
+        return jsonify({'success': False, 'error': 'Request body too large'}), 413
+
+    # Bounded read: a chunked or length-less body never buffers more than the cap
+    body = request.stream.read(INGEST_MAX_BODY_BYTES + 1)
+    if len(body) > INGEST_MAX_BODY_BYTES:
+        return jsonify({'success': False, 'error': 'Request body too large'}), 413
+
+    try:
+        readings = decode_body(body, request.content_type)
+    except IngestError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+
+    if len(readings) > INGEST_MAX_BATCH:
+        return jsonify({'success': False, 'error': f'At most {INGEST_MAX_BATCH} readings per request'}), 413
+
+    rows, errors = parse_readings(readings)
+
+    # Rows are written by the background writer, never on the request path
+    if not ingest_writer.offer(rows):
+        response = jsonify({'success': False, 'error': 'Ingest buffer full, retry later'})
+        response.headers['Retry-After'] = str(max(1, math.ceil(INGEST_FLUSH_INTERVAL)))
+        return response, 429
+
+    return jsonify({
+        'success': True,
+        'accepted': len(rows),
+        'rejected': len(errors),
+        'errors': errors[:20]
+    }), 202
+
+
+@app.route('/api/ingest/status')
+def get_ingest_status():
+    """Get ingest buffer depth and flush counters for the worker serving this request"""
+    return jsonify({'success': True, 'ingest': ingest_writer.stats()})
+
+
+@app.route('/api/audit/status')
+def get_audit_status():
+    """Get control audit queue depth and lag for the worker serving this request"""
+    return jsonify({'success': True, 'audit': audit_writer.stats(), 'commands': command_queue.stats()})
+
+
+@app.route('/api/alerts/status')
+def get_alerts_status():
+    """Get alert rules, active conditions and recent alerts (kept by the worker leading the follower)"""
+    return jsonify({'success': True, 'alerts': {**alert_engine.stats(), 'follower': alert_follower.stats()}})
+
+
+@app.route('/api/feed-cache')
+def get_feed_cache_status():
+    """Get Adafruit IO feed cache and client counters for the worker serving this request"""
+    return jsonify({'success': True, 'cache': feed_cache.stats(), 'client': adafruit.stats()})
+
+
+@app.route('/api/response-cache')
+def get_response_cache_status():
+    """Get chart response cache counters for the worker serving this request"""
+    return jsonify({'success': True, 'cache': response_cache.stats()})
+
+
+@app.route('/api/hot-tier')
+def get_hot_tier_status():
+    """Get hot tier coverage and sync counters"""
+    if hot_store is None:
+        return jsonify({'success': True, 'hot_tier': None})
+    try:
+        return jsonify({'success': True, 'hot_tier': hot_store.stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus metrics, aggregated over every worker on this host"""
+    if not METRICS_ENABLED:
+        return jsonify({'success': False, 'error': 'prometheus_client is not installed'}), 503
+    # Make this worker's counters current; the others export on their own timer
+    stats_exporter.export()
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
+@app.route('/api/db-pool')
+def get_db_pool_status():
+    """Get connection pool usage for the worker serving this request"""
+    try:
+        return jsonify({'success': True, 'pool': get_db_pool_stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
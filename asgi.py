@@ -0,0 +1,458 @@
+"""
+ASGI entry point
+Async serving mode: I/O-bound and database-bound endpoints run on the event
+loop and every other route is served by the Flask app from app.py
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+The sync mode (gunicorn app:app) is unchanged.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from a2wsgi import WSGIMiddleware
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import http_date, parse_accept_header, parse_date, parse_etags
+
+from adafruit_client import AsyncAdafruitClient
+from app import (
+    ADAFRUIT_FETCH_DEADLINE,
+    ALERT_EVENT_TYPES,
+    DAILY_ALERTS_SQL,
+    DATABASE_URL,
+    DB_POOL_MAX_IDLE,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_RECONNECT_TIMEOUT,
+    DB_POOL_TIMEOUT,
+    LIVE_FEEDS,
+    LIVE_STREAM_INTERVAL,
+    LIVE_STREAM_KEEPALIVE,
+    LIVE_STREAM_MAX_AGE,
+    SENSOR_TYPES,
+    SERVER_TIMING,
+    LiveSubscriber,
+    adafruit,
+    alert_follower,
+    build_live_snapshot,
+    feed_cache,
+    feed_value_as_float,
+    finish_reduction,
+    format_daily_alerts,
+    format_intrusions_page,
+    hot_store,
+    hot_tier_covers,
+    intrusions_query,
+    live_broadcaster,
+    parse_date_range,
+    parse_downsample_args,
+    parse_intrusions_args,
+    reduction_query,
+    render_series,
+    response_cache,
+    sensor_range_query,
+    series_cache_control,
+    series_encoding,
+    stats_exporter,
+    store_series_response
+)
+from app import app as flask_app
+from metrics import observe_request
+from series_format import negotiate_format
+from structured_log import span, start_request
+
+# Async serving configuration
+ASYNC_DB_POOL_MAX_SIZE = int(os.getenv('ASYNC_DB_POOL_MAX_SIZE', '20'))
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv('ASYNC_HTTP_MAX_CONNECTIONS', '100'))
+# Threads serving the Flask routes that are not async
+ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', '32'))
+
+log = logging.getLogger(__name__)
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+}
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.adafruit = AsyncAdafruitClient(adafruit, max_connections=ASYNC_HTTP_MAX_CONNECTIONS)
+    app.state.db_pool = None
+    if DATABASE_URL:
+        app.state.db_pool = AsyncConnectionPool(
+            DATABASE_URL,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=ASYNC_DB_POOL_MAX_SIZE,
+            timeout=DB_POOL_TIMEOUT,
+            max_idle=DB_POOL_MAX_IDLE,
+            max_lifetime=DB_POOL_MAX_LIFETIME,
+            reconnect_timeout=DB_POOL_RECONNECT_TIMEOUT,
+            check=AsyncConnectionPool.check_connection,
+            kwargs={'autocommit': True},
+            name=f'asgi-{os.getpid()}',
+            open=False
+        )
+        await app.state.db_pool.open()
+        log.info('Async database pool created', extra={'min_size': DB_POOL_MIN_SIZE, 'max_size': ASYNC_DB_POOL_MAX_SIZE})
+    stats_exporter.start()
+    alert_follower.start()
+    log.info('Async serving mode ready')
+
+    try:
+        yield
+    finally:
+        await app.state.adafruit.aclose()
+        if app.state.db_pool is not None:
+            await app.state.db_pool.close()
+
+
+@asynccontextmanager
+async def get_db_connection(request):
+    """Borrow a connection from the async pool (yields None if unavailable)"""
+    pool = request.app.state.db_pool
+    try:
+        if pool is None:
+            raise RuntimeError('DATABASE_URL is not configured')
+        with span('db-connect'):
+            conn = await pool.getconn()
+    except Exception:
+        log.exception('Database connection error')
+        yield None
+        return
+
+    try:
+        yield conn
+    finally:
+        await pool.putconn(conn)
+
+
+async def get_adafruit_feeds(request, feed_keys, deadline=ADAFRUIT_FETCH_DEADLINE):
+    """Read several feeds concurrently through the shared feed cache.
+
+    Same contract as app.get_adafruit_feeds: feeds that fail or miss the
+    deadline map to None.
+    """
+    client = request.app.state.adafruit
+    tasks = {
+        feed_key: asyncio.ensure_future(feed_cache.aget(feed_key, client.get_last))
+        for feed_key in feed_keys
+    }
+    done, _ = await asyncio.wait(tasks.values(), timeout=deadline)
+
+    # A late fetch keeps running and will still populate the cache
+    return {
+        feed_key: task.result() if task in done and not task.exception() else None
+        for feed_key, task in tasks.items()
+    }
+
+
+class AsyncLiveSubscriber(LiveSubscriber):
+    """Live-stream client served on the event loop instead of a thread"""
+
+    def __init__(self, loop, maxsize=32):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def push(self, message):
+        # Called from the broadcaster thread, or an ingest thread for alerts
+        if self.queue.full():
+            return False
+        self.loop.call_soon_threadsafe(self._put, message)
+        return True
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped = True
+
+
+def timed(endpoint):
+    """Server-Timing and access record for an async route (Flask routes get theirs from app.py)"""
+    async def timed_endpoint(request):
+        timings = start_request()
+        response = await endpoint(request)
+        total = timings.elapsed_ms()
+        spans = timings.summary()
+        if SERVER_TIMING:
+            response.headers['Server-Timing'] = timings.header(total)
+        log.info('Request', extra={
+            'method': request.method,
+            'path': request.url.path,
+            'status': response.status_code,
+            'duration_ms': round(total, 2),
+            'spans': spans
+        })
+        observe_request(request.url.path, request.method, response.status_code, total / 1000, spans)
+        return response
+    return timed_endpoint
+
+
+async def get_live_data(request):
+    """Get live data from Adafruit IO for multiple sensors"""
+    try:
+        feeds = await get_adafruit_feeds(request, LIVE_FEEDS)
+        data = build_live_snapshot(feeds)
+        data['timestamp'] = datetime.now().isoformat()
+
+        return JSONResponse({
+            'success': True,
+            'partial': any(value is None for value in feeds.values()),
+            'data': data
+        })
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def live_stream(request):
+    """Stream live sensor changes and alerts as Server-Sent Events"""
+    subscriber = live_broadcaster.subscribe(AsyncLiveSubscriber(asyncio.get_running_loop()))
+
+    async def generate():
+        yield f"retry: {int(LIVE_STREAM_INTERVAL * 1000)}\n\n"
+        started = time.monotonic()
+        try:
+            while not subscriber.dropped and time.monotonic() - started < LIVE_STREAM_MAX_AGE:
+                try:
+                    event, data = await asyncio.wait_for(subscriber.queue.get(), LIVE_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            live_broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+
+async def get_system_status(request):
+    """Get current system status"""
+    try:
+        feeds = await get_adafruit_feeds(request, ['status', 'temperature', 'humidity'])
+        alarm_status = feeds['status']
+
+        return JSONResponse({
+            'success': True,
+            'partial': any(value is None for value in feeds.values()),
+            'status': {
+                'alarm': alarm_status.get('value') if alarm_status else 'unknown',
+                'temperature': feed_value_as_float(feeds['temperature']),
+                'humidity': feed_value_as_float(feeds['humidity']),
+                'last_update': datetime.now().isoformat()
+            }
+        })
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def get_daily_alerts(request):
+    """Get alert counts grouped by hour"""
+    start_date = request.query_params.get('start_date')
+    end_date = request.query_params.get('end_date')
+
+    if not start_date or not end_date:
+        return JSONResponse({'success': False, 'error': 'Start and end dates required'}, status_code=400)
+
+    try:
+        start, end = parse_date_range(start_date, end_date)
+    except ValueError as e:
+        return JSONResponse({'success': False, 'error': f'Invalid date range: {e}'}, status_code=400)
+
+    try:
+        async with get_db_connection(request) as conn:
+            if not conn:
+                return JSONResponse({'success': False, 'error': 'Database connection failed'}, status_code=500)
+
+            async with conn.cursor(row_factory=dict_row) as cursor:
+                with span('db-query'):
+                    await cursor.execute(DAILY_ALERTS_SQL, (ALERT_EVENT_TYPES, start, end))
+                    results = await cursor.fetchall()
+
+        return JSONResponse({'success': True, 'data': format_daily_alerts(results)})
+    except Exception as e:
+        log.exception('Error in daily-alerts')
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def fetch_sensor_series(cursor, sensor, start, end, max_points, resolution=None, method='lttb'):
+    """Async counterpart of app.fetch_sensor_series (same queries, same result)"""
+    if resolution is None:
+        await cursor.execute(*sensor_range_query(sensor, start, end, limit=max_points + 1))
+        rows = await cursor.fetchall()
+        if len(rows) <= max_points:
+            return rows, None
+
+    query, params, width = reduction_query(sensor, start, end, max_points, resolution, method)
+    await cursor.execute(query, params)
+    rows = await cursor.fetchall()
+    return await asyncio.to_thread(finish_reduction, rows, max_points, method, width)
+
+
+def cached_response(request, entry):
+    """Starlette counterpart of app.cached_response, including the 304 answer"""
+    headers = dict(entry['headers'])
+    headers.update({
+        'ETag': f'"{entry["etag"]}"',
+        'Last-Modified': http_date(entry['last_modified']),
+        'Cache-Control': series_cache_control(entry)
+    })
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        not_modified = parse_etags(if_none_match).contains_weak(entry['etag'])
+    else:
+        since = parse_date(request.headers.get('if-modified-since'))
+        not_modified = since is not None and entry['last_modified'] <= since
+    if not_modified:
+        for name in ('Content-Type', 'Content-Encoding', 'X-Downsampled'):
+            headers.pop(name, None)
+        return Response(status_code=304, headers=headers)
+    return Response(entry['body'], headers=headers)
+
+
+async def serve_series(request, endpoint, sensor, start, end, label_format):
+    """Cached, downsampled chart series for [start, end), shared by the chart routes"""
+    try:
+        max_points, resolution, method = parse_downsample_args(request.query_params)
+        accept = parse_accept_header(request.headers.get('accept'), MIMEAccept)
+        series_format = negotiate_format(request.query_params.get('format'), accept)
+    except ValueError as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=400)
+
+    encoding = series_encoding(series_format, parse_accept_header(request.headers.get('accept-encoding')))
+    cache_key = response_cache.key_for(
+        endpoint, sensor, start, end, max_points, resolution, method, series_format, encoding
+    )
+    # The cache and hot tier touch local files, so they stay off the event loop
+    cached = await asyncio.to_thread(response_cache.get, cache_key)
+    if cached is not None:
+        return cached_response(request, cached)
+    # Taken before querying so readings committed meanwhile invalidate the entry
+    created_ns = time.time_ns()
+
+    try:
+        hot = await asyncio.to_thread(hot_tier_covers, start, end)
+        if hot:
+            with span('hot-tier'):
+                results, downsampled = await asyncio.to_thread(
+                    hot_store.series, sensor, start, end, max_points, resolution, method
+                )
+        else:
+            async with get_db_connection(request) as conn:
+                if not conn:
+                    return JSONResponse({'success': False, 'error': 'Database connection failed'}, status_code=500)
+
+                async with conn.cursor(row_factory=dict_row) as cursor:
+                    with span('db-query'):
+                        results, downsampled = await fetch_sensor_series(
+                            cursor, sensor, start, end, max_points, resolution, method
+                        )
+
+        with span('serialize'):
+            body, headers = await asyncio.to_thread(
+                render_series, results, label_format, downsampled, series_format, encoding
+            )
+        entry = await asyncio.to_thread(
+            store_series_response, cache_key, body, headers, sensor, start, end, created_ns, hot
+        )
+        return cached_response(request, entry)
+    except Exception as e:
+        log.exception('Error in chart series', extra={'endpoint': endpoint})
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def get_historical_data(request):
+    """Get historical sensor data from database for a specific date"""
+    date = request.query_params.get('date')
+    sensor = request.query_params.get('sensor', 'temperature')
+
+    if not date:
+        return JSONResponse({'success': False, 'error': 'Date parameter required'}, status_code=400)
+
+    if sensor not in SENSOR_TYPES:
+        return JSONResponse({'success': False, 'error': 'Invalid sensor type'}, status_code=400)
+
+    try:
+        start, end = parse_date_range(date)
+    except ValueError:
+        return JSONResponse({'success': False, 'error': 'Date must be in YYYY-MM-DD format'}, status_code=400)
+
+    return await serve_series(request, 'historical-data', sensor, start, end, '%H:%M:%S')
+
+
+async def get_daily_averages(request):
+    """Get all sensor data points with exact timestamps"""
+    start_date = request.query_params.get('start_date')
+    end_date = request.query_params.get('end_date')
+    sensor = request.query_params.get('sensor', 'temperature')
+
+    if not start_date or not end_date:
+        return JSONResponse({'success': False, 'error': 'Start and end dates required'}, status_code=400)
+
+    if sensor not in SENSOR_TYPES:
+        return JSONResponse({'success': False, 'error': 'Invalid sensor type'}, status_code=400)
+
+    try:
+        start, end = parse_date_range(start_date, end_date)
+    except ValueError as e:
+        return JSONResponse({'success': False, 'error': f'Invalid date range: {e}'}, status_code=400)
+
+    # Multi-day ranges include the date so labels stay unambiguous
+    label_format = '%H:%M:%S' if end - start <= timedelta(days=1) else '%m-%d %H:%M'
+    return await serve_series(request, 'daily-averages', sensor, start, end, label_format)
+
+
+async def get_intrusions(request):
+    """Get security events for a date range, newest first, one keyset page at a time"""
+    try:
+        page = parse_intrusions_args(request.query_params)
+    except ValueError as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=400)
+    if page is None:
+        return JSONResponse({'success': False, 'error': 'Date parameter required'}, status_code=400)
+
+    start, end, limit, after, event_types = page
+    query, params = intrusions_query(start, end, limit, after, event_types)
+
+    try:
+        async with get_db_connection(request) as conn:
+            if not conn:
+                return JSONResponse({'success': False, 'error': 'Database connection failed'}, status_code=500)
+
+            async with conn.cursor(row_factory=dict_row) as cursor:
+                with span('db-query'):
+                    await cursor.execute(query, params)
+                    results = await cursor.fetchall()
+
+        return JSONResponse(format_intrusions_page(results, limit))
+    except Exception as e:
+        log.exception('Error in intrusions')
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+app = Starlette(
+    routes=[
+        Route('/api/live-data', timed(get_live_data)),
+        Route('/api/live-stream', timed(live_stream)),
+        Route('/api/system-status', timed(get_system_status)),
+        Route('/api/daily-alerts', timed(get_daily_alerts)),
+        Route('/api/historical-data', timed(get_historical_data)),
+        Route('/api/daily-averages', timed(get_daily_averages)),
+        Route('/api/intrusions', timed(get_intrusions)),
+        # Everything else (pages, controls, export, ingest) runs in the Flask app
+        Mount('/', app=WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS))
+    ],
+    lifespan=lifespan
+)
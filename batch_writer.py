@@ -0,0 +1,167 @@
+"""
+Batch Writer
+In-process write-behind buffer that moves database writes off the request path
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    """Buffers rows in memory and writes them in bulk from a background thread.
+
+    Rows are flushed when `flush_rows` are waiting or `flush_interval` seconds
+    have passed, whichever comes first. The buffer is bounded by `max_rows`;
+    `offer` refuses a batch that does not fit so callers can apply
+    backpressure instead of growing memory without limit.
+
+    `write_batch(rows)` does the actual write and may raise; failed rows are
+    put back at the front of the buffer (space permitting) and retried.
+    """
+
+    def __init__(self, name, write_batch, max_rows=50000, flush_rows=1000, flush_interval=1.0):
+        self.name = name
+        self.write_batch = write_batch
+        self.max_rows = max_rows
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._listeners = []
+        self._init_state()
+        os.register_at_fork(after_in_child=self._init_state)
+
+    def _init_state(self):
+        # Also run in a forked child: the parent's thread does not exist there
+        # and its buffered rows belong to the parent.
+        self._cond = threading.Condition()
+        self._chunks = deque()  # (enqueued_at, rows)
+        self._depth = 0
+        self._thread = None
+        self._closing = False
+        self._flushing = False
+        self.counters = {
+            'accepted': 0,
+            'written': 0,
+            'rejected': 0,
+            'dropped': 0,
+            'flush_errors': 0
+        }
+        self.last_flush = {'rows': 0, 'seconds': 0.0, 'at': None, 'error': None}
+
+    def add_listener(self, callback):
+        """Call `callback(rows)` after every successful write"""
+        self._listeners.append(callback)
+
+    def offer(self, rows):
+        """Queue rows for writing; returns False if the buffer is full"""
+        rows = list(rows)
+        if not rows:
+            return True
+        with self._cond:
+            if self._closing or self._depth + len(rows) > self.max_rows:
+                self.counters['rejected'] += len(rows)
+                return False
+            self._chunks.append((time.monotonic(), rows))
+            self._depth += len(rows)
+            self.counters['accepted'] += len(rows)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'{self.name}-writer', daemon=True)
+                self._thread.start()
+            if self._depth >= self.flush_rows:
+                self._cond.notify()
+        return True
+
+    def _take(self):
+        """Remove up to flush_rows rows from the buffer (caller holds the lock)"""
+        batch = []
+        while self._chunks and len(batch) < self.flush_rows:
+            enqueued_at, rows = self._chunks.popleft()
+            room = self.flush_rows - len(batch)
+            if len(rows) > room:
+                self._chunks.appendleft((enqueued_at, rows[room:]))
+                rows = rows[:room]
+            batch.extend(rows)
+        self._depth -= len(batch)
+        return batch
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        try:
+            self.write_batch(batch)
+        except Exception as e:
+            with self._cond:
+                self.counters['flush_errors'] += 1
+                self.last_flush['error'] = f"{type(e).__name__}: {e}"
+                if self._depth + len(batch) <= self.max_rows:
+                    self._chunks.appendleft((time.monotonic(), batch))
+                    self._depth += len(batch)
+                else:
+                    self.counters['dropped'] += len(batch)
+            log.warning('Batch flush failed', extra={'writer': self.name, 'rows': len(batch), 'error': str(e)})
+            return False
+
+        with self._cond:
+            self.counters['written'] += len(batch)
+            self.last_flush.update({
+                'rows': len(batch),
+                'seconds': round(time.perf_counter() - started, 4),
+                'at': time.time(),
+                'error': None
+            })
+        for listener in self._listeners:
+            try:
+                listener(batch)
+            except Exception:
+                log.exception('Batch flush listener failed', extra={'writer': self.name})
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._depth < self.flush_rows and not self._closing:
+                    self._cond.wait(self.flush_interval)
+                if not self._depth:
+                    if self._closing:
+                        return
+                    continue
+                batch = self._take()
+                self._flushing = True
+
+            ok = self._write(batch)
+
+            with self._cond:
+                self._flushing = False
+                self._cond.notify_all()
+                if not ok and self._closing:
+                    # Shutting down and the database is unreachable: give up
+                    self.counters['dropped'] += self._depth
+                    self._chunks.clear()
+                    self._depth = 0
+                    return
+            if not ok:
+                time.sleep(self.flush_interval)
+
+    def close(self, timeout=10.0):
+        """Stop accepting rows and flush what is buffered (used at shutdown)"""
+        with self._cond:
+            self._closing = True
+            thread = self._thread
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            lag = time.monotonic() - self._chunks[0][0] if self._chunks else 0.0
+            return {
+                'depth': self._depth,
+                'capacity': self.max_rows,
+                'lag_seconds': round(lag, 3),
+                'flushing': self._flushing,
+                **self.counters,
+                'last_flush': dict(self.last_flush)
+            }
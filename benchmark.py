@@ -0,0 +1,707 @@
+"""
+Benchmark Script
+Offline load test for the API and the sync pipeline
+
+Runs against a local PostgreSQL seeded with synthetic data and a fake
+Adafruit IO server, so nothing touches Neon or the real Adafruit account.
+Results are written as JSON and can be compared with an earlier run.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse
+
+import psycopg
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parent
+RESULTS_DIR = BASE_DIR / 'benchmark_results'
+
+SENSORS = {
+    # name: (unit, base, amplitude, noise)
+    'temperature': ('°C', 21.0, 4.0, 0.5),
+    'humidity': ('%', 45.0, 10.0, 2.0),
+    'light': ('lux', 300.0, 250.0, 20.0),
+}
+# Sensors the chart and ingest routes accept (app.SENSOR_TYPES); 'light' is only seeded
+CHART_SENSORS = ('temperature', 'humidity')
+DEVICES = ('light', 'buzzer', 'screen')
+EVENT_DETAILS = {
+    'alert': 'System alert',
+    'intrusion': 'Motion detected',
+    'state_change': 'System armed',
+}
+FEED_VALUES = {
+    'status': lambda rng: rng.choice(['armed', 'disarmed']),
+    'temperature': lambda rng: f"{rng.uniform(18, 26):.1f}",
+    'humidity': lambda rng: f"{rng.uniform(30, 60):.1f}",
+    'light': lambda rng: rng.choice(['on', 'off']),
+}
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1', '')
+
+# Rows per INSERT ... SELECT generate_series statement while seeding
+SEED_CHUNK_ROWS = 1_000_000
+
+
+# --- Synthetic database ------------------------------------------------------
+
+def reset_database(conn):
+    """Drop the app's tables and recreate them from schema.sql"""
+    conn.execute("""
+        DROP TABLE IF EXISTS sensor_data, security_events, sync_checkpoints, device_logs,
+                             system_status, sensor_rollups, security_event_rollups CASCADE
+    """)
+    conn.execute((BASE_DIR / 'schema.sql').read_text())
+
+
+def seed_database(conn, rows, events, days, end):
+    """Insert `rows` sensor readings and `events` security events ending at `end`.
+
+    Rows are generated by PostgreSQL (generate_series), so seeding 1e8 rows
+    costs no client memory and no network transfer.
+    """
+    start = end - timedelta(days=days)
+    seconds = days * 86400
+    per_sensor = max(1, rows // len(SENSORS))
+    step = seconds / per_sensor
+
+    for sensor, (unit, base, amplitude, noise) in SENSORS.items():
+        for first in range(0, per_sensor, SEED_CHUNK_ROWS):
+            last = min(per_sensor, first + SEED_CHUNK_ROWS) - 1
+            conn.execute("""
+                INSERT INTO sensor_data (timestamp, sensor_type, value, unit)
+                SELECT %(start)s + make_interval(secs => i * %(step)s),
+                       %(sensor)s,
+                       round((%(base)s + %(amplitude)s * sin(i * %(step)s / 13750.0)
+                              + random() * %(noise)s)::numeric, 2),
+                       %(unit)s
+                FROM generate_series(%(first)s::bigint, %(last)s::bigint) AS i
+                ON CONFLICT (sensor_type, timestamp) DO NOTHING
+            """, {
+                'start': start, 'step': step, 'sensor': sensor, 'base': base,
+                'amplitude': amplitude, 'noise': noise, 'unit': unit,
+                'first': first, 'last': last
+            })
+            print(f"  {sensor}: {last + 1:,}/{per_sensor:,} rows")
+
+    if events:
+        conn.execute("""
+            INSERT INTO security_events (timestamp, event_type, details)
+            SELECT %(start)s + make_interval(secs => i * %(step)s),
+                   (ARRAY['alert', 'intrusion', 'state_change'])[1 + i %% 3],
+                   (ARRAY[%(alert)s, %(intrusion)s, %(state_change)s])[1 + i %% 3]
+            FROM generate_series(0::bigint, %(last)s::bigint) AS i
+            ON CONFLICT (timestamp, event_type, details) DO NOTHING
+        """, {
+            'start': start, 'step': seconds / events, 'last': events - 1,
+            'alert': EVENT_DETAILS['alert'],
+            'intrusion': EVENT_DETAILS['intrusion'],
+            'state_change': EVENT_DETAILS['state_change']
+        })
+        print(f"  security_events: {events:,} rows")
+    conn.execute("ANALYZE")
+
+
+def data_range(conn):
+    """(first day, last day) of the seeded sensor_data"""
+    first, last = conn.execute("SELECT MIN(timestamp), MAX(timestamp) FROM sensor_data").fetchone()
+    if first is None:
+        raise SystemExit("sensor_data is empty; run with --rows first")
+    return first.date(), last.date()
+
+
+# --- Fake Adafruit IO --------------------------------------------------------
+
+class FakeAdafruitIO(ThreadingHTTPServer):
+    """Answers the two Adafruit IO calls the app makes, after a fixed latency"""
+
+    daemon_threads = True
+
+    def __init__(self, latency, error_rate, seed):
+        super().__init__(('127.0.0.1', 0), FakeAdafruitHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    @property
+    def api_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/v2"
+
+
+class FakeAdafruitHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, feed_key, value):
+        server = self.server
+        with server.lock:
+            server.calls += 1
+            failed = server.rng.random() < server.error_rate
+        time.sleep(server.latency)
+        if failed:
+            body, status = b'{"error": "fake upstream error"}', 503
+        else:
+            body = json.dumps({
+                'id': f'bench-{server.calls}',
+                'feed_key': feed_key,
+                'value': value,
+                'created_at': datetime.now(timezone.utc).isoformat()
+            }).encode()
+            status = 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # /api/v2/<user>/feeds/<key>/data/last
+        parts = self.path.strip('/').split('/')
+        feed_key = parts[4] if len(parts) > 4 else ''
+        with self.server.lock:
+            value = FEED_VALUES.get(feed_key, lambda rng: 'on')(self.server.rng)
+        self._respond(feed_key, value)
+
+    def do_POST(self):
+        parts = self.path.strip('/').split('/')
+        feed_key = parts[4] if len(parts) > 4 else ''
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)) or 0)
+        value = json.loads(body or b'{}').get('value')
+        self._respond(feed_key, value)
+
+
+# --- Server under test -------------------------------------------------------
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def process_tree_rss(pid):
+    """Resident memory (bytes) of a process and its children (Linux /proc only)"""
+    total = 0
+    pids = [pid]
+    while pids:
+        current = pids.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class MemorySampler:
+    """Tracks the peak RSS of the server process tree while a scenario runs"""
+
+    def __init__(self, pid, interval=0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = process_tree_rss(self.pid) if self.pid else 0
+        if self.pid:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, process_tree_rss(self.pid))
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+def start_server(args, api_url, workdir):
+    """Start gunicorn on a free port with an environment that only points at local stand-ins"""
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': args.database_url,
+        'MQTT_USERNAME': 'bench',
+        'MQTT_KEY': 'bench',
+        'ADAFRUIT_IO_API_URL': api_url,
+        # Measure the app, not the production request budget
+        'ADAFRUIT_RATE_LIMIT': '1000000',
+        'ADAFRUIT_RATE_BURST': '100000',
+        'INGEST_TOKEN': 'bench',
+        'DB_POOL_MAX_SIZE': str(args.db_pool),
+        'HOT_TIER_PATH': str(workdir / 'hot-tier.sqlite3'),
+        'RESPONSE_CACHE_MARKER_DIR': str(workdir / 'markers'),
+        'COMMAND_STATE_DIR': str(workdir / 'commands'),
+        'PROMETHEUS_MULTIPROC_DIR': str(workdir / 'prometheus'),
+        'LOG_LEVEL': 'WARNING',
+    })
+    env.pop('RESPONSE_CACHE_DIR', None)
+    if args.no_caches:
+        env.update({'RESPONSE_CACHE_MAX_MB': '0', 'HOT_TIER_HOURS': '0', 'FEED_CACHE_TTL': '0'})
+
+    command = [
+        sys.executable, '-m', 'gunicorn', '-c', str(BASE_DIR / 'gunicorn.conf.py'),
+        '-w', str(args.workers), '-k', 'gthread', '--threads', str(args.threads),
+        '-b', f'127.0.0.1:{port}', 'app:app'
+    ]
+    process = subprocess.Popen(command, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"gunicorn exited with status {process.returncode}")
+        try:
+            if requests.get(f'{url}/api/db-pool', timeout=1).ok:
+                return process, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("gunicorn did not become ready within 30s")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# --- Load scenarios ----------------------------------------------------------
+
+def build_scenarios(first_day, last_day):
+    """name -> function(rng) returning (method, path, request kwargs).
+
+    A scenario that needs more than one request (or must stop reading a
+    stream early) returns a function(session, url) -> ok instead.
+    """
+    span_days = max(0, (last_day - first_day).days)
+
+    def day(rng):
+        return (first_day + timedelta(days=rng.randint(0, span_days))).isoformat()
+
+    def week(rng):
+        start = first_day + timedelta(days=rng.randint(0, max(0, span_days - 6)))
+        return start.isoformat(), min(last_day, start + timedelta(days=6)).isoformat()
+
+    def sensor(rng):
+        return rng.choice(CHART_SENSORS)
+
+    def readings(rng):
+        now = datetime.now()
+        return [
+            {'sensor': sensor(rng), 'value': round(rng.uniform(15, 30), 2),
+             'timestamp': (now - timedelta(microseconds=rng.randint(0, 10**9))).isoformat()}
+            for _ in range(100)
+        ]
+
+    def live_stream(session, url):
+        # Connect and wait for the first 'live' event, then hang up
+        with session.get(f'{url}/api/live-stream', stream=True, timeout=60) as response:
+            if response.status_code >= 400:
+                return False
+            for line in response.iter_lines():
+                if line == b'event: live':
+                    return True
+        return False
+
+    def control_roundtrip(rng):
+        device, action = rng.choice(DEVICES), rng.choice(['ON', 'OFF'])
+
+        def flow(session, url):
+            # Queue a command and long-poll its status until it is delivered or superseded
+            response = session.post(f'{url}/api/control', json={'device': device, 'action': action}, timeout=60)
+            if response.status_code >= 400:
+                return False
+            status_url = response.json()['status_url']
+            response = session.get(f'{url}{status_url}', params={'wait': 30}, timeout=60)
+            return response.ok and response.json()['command']['status'] in ('delivered', 'superseded')
+        return flow
+
+    return {
+        'live-data': lambda rng: ('GET', '/api/live-data', {}),
+        'system-status': lambda rng: ('GET', '/api/system-status', {}),
+        'historical-data': lambda rng: ('GET', '/api/historical-data', {
+            'params': {'date': day(rng), 'sensor': sensor(rng)}}),
+        'historical-data-binary': lambda rng: ('GET', '/api/historical-data', {
+            'params': {'date': day(rng), 'sensor': sensor(rng), 'format': 'binary'}}),
+        'daily-averages': lambda rng: ('GET', '/api/daily-averages', {
+            'params': dict(zip(('start_date', 'end_date'), week(rng)), sensor=sensor(rng))}),
+        'daily-alerts': lambda rng: ('GET', '/api/daily-alerts', {
+            'params': dict(zip(('start_date', 'end_date'), week(rng)))}),
+        'intrusions': lambda rng: ('GET', '/api/intrusions', {
+            'params': dict(zip(('start_date', 'end_date'), week(rng)))}),
+        'export': lambda rng: ('GET', '/api/export', {
+            'params': {'dataset': 'sensor_data', 'start_date': day(rng), 'sensor': sensor(rng)}}),
+        'live-stream': lambda rng: live_stream,
+        'control': lambda rng: ('POST', '/api/control', {
+            'json': {'device': rng.choice(DEVICES), 'action': rng.choice(['ON', 'OFF'])}}),
+        'control-roundtrip': control_roundtrip,
+        'control-device': lambda rng: ('GET', f'/api/control/devices/{rng.choice(DEVICES)}', {}),
+        'security-toggle': lambda rng: ('POST', '/api/security-toggle', {
+            'json': {'enabled': rng.random() < 0.5}}),
+        'ingest': lambda rng: ('POST', '/api/ingest', {
+            'json': readings(rng), 'headers': {'X-Ingest-Token': 'bench'}}),
+        'ingest-status': lambda rng: ('GET', '/api/ingest/status', {}),
+        'audit-status': lambda rng: ('GET', '/api/audit/status', {}),
+        'feed-cache': lambda rng: ('GET', '/api/feed-cache', {}),
+        'response-cache': lambda rng: ('GET', '/api/response-cache', {}),
+        'hot-tier': lambda rng: ('GET', '/api/hot-tier', {}),
+        'db-pool': lambda rng: ('GET', '/api/db-pool', {}),
+        'metrics': lambda rng: ('GET', '/metrics', {}),
+    }
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(url, make_request, concurrency, duration, requests_per_client, seed):
+    """Drive one scenario from `concurrency` clients; return latency/throughput stats"""
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        rng = random.Random(seed * 1000 + index)
+        session = requests.Session()
+        latencies, errors, sent = [], 0, 0
+        while time.monotonic() < deadline and (not requests_per_client or sent < requests_per_client):
+            flow = make_request(rng)
+            started = time.perf_counter()
+            try:
+                if callable(flow):
+                    ok = flow(session, url)
+                else:
+                    method, path, kwargs = flow
+                    response = session.request(method, f'{url}{path}', timeout=60, **kwargs)
+                    response.content  # read streamed bodies (export) to the end
+                    ok = response.status_code < 400
+            except (requests.RequestException, ValueError, KeyError):
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+            sent += 1
+        session.close()
+        return latencies, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for client_latencies, _ in outcomes for latency in client_latencies)
+    errors = sum(client_errors for _, client_errors in outcomes)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else None,
+    }
+
+
+# --- Sync pipeline -----------------------------------------------------------
+
+def write_sync_logs(logs_dir, dates, rows_per_file, seed):
+    """Write CSV logs in the format the Raspberry Pi logger produces"""
+    rng = random.Random(seed)
+    step = 86400 / rows_per_file
+    for date_str in dates:
+        for name in ('temperature', 'humidity', 'light', 'alarm-status'):
+            with open(logs_dir / f'{date_str}_{name}.csv', 'w') as f:
+                f.write('timestamp,message\n')
+                for i in range(rows_per_file):
+                    seconds = i * step
+                    clock = f"{int(seconds // 3600):02d}:{int(seconds % 3600 // 60):02d}:{seconds % 60:09.6f}"
+                    if name == 'alarm-status':
+                        message = rng.choice(['armed', 'disarmed', 'alert'])
+                    else:
+                        _, base, amplitude, noise = SENSORS[name]
+                        message = f"{base + rng.uniform(-amplitude, amplitude):.2f}"
+                    f.write(f'{clock},{message}\n')
+
+
+def run_sync_benchmark(args, workdir):
+    """Time DataSync over synthetic log files for days outside the seeded range"""
+    from sync_data import DataSync
+
+    dates = [(datetime(2001, 1, 1) + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(args.sync_days)]
+    logs_dir = workdir / 'logs'
+    logs_dir.mkdir()
+    write_sync_logs(logs_dir, dates, args.sync_rows, args.seed)
+
+    # Start from empty days so every run inserts the same rows
+    span = (datetime.strptime(dates[0], '%Y-%m-%d'), datetime.strptime(dates[-1], '%Y-%m-%d') + timedelta(days=1))
+    with psycopg.connect(args.database_url, autocommit=True) as conn:
+        for table, column in (('sensor_data', 'timestamp'), ('security_events', 'timestamp'),
+                              ('sensor_rollups', 'bucket'), ('security_event_rollups', 'bucket')):
+            conn.execute(f"DELETE FROM {table} WHERE {column} >= %s AND {column} < %s", span)
+        conn.execute("DELETE FROM sync_checkpoints WHERE file_name LIKE '2001-%%'")
+
+    sync = DataSync()
+    sync.db_url = args.database_url
+    sync.sslmode = args.sslmode
+    sync.logs_dir = logs_dir
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    results = sync.sync_date_range(dates[0], dates[-1], jobs=args.sync_jobs)
+    elapsed = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    failed = [
+        f"{date_str} {name}: {value}"
+        for date_str, outcome in results.items()
+        for name, value in outcome.items() if not isinstance(value, int)
+    ]
+    return {
+        'files': sync.totals['files'],
+        'rows_read': sync.totals['copied'],
+        'rows_inserted': sync.totals['synced'],
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(sync.totals['copied'] / elapsed, 1) if elapsed else 0.0,
+        # ru_maxrss is KiB on Linux
+        'peak_rss_growth_mb': round(max(0, rss_after - rss_before) / 1024, 1),
+        'failures': failed,
+    }
+
+
+# --- Results -----------------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def latest_result(exclude=None):
+    results = sorted(path for path in RESULTS_DIR.glob('*.json') if path != exclude)
+    return results[-1] if results else None
+
+
+def compare(current, baseline, threshold):
+    """Print per-route changes against a baseline run; return the regressions found"""
+    print(f"\n=== COMPARISON WITH {baseline['run']['id']} ===")
+    regressions = []
+    for name, stats in current['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if not before or not before.get('p99_ms') or not stats.get('p99_ms'):
+            continue
+        p99_change = stats['p99_ms'] / before['p99_ms'] - 1
+        rps_change = stats['throughput_rps'] / before['throughput_rps'] - 1 if before['throughput_rps'] else 0.0
+        flag = ''
+        if p99_change > threshold or rps_change < -threshold:
+            flag = '  ✗ regression'
+            regressions.append(name)
+        print(f"{name:24} p99 {before['p99_ms']:>9.1f} -> {stats['p99_ms']:>9.1f} ms ({p99_change:+.0%})"
+              f"  rps {before['throughput_rps']:>8.1f} -> {stats['throughput_rps']:>8.1f} ({rps_change:+.0%}){flag}")
+
+    if current.get('sync') and baseline.get('sync'):
+        before, after = baseline['sync']['rows_per_second'], current['sync']['rows_per_second']
+        change = after / before - 1 if before else 0.0
+        flag = '  ✗ regression' if change < -threshold else ''
+        if flag:
+            regressions.append('sync')
+        print(f"{'sync':24} {before:,.0f} -> {after:,.0f} rows/sec ({change:+.0%}){flag}")
+    return regressions
+
+
+def print_report(result):
+    print("\n=== BENCHMARK RESULTS ===")
+    print(f"{'route':24} {'requests':>9} {'errors':>7} {'rps':>9} {'p50 ms':>9} {'p99 ms':>9} {'rss MB':>8}")
+    for name, stats in result['routes'].items():
+        rss = f"{stats['server_peak_rss_mb']:.0f}" if stats.get('server_peak_rss_mb') else '-'
+        print(f"{name:24} {stats['requests']:>9} {stats['errors']:>7} {stats['throughput_rps']:>9.1f} "
+              f"{stats['p50_ms'] or 0:>9.1f} {stats['p99_ms'] or 0:>9.1f} {rss:>8}")
+    if result.get('sync'):
+        sync = result['sync']
+        print(f"\nsync: {sync['rows_read']:,} rows from {sync['files']} files in {sync['seconds']}s "
+              f"({sync['rows_per_second']:,.0f} rows/sec, +{sync['peak_rss_growth_mb']} MB peak RSS)")
+        for failure in sync['failures']:
+            print(f"  ✗ {failure}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline benchmark of the API and the sync pipeline",
+        epilog=(
+            "BENCH_DATABASE_URL must point at a disposable local PostgreSQL database.\n\n"
+            "examples:\n"
+            "  python benchmark.py --reset --rows 1e6               # Create and seed the database\n"
+            "  python benchmark.py --concurrency 16 --duration 20   # Benchmark every route\n"
+            "  python benchmark.py --routes live-data,daily-averages --compare latest\n"
+            "  python benchmark.py --routes none --sync-days 3      # Sync pipeline only"
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL'),
+                        help="local database to use (default: $BENCH_DATABASE_URL)")
+    parser.add_argument('--allow-remote', action='store_true',
+                        help="allow a database that is not on localhost")
+    parser.add_argument('--sslmode', default='prefer', help="sslmode for the sync benchmark (default: prefer)")
+    parser.add_argument('--reset', action='store_true', help="drop the app's tables and recreate them from schema.sql")
+    parser.add_argument('--rows', type=float, default=0,
+                        help="insert this many synthetic sensor_data rows first (1e4 to 1e8)")
+    parser.add_argument('--events', type=float, default=None,
+                        help="security_events rows to insert with --rows (default: rows / 100)")
+    parser.add_argument('--days', type=int, default=30, help="days the seeded data spans, ending now (default: 30)")
+    parser.add_argument('--url', help="benchmark an already running server instead of starting gunicorn")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers (default: 2)")
+    parser.add_argument('--threads', type=int, default=32, help="threads per worker (default: 32)")
+    parser.add_argument('--db-pool', type=int, default=10, help="DB_POOL_MAX_SIZE per worker (default: 10)")
+    parser.add_argument('--no-caches', action='store_true', help="disable the response cache, hot tier and feed cache")
+    parser.add_argument('--routes', default='all', help="comma-separated scenarios, 'all' or 'none'")
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help="concurrent clients per route (default: 8)")
+    parser.add_argument('-d', '--duration', type=float, default=10, help="seconds per route (default: 10)")
+    parser.add_argument('-n', '--requests', type=int, default=0, help="stop each client after this many requests")
+    parser.add_argument('--adafruit-latency', type=float, default=80,
+                        help="fake Adafruit IO response time in ms (default: 80)")
+    parser.add_argument('--adafruit-error-rate', type=float, default=0.0,
+                        help="fraction of fake Adafruit IO calls that fail with 503")
+    parser.add_argument('--sync-days', type=int, default=0, help="days of synthetic logs for the sync benchmark")
+    parser.add_argument('--sync-rows', type=int, default=86400, help="lines per log file (default: 86400)")
+    parser.add_argument('--sync-jobs', type=int, default=4, help="DataSync --jobs (default: 4)")
+    parser.add_argument('--random-seed', dest='seed', type=int, default=42, help="seed for request parameters")
+    parser.add_argument('--label', default='', help="free-form note stored with the results")
+    parser.add_argument('--compare', help="results file to compare with, or 'latest'")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="relative p99/throughput change reported as a regression (default: 0.15)")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("set BENCH_DATABASE_URL or pass --database-url (never the production DATABASE_URL)")
+    if urlparse(args.database_url).hostname not in LOCAL_HOSTS and not args.allow_remote:
+        parser.error("the benchmark database is not on localhost; pass --allow-remote if it is disposable")
+    if args.database_url == os.getenv('DATABASE_URL'):
+        parser.error("the benchmark database must not be the app's DATABASE_URL")
+
+    scenarios = build_scenarios(datetime.now().date(), datetime.now().date())
+    if args.routes == 'none':
+        selected = []
+    elif args.routes == 'all':
+        selected = list(scenarios)
+    else:
+        selected = [name.strip() for name in args.routes.split(',') if name.strip()]
+        unknown = [name for name in selected if name not in scenarios]
+        if unknown:
+            parser.error(f"unknown routes: {', '.join(unknown)} (choose from {', '.join(scenarios)})")
+
+    with psycopg.connect(args.database_url, autocommit=True) as conn:
+        if args.reset:
+            print("Recreating tables from schema.sql...")
+            reset_database(conn)
+        if args.rows:
+            rows = int(args.rows)
+            events = int(args.events) if args.events is not None else rows // 100
+            print(f"Seeding {rows:,} sensor rows and {events:,} security events over {args.days} days...")
+            started = time.perf_counter()
+            seed_database(conn, rows, events, args.days, datetime.now().replace(microsecond=0))
+            print(f"Seeded in {time.perf_counter() - started:.1f}s")
+        first_day, last_day = data_range(conn) if selected else (None, None)
+        row_count = conn.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = 'sensor_data'").fetchone()[0]
+
+    result = {
+        'run': {
+            'id': datetime.now().strftime('%Y%m%d-%H%M%S'),
+            'label': args.label,
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'host': platform.node(),
+            'sensor_rows': row_count,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'workers': None if args.url else args.workers,
+            'threads': None if args.url else args.threads,
+            'caches': not args.no_caches,
+            'adafruit_latency_ms': args.adafruit_latency,
+        },
+        'routes': {},
+        'sync': None,
+    }
+
+    with tempfile.TemporaryDirectory(prefix='iot-bench-') as tmp:
+        workdir = Path(tmp)
+        if selected:
+            fake = FakeAdafruitIO(args.adafruit_latency / 1000, args.adafruit_error_rate, args.seed)
+            threading.Thread(target=fake.serve_forever, daemon=True).start()
+            process, url = (None, args.url) if args.url else start_server(args, fake.api_url, workdir)
+            try:
+                scenarios = build_scenarios(first_day, last_day)
+                for name in selected:
+                    print(f"Running {name} ({args.concurrency} clients, {args.duration:g}s)...")
+                    with MemorySampler(process.pid if process else None) as memory:
+                        stats = run_scenario(url, scenarios[name], args.concurrency,
+                                             args.duration, args.requests, args.seed)
+                    stats['server_peak_rss_mb'] = round(memory.peak / 2**20, 1) if memory.peak else None
+                    result['routes'][name] = stats
+            finally:
+                if process:
+                    stop_server(process)
+                fake.shutdown()
+            result['run']['adafruit_calls'] = fake.calls
+
+        if args.sync_days:
+            print(f"Running sync over {args.sync_days} day(s) x 4 files x {args.sync_rows:,} lines...")
+            result['sync'] = run_sync_benchmark(args, workdir)
+
+    print_report(result)
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    path = RESULTS_DIR / f"{result['run']['id']}{'-' + result['run']['commit'] if result['run']['commit'] else ''}.json"
+    path.write_text(json.dumps(result, indent=2))
+    print(f"\nResults saved to {path.relative_to(BASE_DIR)}")
+
+    if args.compare:
+        baseline_path = latest_result(exclude=path) if args.compare == 'latest' else Path(args.compare)
+        if baseline_path is None:
+            print("No earlier results to compare with")
+            return 0
+        regressions = compare(result, json.loads(baseline_path.read_text()), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
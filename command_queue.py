@@ -0,0 +1,282 @@
+"""
+Command Queue
+Per-feed debounce queue for device commands sent to Adafruit IO
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+TERMINAL_STATES = ('delivered', 'failed', 'superseded')
+
+log = logging.getLogger(__name__)
+
+
+class CommandQueue:
+    """Collapses bursts of commands per feed and delivers them in order.
+
+    A command waits `debounce` seconds before it is sent. If another command
+    for the same feed arrives in that window the older one is marked
+    superseded and only the newest value is sent (last write wins). A burst
+    never delays delivery by more than `max_delay` seconds from its first
+    command. At most one command per feed is in flight, so a feed always
+    receives values in the order they were submitted.
+
+    Command status moves queued -> sending -> delivered/failed, or
+    queued -> superseded. The last `history` commands can be looked up by id.
+
+    Commands live in the worker that accepted them, but every status change
+    is also written to `state_dir` (one small JSON file per command, kept
+    for `retention` seconds). Any worker on the host can therefore answer a
+    status lookup, whichever one the client's request lands on.
+    """
+
+    def __init__(self, send, debounce=0.3, max_delay=1.0, history=1000, workers=4,
+                 state_dir=None, retention=3600.0, poll_interval=0.2):
+        self.send = send
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.history = history
+        self.workers = workers
+        self.state_dir = state_dir or os.path.join(tempfile.gettempdir(), 'iot-commands')
+        self.retention = retention
+        self.poll_interval = poll_interval
+        os.makedirs(self.state_dir, exist_ok=True)
+        self._init_state()
+        os.register_at_fork(after_in_child=self._init_state)
+
+    def _init_state(self):
+        # Also run in a forked child: threads and pending commands stay with the parent
+        self._cond = threading.Condition()
+        self._commands = OrderedDict()  # id -> command
+        self._callbacks = {}  # id -> on_done
+        self._pending = {}  # feed_key -> {'command', 'first_at', 'due'}
+        self._in_flight = set()
+        self._thread = None
+        self._executor = None
+        self.counters = {
+            'submitted': 0,
+            'superseded': 0,
+            'delivered': 0,
+            'failed': 0,
+            'state_errors': 0
+        }
+
+    def _state_path(self, command_id):
+        return os.path.join(self.state_dir, f'{command_id}.json')
+
+    def _publish(self, command):
+        """Write a command's current state for the other workers (caller holds the lock)"""
+        path = self._state_path(command['id'])
+        try:
+            with tempfile.NamedTemporaryFile('w', dir=self.state_dir, suffix='.tmp', delete=False) as f:
+                json.dump(command, f)
+            os.replace(f.name, path)
+        except OSError as e:
+            self.counters['state_errors'] += 1
+            log.warning('Command state write failed', extra={'command': command['id'], 'error': str(e)})
+
+    def _read_state(self, command_id):
+        """A command published by any worker on this host, or None"""
+        # Ids are uuid4 hex; anything else cannot name a state file
+        if not command_id.isalnum():
+            return None
+        try:
+            with open(self._state_path(command_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _prune_states(self):
+        """Remove state files older than `retention`"""
+        cutoff = time.time() - self.retention
+        try:
+            with os.scandir(self.state_dir) as entries:
+                for entry in entries:
+                    try:
+                        if entry.stat().st_mtime < cutoff:
+                            os.unlink(entry.path)
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+
+    def submit(self, feed_key, value, on_done=None):
+        """Queue `value` for `feed_key` and return a snapshot of the new command.
+
+        `on_done(command)` is called once the command reaches a final state.
+        """
+        now = time.monotonic()
+        command = {
+            'id': uuid.uuid4().hex,
+            'feed': feed_key,
+            'value': value,
+            'status': 'queued',
+            'submitted_at': time.time(),
+            'sent_at': None,
+            'completed_at': None,
+            'superseded_by': None,
+            'error': None
+        }
+        finished = []
+
+        with self._cond:
+            self._commands[command['id']] = command
+            while len(self._commands) > self.history:
+                self._commands.popitem(last=False)
+            if on_done is not None:
+                self._callbacks[command['id']] = on_done
+            self.counters['submitted'] += 1
+
+            self._publish(command)
+            pending = self._pending.get(feed_key)
+            if pending:
+                previous = pending['command']
+                previous.update({
+                    'status': 'superseded',
+                    'superseded_by': command['id'],
+                    'completed_at': time.time()
+                })
+                self._publish(previous)
+                self.counters['superseded'] += 1
+                finished.append(previous)
+                first_at = pending['first_at']
+            else:
+                first_at = now
+
+            self._pending[feed_key] = {
+                'command': command,
+                'first_at': first_at,
+                'due': min(now + self.debounce, first_at + self.max_delay)
+            }
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='device-command')
+                self._thread = threading.Thread(target=self._run, name='command-queue', daemon=True)
+                self._thread.start()
+            snapshot = dict(command)
+            self._cond.notify_all()
+
+        if self.counters['submitted'] % 100 == 1:
+            self._prune_states()
+        self._finish(finished)
+        return snapshot
+
+    def _finish(self, commands):
+        """Run on_done callbacks outside the lock"""
+        for command in commands:
+            with self._cond:
+                callback = self._callbacks.pop(command['id'], None)
+                snapshot = dict(command)
+            if callback is None:
+                continue
+            try:
+                callback(snapshot)
+            except Exception:
+                log.exception('Command callback failed', extra={'feed': command['feed']})
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                ready = [
+                    feed_key for feed_key, pending in self._pending.items()
+                    if feed_key not in self._in_flight and pending['due'] <= now
+                ]
+                if not ready:
+                    waits = [
+                        pending['due'] - now for feed_key, pending in self._pending.items()
+                        if feed_key not in self._in_flight
+                    ]
+                    self._cond.wait(min(waits) if waits else None)
+                    continue
+                for feed_key in ready:
+                    command = self._pending.pop(feed_key)['command']
+                    command.update({'status': 'sending', 'sent_at': time.time()})
+                    self._publish(command)
+                    self._in_flight.add(feed_key)
+                    self._executor.submit(self._deliver, command)
+                self._cond.notify_all()
+
+    def _deliver(self, command):
+        error = None
+        try:
+            delivered = bool(self.send(command['feed'], command['value']))
+        except Exception as e:
+            delivered = False
+            error = str(e)
+
+        with self._cond:
+            status = 'delivered' if delivered else 'failed'
+            command.update({
+                'status': status,
+                'completed_at': time.time(),
+                'error': error if error else (None if delivered else 'Failed to send command')
+            })
+            self.counters[status] += 1
+            self._publish(command)
+            self._in_flight.discard(command['feed'])
+            self._cond.notify_all()
+
+        self._finish([command])
+
+    def get(self, command_id):
+        """Snapshot of a command, or None if no worker on this host knows it"""
+        with self._cond:
+            command = self._commands.get(command_id)
+            if command:
+                return dict(command)
+        return self._read_state(command_id)
+
+    def wait(self, command_id, timeout, previous=None):
+        """Block until the command's status differs from `previous`.
+
+        With no `previous` status this waits until the command is final.
+        Returns the latest snapshot (None if unknown) once the condition holds
+        or `timeout` seconds have passed.
+        """
+        def changed():
+            command = self._commands.get(command_id)
+            if command is None:
+                return True
+            if previous is None:
+                return command['status'] in TERMINAL_STATES
+            return command['status'] != previous
+
+        with self._cond:
+            if command_id in self._commands:
+                self._cond.wait_for(changed, timeout)
+                command = self._commands.get(command_id)
+                return dict(command) if command else None
+
+        # Accepted by another worker: follow its state file
+        deadline = time.monotonic() + timeout
+        while True:
+            command = self._read_state(command_id)
+            if command is None:
+                return None
+            done = command['status'] in TERMINAL_STATES if previous is None else command['status'] != previous
+            if done or time.monotonic() >= deadline:
+                return command
+            time.sleep(min(self.poll_interval, max(0.0, deadline - time.monotonic())))
+
+    def close(self, timeout=5.0):
+        """Send whatever is still waiting out its debounce window (used at shutdown)"""
+        with self._cond:
+            for pending in self._pending.values():
+                pending['due'] = 0.0
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending': len(self._pending),
+                'in_flight': len(self._in_flight),
+                **self.counters
+            }
@@ -0,0 +1,83 @@
+"""
+Database Schema
+Row shapes and SQL shared by sync_data.py, /api/ingest and the audit writer
+"""
+
+import math
+
+# Conflict target of the security_events natural key (migration 006). details
+# is hashed so long texts fit in the index and NULL details compare equal.
+SECURITY_EVENTS_KEY = "(timestamp, event_type, md5(COALESCE(details, '')))"
+
+
+class LogType:
+    """How one kind of `{date}_{name}.csv` log file is loaded"""
+
+    def __init__(self, kind, name, unit=None):
+        self.kind = kind  # 'sensor' -> sensor_data, 'security' -> security_events
+        self.name = name
+        self.unit = unit
+
+    def to_row(self, timestamp, message):
+        """Turn one log message into a staging-table row (raises ValueError if invalid)"""
+        if self.kind == 'security':
+            status = message.strip()
+            if not status:
+                raise ValueError("empty status")
+            # Log state changes as security events
+            event_type = 'alert' if status == 'alert' else 'state_change'
+            return (timestamp, event_type, f"System {status}")
+
+        value = float(message)
+        # sensor_data.value is DECIMAL(10, 2)
+        if not math.isfinite(value) or abs(value) >= 1e8:
+            raise ValueError(f"reading out of range {message!r}")
+        return (timestamp, self.name, value, self.unit)
+
+
+# Known log files, keyed by the part of the file name after the date.
+# Any other `{date}_{name}.csv` in the logs directory is synced as a
+# numeric sensor called `name`.
+LOG_TYPES = {
+    'temperature': LogType('sensor', 'temperature', '°C'),
+    'humidity': LogType('sensor', 'humidity', '%'),
+    'light': LogType('sensor', 'light', 'lux'),
+    'alarm-status': LogType('security', 'alarm-status'),
+}
+
+# (staging table DDL, COPY statement, merge statement) per log kind
+STAGING_SQL = {
+    'sensor': (
+        """
+            CREATE TEMP TABLE sensor_data_staging (
+                timestamp TIMESTAMP NOT NULL,
+                sensor_type VARCHAR(50) NOT NULL,
+                value DECIMAL(10, 2) NOT NULL,
+                unit VARCHAR(20)
+            ) ON COMMIT DROP
+        """,
+        "COPY sensor_data_staging (timestamp, sensor_type, value, unit) FROM STDIN",
+        """
+            INSERT INTO sensor_data (timestamp, sensor_type, value, unit)
+            SELECT timestamp, sensor_type, value, unit
+            FROM sensor_data_staging
+            ON CONFLICT (sensor_type, timestamp) DO NOTHING
+        """
+    ),
+    'security': (
+        """
+            CREATE TEMP TABLE security_events_staging (
+                timestamp TIMESTAMP NOT NULL,
+                event_type VARCHAR(50) NOT NULL,
+                details TEXT
+            ) ON COMMIT DROP
+        """,
+        "COPY security_events_staging (timestamp, event_type, details) FROM STDIN",
+        """
+            INSERT INTO security_events (timestamp, event_type, details)
+            SELECT timestamp, event_type, details
+            FROM security_events_staging
+            ON CONFLICT """ + SECURITY_EVENTS_KEY + """ DO NOTHING
+        """
+    ),
+}
@@ -0,0 +1,68 @@
+"""
+Downsampling helpers
+Reduce long sensor series to a bounded number of chart points
+"""
+
+import math
+from datetime import timedelta
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax', 'avg')
+
+
+def bucket_width(start, end, buckets, resolution_seconds=None):
+    """Pick a bucket width that splits [start, end) into at most `buckets` buckets.
+
+    A requested resolution is honoured when it is coarse enough, otherwise it
+    is widened so the point count stays bounded.
+    """
+    span = (end - start).total_seconds()
+    seconds = max(1, math.ceil(span / max(1, buckets)))
+    if resolution_seconds:
+        seconds = max(seconds, int(resolution_seconds))
+    return timedelta(seconds=seconds)
+
+
+def lttb(rows, threshold):
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    `rows` are dicts with 'timestamp' and 'value' sorted by timestamp. The
+    first and last points are always kept; from every bucket in between the
+    point forming the largest triangle with its neighbours is chosen, which
+    keeps peaks and troughs visible.
+    """
+    count = len(rows)
+    if threshold >= count or threshold < 3:
+        return list(rows)
+
+    xs = [row['timestamp'].timestamp() for row in rows]
+    ys = [float(row['value']) for row in rows]
+
+    sampled = [rows[0]]
+    every = (count - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, count)
+        next_len = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / next_len
+        avg_y = sum(ys[next_start:next_end]) / next_len
+
+        bucket_start = int(i * every) + 1
+        bucket_end = int((i + 1) * every) + 1
+
+        ax, ay = xs[a], ys[a]
+        max_area = -1.0
+        chosen = bucket_start
+        for j in range(bucket_start, bucket_end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                chosen = j
+
+        sampled.append(rows[chosen])
+        a = chosen
+
+    sampled.append(rows[-1])
+    return sampled
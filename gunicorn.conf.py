@@ -0,0 +1,24 @@
+"""
+Gunicorn configuration
+Loaded automatically from the working directory; prepares the shared
+Prometheus directory the workers write their metrics to
+"""
+
+import os
+import shutil
+import tempfile
+
+# Inherited by every worker, so /metrics can aggregate all of them
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'iot-prometheus'))
+
+
+def on_starting(server):
+    # Samples left by a previous run would be added to this one's
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -0,0 +1,285 @@
+"""
+Hot Tier
+Local SQLite copy of the most recent sensor readings for fast, WAN-free chart reads
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from downsample import bucket_width, lttb
+from series_format import EPOCH, ONE_SECOND
+
+try:
+    import fcntl
+except ImportError:  # without flock every worker runs its own catch-up
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS readings (
+        sensor_type TEXT NOT NULL,
+        ts REAL NOT NULL,
+        value REAL NOT NULL,
+        PRIMARY KEY (sensor_type, ts)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value REAL
+    );
+"""
+
+
+def to_ts(timestamp):
+    """Wall-clock datetime -> epoch seconds (same convention as series_format)"""
+    return (timestamp - EPOCH) / ONE_SECOND
+
+
+def from_ts(ts):
+    return EPOCH + timedelta(seconds=ts)
+
+
+class HotStore:
+    """The last `window_hours` of readings, kept in a SQLite file on local disk.
+
+    The file is shared by every worker on the host. Readings from /api/ingest
+    are added by the ingest writer once they are in PostgreSQL, and a
+    background catch-up copies rows that got there some other way
+    (sync_data.py, other hosts) by following sensor_data.id.
+    `load(after_id, since, limit)` supplies those rows as (id, timestamp,
+    sensor_type, value) tuples. The first sync warms the store up a page at
+    a time from `load_window(since, after, limit)`, which returns the same
+    tuples in (timestamp, id) order after the `after` (timestamp, id) pair,
+    or from the start of the window when it is None.
+
+    The store only answers ranges that start inside its covered window, so a
+    hit is always complete; it needs no database connection to do so.
+    """
+
+    def __init__(self, path, load, load_window, window_hours=48, refresh_interval=60.0,
+                 batch_size=50000, id_overlap=5000):
+        self.path = path
+        self.load = load
+        self.load_window = load_window
+        self.window = timedelta(hours=window_hours)
+        self.refresh_interval = refresh_interval
+        self.batch_size = batch_size
+        self.id_overlap = id_overlap
+        self._init_state()
+        os.register_at_fork(after_in_child=self._init_state)
+
+    def _init_state(self):
+        # Also run in a forked child: connections and the thread stay with the parent
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.counters = {'hot_reads': 0, 'rows_added': 0, 'rows_loaded': 0, 'sync_errors': 0}
+        self.last_sync = {'at': None, 'rows': 0, 'error': None}
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='hot-tier', daemon=True)
+                    self._thread.start()
+
+    def _meta(self, key):
+        row = self._conn().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, conn, key, value):
+        conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def add(self, rows):
+        """Add (timestamp, sensor_type, value, unit) rows, e.g. as an ingest writer listener"""
+        self._start()
+        conn = self._conn()
+        cutoff = to_ts(datetime.now() - self.window)
+        values = [(sensor, to_ts(timestamp), float(value)) for timestamp, sensor, value, *_ in rows]
+        values = [value for value in values if value[1] >= cutoff]
+        if values:
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO readings VALUES (?, ?, ?)', values)
+            with self._lock:
+                self.counters['rows_added'] += len(values)
+
+    def covers(self, start, end):
+        """True if [start, end) lies inside the window the store holds completely"""
+        self._start()
+        covered_from = self._meta('covered_from')
+        return covered_from is not None and to_ts(start) >= covered_from
+
+    def _range_rows(self, sensor, start, end):
+        cursor = self._conn().execute("""
+            SELECT ts, value FROM readings
+            WHERE sensor_type = ? AND ts >= ? AND ts < ?
+            ORDER BY ts
+        """, (sensor, to_ts(start), to_ts(end)))
+        return [{'timestamp': from_ts(ts), 'value': value} for ts, value in cursor]
+
+    def _buckets(self, sensor, start, end, width):
+        seconds = width.total_seconds()
+        cursor = self._conn().execute("""
+            SELECT CAST((ts - :start) / :width AS INTEGER) AS bucket,
+                   AVG(value), MIN(value), MAX(value)
+            FROM readings
+            WHERE sensor_type = :sensor AND ts >= :start AND ts < :end
+            GROUP BY bucket
+            ORDER BY bucket
+        """, {'start': to_ts(start), 'end': to_ts(end), 'width': seconds, 'sensor': sensor})
+        return [{
+            'timestamp': start + timedelta(seconds=bucket * seconds + seconds / 2),
+            'value': avg,
+            'min_value': low,
+            'max_value': high
+        } for bucket, avg, low, high in cursor]
+
+    def _minmax(self, sensor, start, end, width):
+        cursor = self._conn().execute("""
+            WITH ranked AS (
+                SELECT ts, value,
+                       ROW_NUMBER() OVER (PARTITION BY CAST((ts - :start) / :width AS INTEGER) ORDER BY value ASC, ts) AS low_rank,
+                       ROW_NUMBER() OVER (PARTITION BY CAST((ts - :start) / :width AS INTEGER) ORDER BY value DESC, ts) AS high_rank
+                FROM readings
+                WHERE sensor_type = :sensor AND ts >= :start AND ts < :end
+            )
+            SELECT ts, value FROM ranked
+            WHERE low_rank = 1 OR high_rank = 1
+            ORDER BY ts
+        """, {'start': to_ts(start), 'end': to_ts(end), 'width': width.total_seconds(), 'sensor': sensor})
+        return [{'timestamp': from_ts(ts), 'value': value} for ts, value in cursor]
+
+    def series(self, sensor, start, end, max_points, resolution=None, method='lttb'):
+        """Same contract as app.fetch_sensor_series, answered locally"""
+        with self._lock:
+            self.counters['hot_reads'] += 1
+        if resolution is None:
+            rows = self._range_rows(sensor, start, end)
+            if len(rows) <= max_points:
+                return rows, None
+
+        if method == 'avg':
+            width = bucket_width(start, end, max_points, resolution)
+            rows = self._buckets(sensor, start, end, width)
+        elif method == 'minmax':
+            width = bucket_width(start, end, max_points // 2, resolution)
+            rows = self._minmax(sensor, start, end, width)
+        else:
+            width = bucket_width(start, end, max_points * 2, resolution)
+            rows = lttb(self._minmax(sensor, start, end, width), max_points)
+
+        return rows, {
+            'method': method,
+            'bucket_seconds': int(width.total_seconds()),
+            'points': len(rows)
+        }
+
+    def sync(self):
+        """Copy new PostgreSQL rows into the store and drop rows older than the window"""
+        conn = self._conn()
+        cutoff = datetime.now() - self.window
+        last_id = self._meta('last_id')
+        loaded = 0
+
+        if last_id is None:
+            # Warm-up: the window a page at a time; covered only once it is all in
+            after, max_id = None, 0
+            while True:
+                rows = self.load_window(cutoff, after, self.batch_size)
+                if not rows:
+                    break
+                with conn:
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO readings VALUES (?, ?, ?)',
+                        [(sensor, to_ts(timestamp), float(value)) for _, timestamp, sensor, value in rows]
+                    )
+                max_id = max(max_id, max(row[0] for row in rows))
+                after = (rows[-1][1], rows[-1][0])
+                loaded += len(rows)
+                if len(rows) < self.batch_size:
+                    break
+            with conn:
+                self._set_meta(conn, 'last_id', max_id)
+                self._set_meta(conn, 'covered_from', to_ts(cutoff))
+        else:
+            # Re-read a few ids back: ids from concurrent transactions can commit out of order
+            after_id = max(0, int(last_id) - self.id_overlap)
+            while True:
+                rows = self.load(after_id, cutoff, self.batch_size)
+                if not rows:
+                    break
+                with conn:
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO readings VALUES (?, ?, ?)',
+                        [(sensor, to_ts(timestamp), float(value)) for _, timestamp, sensor, value in rows]
+                    )
+                    after_id = rows[-1][0]
+                    self._set_meta(conn, 'last_id', max(after_id, last_id))
+                loaded += len(rows)
+                if len(rows) < self.batch_size:
+                    break
+
+        with conn:
+            conn.execute('DELETE FROM readings WHERE ts < ?', (to_ts(cutoff),))
+            covered_from = self._meta('covered_from')
+            if covered_from is not None:
+                self._set_meta(conn, 'covered_from', max(covered_from, to_ts(cutoff)))
+        return loaded
+
+    def _run(self):
+        lock_file = open(f'{self.path}.lock', 'a') if fcntl else None
+        while True:
+            try:
+                # One worker per host does the catch-up; the others just read
+                if lock_file is None or self._try_lock(lock_file):
+                    try:
+                        loaded = self.sync()
+                    finally:
+                        if lock_file is not None:
+                            fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    with self._lock:
+                        self.counters['rows_loaded'] += loaded
+                        self.last_sync.update({'at': time.time(), 'rows': loaded, 'error': None})
+            except Exception as e:
+                with self._lock:
+                    self.counters['sync_errors'] += 1
+                    self.last_sync['error'] = f"{type(e).__name__}: {e}"
+                log.warning('Hot tier sync failed', extra={'error': str(e)})
+            time.sleep(self.refresh_interval)
+
+    @staticmethod
+    def _try_lock(lock_file):
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def stats(self):
+        conn = self._conn()
+        rows = conn.execute('SELECT COUNT(*) FROM readings').fetchone()[0]
+        covered_from = self._meta('covered_from')
+        last_id = self._meta('last_id')
+        with self._lock:
+            return {
+                'path': self.path,
+                'rows': rows,
+                'covered_from': from_ts(covered_from).isoformat() if covered_from is not None else None,
+                'last_id': int(last_id) if last_id is not None else None,
+                **self.counters,
+                'last_sync': dict(self.last_sync)
+            }
@@ -0,0 +1,118 @@
+"""
+Ingest
+Parsing and validation of device reading batches posted to /api/ingest
+"""
+
+import json
+import math
+import re
+from datetime import datetime
+
+from db_schema import LOG_TYPES
+
+try:
+    import msgpack
+except ImportError:  # msgpack bodies are optional
+    msgpack = None
+
+JSON_TYPES = ('application/json',)
+NDJSON_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-seq')
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+SENSOR_NAME = re.compile(r'^[a-z0-9_-]{1,50}$')
+
+
+class IngestError(ValueError):
+    """The request body as a whole could not be accepted"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def decode_body(body, content_type):
+    """Decode a JSON array, JSON lines or msgpack body into a list of readings"""
+    content_type = (content_type or 'application/json').split(';')[0].strip().lower()
+
+    try:
+        if content_type in NDJSON_TYPES:
+            readings = [json.loads(line) for line in body.splitlines() if line.strip()]
+        elif content_type in MSGPACK_TYPES:
+            if msgpack is None:
+                raise IngestError('msgpack bodies require the msgpack package', status=415)
+            readings = msgpack.unpackb(body, raw=False)
+        elif content_type in JSON_TYPES:
+            readings = json.loads(body)
+        else:
+            raise IngestError(f'Unsupported content type {content_type}', status=415)
+    except IngestError:
+        raise
+    except Exception as e:
+        raise IngestError(f'Malformed body: {e}')
+
+    # Also accept {"readings": [...]} and a single reading object
+    if isinstance(readings, dict):
+        readings = readings.get('readings', [readings])
+    if not isinstance(readings, list):
+        raise IngestError('Body must be a list of readings')
+    return readings
+
+
+def parse_timestamp(value):
+    """Accept ISO-8601 strings or epoch seconds; default to now"""
+    if value is None:
+        return datetime.now()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            return datetime.fromtimestamp(value)
+        except (OverflowError, OSError):
+            raise ValueError('timestamp out of range')
+    if isinstance(value, str):
+        timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if timestamp.tzinfo is not None:
+            # sensor_data stores local wall-clock time like the CSV logs
+            timestamp = timestamp.astimezone().replace(tzinfo=None)
+        return timestamp
+    raise ValueError('timestamp must be an ISO-8601 string or epoch seconds')
+
+
+def reading_to_row(reading):
+    """Validate one reading and return a sensor_data row (timestamp, sensor_type, value, unit)"""
+    if not isinstance(reading, dict):
+        raise ValueError('reading must be an object')
+
+    sensor = reading.get('sensor') or reading.get('sensor_type')
+    if not isinstance(sensor, str) or not SENSOR_NAME.match(sensor):
+        raise ValueError('sensor must be a lowercase name (a-z, 0-9, _ or -)')
+
+    value = reading.get('value')
+    if isinstance(value, bool):
+        raise ValueError('value must be numeric')
+    try:
+        value = float(value)
+    except OverflowError:
+        raise ValueError('value out of range')
+    # sensor_data.value is DECIMAL(10, 2)
+    if not math.isfinite(value) or abs(value) >= 1e8:
+        raise ValueError('value out of range')
+
+    unit = reading.get('unit')
+    if unit is None and sensor in LOG_TYPES:
+        unit = LOG_TYPES[sensor].unit
+    if unit is not None and (not isinstance(unit, str) or len(unit) > 20):
+        raise ValueError('unit must be a string of at most 20 characters')
+
+    return (parse_timestamp(reading.get('timestamp')), sensor, value, unit)
+
+
+def parse_readings(readings):
+    """Split readings into valid rows and a list of {index, error} rejections"""
+    rows = []
+    errors = []
+    for index, reading in enumerate(readings):
+        try:
+            rows.append(reading_to_row(reading))
+        # Overflow/OS errors cover dates the platform cannot represent
+        except (TypeError, ValueError, OverflowError, OSError) as e:
+            errors.append({'index': index, 'error': str(e)})
+    return rows, errors
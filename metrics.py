@@ -0,0 +1,183 @@
+"""
+Metrics
+Prometheus metrics for the API, database, Adafruit IO and sync, shared by the
+worker processes on a host
+
+Under gunicorn set PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py does) so every
+worker writes its samples to that directory and /metrics aggregates them.
+sync_data.py runs as a short-lived CLI, usually on the Pi; it pushes its
+samples to a Pushgateway (METRICS_PUSHGATEWAY) when one is configured.
+"""
+
+import os
+import threading
+import time
+
+# prometheus_client reads this on import; the directory must exist by then
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+        multiprocess,
+        push_to_gateway
+    )
+except ImportError:  # metrics are optional; /metrics answers 503 without them
+    Counter = None
+
+ENABLED = Counter is not None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+if ENABLED:
+    HTTP_REQUESTS = Counter(
+        'iot_http_requests_total', 'HTTP requests served',
+        ['route', 'method', 'status']
+    )
+    HTTP_LATENCY = Histogram(
+        'iot_http_request_duration_seconds', 'Time to build a response',
+        ['route', 'method'], buckets=LATENCY_BUCKETS
+    )
+    REQUEST_SPANS = Histogram(
+        'iot_request_span_seconds', 'Time per request spent in db-connect, db-query, hot-tier, serialize, adafruit',
+        ['route', 'span'], buckets=LATENCY_BUCKETS
+    )
+    ADAFRUIT_LATENCY = Histogram(
+        'iot_adafruit_request_duration_seconds', 'Adafruit IO call latency',
+        ['method', 'outcome'], buckets=LATENCY_BUCKETS
+    )
+    COMPONENT_EVENTS = Counter(
+        'iot_component_events_total', 'Cumulative counters of caches, queues, writers, pool and clients',
+        ['component', 'event']
+    )
+    COMPONENT_LEVELS = Gauge(
+        'iot_component_level', 'Current sizes and depths, summed over live workers',
+        ['component', 'name'], multiprocess_mode='livesum'
+    )
+    # Own registry so push_sync() sends only the sync samples; under
+    # PROMETHEUS_MULTIPROC_DIR they still reach /metrics through the shared files
+    SYNC_REGISTRY = CollectorRegistry()
+    SYNC_ROWS = Counter(
+        'iot_sync_rows_total', 'Rows read from local logs (copied) and inserted (synced) by sync_data.py',
+        ['log_type', 'result'], registry=SYNC_REGISTRY
+    )
+    SYNC_LATENCY = Histogram(
+        'iot_sync_file_duration_seconds', 'Time to sync one log file',
+        ['log_type'], buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0), registry=SYNC_REGISTRY
+    )
+
+
+def observe_request(route, method, status, seconds, spans):
+    """Record one served request; `spans` maps span name -> milliseconds"""
+    if not ENABLED:
+        return
+    HTTP_REQUESTS.labels(route, method, str(status)).inc()
+    HTTP_LATENCY.labels(route, method).observe(seconds)
+    for name, duration_ms in spans.items():
+        REQUEST_SPANS.labels(route, name).observe(duration_ms / 1000)
+
+
+def observe_adafruit(method, outcome, seconds):
+    """Record one Adafruit IO call; `outcome` is the HTTP status or 'error'"""
+    if ENABLED:
+        ADAFRUIT_LATENCY.labels(method, str(outcome)).observe(seconds)
+
+
+def observe_sync(log_type, copied, synced, seconds):
+    """Record one synced log file (sync_data.py)"""
+    if not ENABLED:
+        return
+    SYNC_ROWS.labels(log_type, 'copied').inc(copied)
+    SYNC_ROWS.labels(log_type, 'synced').inc(synced)
+    SYNC_LATENCY.labels(log_type).observe(seconds)
+
+
+def push_sync(gateway, job='sync_data'):
+    """Push this run's sync samples to a Pushgateway, replacing the job's last push.
+
+    Returns False when metrics are disabled or no gateway is configured.
+    """
+    if not ENABLED or not gateway:
+        return False
+    push_to_gateway(gateway, job=job, registry=SYNC_REGISTRY, timeout=10)
+    return True
+
+
+class StatsExporter:
+    """Publishes components' stats() snapshots as Prometheus samples.
+
+    Components keep cumulative per-process counters; every `interval` seconds
+    the growth since the previous export is added to iot_component_events_total,
+    so the totals survive worker restarts and add up across workers. Levels
+    (pool size, buffer depth) are exported as gauges.
+    """
+
+    def __init__(self, interval=10.0):
+        self.interval = interval
+        self._sources = []  # (component, stats, counter names, level names)
+        self._init_state()
+        os.register_at_fork(after_in_child=self._init_state)
+
+    def _init_state(self):
+        # Also run in a forked child: the export thread stays with the parent
+        self._lock = threading.Lock()
+        self._thread = None
+        self._exported = {}  # (component, event) -> value at the last export
+
+    def register(self, component, stats, counters=(), levels=()):
+        """Export `counters` and `levels` from the dict returned by `stats()`"""
+        self._sources.append((component, stats, tuple(counters), tuple(levels)))
+
+    def start(self):
+        if not ENABLED or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='metrics-export', daemon=True)
+                self._thread.start()
+
+    def export(self):
+        if not ENABLED:
+            return
+        with self._lock:
+            for component, stats, counters, levels in self._sources:
+                try:
+                    snapshot = stats()
+                except Exception:
+                    continue
+                for event in counters:
+                    value = snapshot.get(event, 0)
+                    previous = self._exported.get((component, event), 0)
+                    # A value below the last export means the component was reset
+                    delta = value - previous if value >= previous else value
+                    if delta:
+                        COMPONENT_EVENTS.labels(component, event).inc(delta)
+                    self._exported[(component, event)] = value
+                for name in levels:
+                    COMPONENT_LEVELS.labels(component, name).set(snapshot.get(name, 0))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.export()
+
+
+def render_metrics():
+    """Return (body, content_type) for a scrape, aggregating workers when multiprocess"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """gunicorn child_exit hook: drop a dead worker's live gauges"""
+    if ENABLED and os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,58 @@
+-- Migration: legacy TIME-only tables -> sensor_data / security_events
+--
+-- The original `temperature`, `humidity` and `status` tables only store a
+-- TIME column, so the day the readings belong to has to be supplied:
+--
+--   psql $DATABASE_URL -v legacy_date=2025-12-01 -f migrations/001_legacy_tables_to_sensor_data.sql
+--
+-- The script is safe to re-run: rows already copied for that day are skipped.
+-- The legacy tables are left in place; drop them once the data is verified.
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+-- Readings always carry a real timestamp
+UPDATE sensor_data SET timestamp = created_at WHERE timestamp IS NULL;
+ALTER TABLE sensor_data ALTER COLUMN timestamp SET NOT NULL;
+
+-- Composite index for per-sensor range scans (replaces the sensor_type-only index)
+CREATE INDEX IF NOT EXISTS idx_sensor_data_sensor_type_timestamp ON sensor_data(sensor_type, timestamp);
+DROP INDEX IF EXISTS idx_sensor_data_sensor_type;
+
+-- Copy temperature readings
+INSERT INTO sensor_data (timestamp, sensor_type, value, unit)
+SELECT DATE :'legacy_date' + t.time, 'temperature', t.value, '°C'
+FROM temperature t
+WHERE NOT EXISTS (
+    SELECT 1 FROM sensor_data s
+    WHERE s.sensor_type = 'temperature'
+      AND s.timestamp = DATE :'legacy_date' + t.time
+);
+
+-- Copy humidity readings
+INSERT INTO sensor_data (timestamp, sensor_type, value, unit)
+SELECT DATE :'legacy_date' + h.time, 'humidity', h.value, '%'
+FROM humidity h
+WHERE NOT EXISTS (
+    SELECT 1 FROM sensor_data s
+    WHERE s.sensor_type = 'humidity'
+      AND s.timestamp = DATE :'legacy_date' + h.time
+);
+
+-- Copy alarm status changes (same mapping as sync_data.py)
+INSERT INTO security_events (timestamp, event_type, details)
+SELECT DATE :'legacy_date' + st.time,
+       CASE WHEN st.value = 'alert' THEN 'alert' ELSE 'state_change' END,
+       'System ' || st.value
+FROM status st
+WHERE NOT EXISTS (
+    SELECT 1 FROM security_events e
+    WHERE e.timestamp = DATE :'legacy_date' + st.time
+      AND e.details = 'System ' || st.value
+);
+
+COMMIT;
+
+ANALYZE sensor_data;
+ANALYZE security_events;
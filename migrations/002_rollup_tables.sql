@@ -0,0 +1,114 @@
+-- Migration: replace the GROUP BY views with incrementally maintained rollups
+--
+--   psql $DATABASE_URL -f migrations/002_rollup_tables.sql
+--
+-- Creates sensor_rollups / security_event_rollups, installs the statement
+-- level triggers that keep them current on every INSERT, backfills them from
+-- the existing rows and repoints the daily_* views at the rollups.
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+-- Block writers while backfilling so no batch is counted twice or missed
+LOCK TABLE sensor_data, security_events IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE TABLE IF NOT EXISTS sensor_rollups (
+    grain VARCHAR(10) NOT NULL,
+    sensor_type VARCHAR(50) NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    reading_count BIGINT NOT NULL,
+    value_sum NUMERIC NOT NULL,
+    min_value DECIMAL(10, 2) NOT NULL,
+    max_value DECIMAL(10, 2) NOT NULL,
+    PRIMARY KEY (grain, sensor_type, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS security_event_rollups (
+    grain VARCHAR(10) NOT NULL,
+    event_type VARCHAR(50) NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    event_count BIGINT NOT NULL,
+    PRIMARY KEY (grain, event_type, bucket)
+);
+
+CREATE OR REPLACE FUNCTION rollup_sensor_data() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO sensor_rollups AS r (grain, sensor_type, bucket, reading_count, value_sum, min_value, max_value)
+    SELECT g.grain, n.sensor_type, date_trunc(g.grain, n.timestamp),
+           COUNT(*), SUM(n.value), MIN(n.value), MAX(n.value)
+    FROM new_rows n
+    CROSS JOIN (VALUES ('minute'), ('hour'), ('day')) AS g(grain)
+    GROUP BY 1, 2, 3
+    ON CONFLICT (grain, sensor_type, bucket) DO UPDATE SET
+        reading_count = r.reading_count + EXCLUDED.reading_count,
+        value_sum = r.value_sum + EXCLUDED.value_sum,
+        min_value = LEAST(r.min_value, EXCLUDED.min_value),
+        max_value = GREATEST(r.max_value, EXCLUDED.max_value);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rollup_security_events() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO security_event_rollups AS r (grain, event_type, bucket, event_count)
+    SELECT g.grain, n.event_type, date_trunc(g.grain, n.timestamp), COUNT(*)
+    FROM new_rows n
+    CROSS JOIN (VALUES ('hour'), ('day')) AS g(grain)
+    GROUP BY 1, 2, 3
+    ON CONFLICT (grain, event_type, bucket) DO UPDATE SET
+        event_count = r.event_count + EXCLUDED.event_count;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sensor_data_rollup ON sensor_data;
+CREATE TRIGGER sensor_data_rollup
+    AFTER INSERT ON sensor_data
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_sensor_data();
+
+DROP TRIGGER IF EXISTS security_events_rollup ON security_events;
+CREATE TRIGGER security_events_rollup
+    AFTER INSERT ON security_events
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_security_events();
+
+-- Backfill from existing rows (re-running rebuilds the rollups from scratch)
+TRUNCATE sensor_rollups, security_event_rollups;
+
+INSERT INTO sensor_rollups (grain, sensor_type, bucket, reading_count, value_sum, min_value, max_value)
+SELECT g.grain, s.sensor_type, date_trunc(g.grain, s.timestamp),
+       COUNT(*), SUM(s.value), MIN(s.value), MAX(s.value)
+FROM sensor_data s
+CROSS JOIN (VALUES ('minute'), ('hour'), ('day')) AS g(grain)
+GROUP BY 1, 2, 3;
+
+INSERT INTO security_event_rollups (grain, event_type, bucket, event_count)
+SELECT g.grain, e.event_type, date_trunc(g.grain, e.timestamp), COUNT(*)
+FROM security_events e
+CROSS JOIN (VALUES ('hour'), ('day')) AS g(grain)
+GROUP BY 1, 2, 3;
+
+CREATE OR REPLACE VIEW daily_sensor_stats AS
+SELECT
+    bucket::date as date,
+    sensor_type,
+    min_value,
+    max_value,
+    value_sum / reading_count as avg_value,
+    reading_count
+FROM sensor_rollups
+WHERE grain = 'day'
+ORDER BY date DESC, sensor_type;
+
+CREATE OR REPLACE VIEW daily_security_summary AS
+SELECT
+    bucket::date as date,
+    event_type,
+    event_count
+FROM security_event_rollups
+WHERE grain = 'day'
+ORDER BY date DESC, event_type;
+
+COMMIT;
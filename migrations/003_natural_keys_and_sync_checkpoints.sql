@@ -0,0 +1,59 @@
+-- Migration: natural unique keys and sync checkpoints
+--
+--   psql $DATABASE_URL -f migrations/003_natural_keys_and_sync_checkpoints.sql
+--
+-- Removes rows duplicated by earlier re-syncs, adds the (sensor_type,
+-- timestamp) and (timestamp, event_type, details) unique keys that make
+-- sync_data.py idempotent, creates sync_checkpoints and rebuilds the rollups
+-- so they no longer count the removed duplicates.
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+LOCK TABLE sensor_data, security_events IN SHARE ROW EXCLUSIVE MODE;
+
+-- Keep the first copy of every duplicated reading / event
+DELETE FROM sensor_data a
+USING sensor_data b
+WHERE a.sensor_type = b.sensor_type
+  AND a.timestamp = b.timestamp
+  AND a.id > b.id;
+
+DELETE FROM security_events a
+USING security_events b
+WHERE a.timestamp = b.timestamp
+  AND a.event_type = b.event_type
+  AND a.details IS NOT DISTINCT FROM b.details
+  AND a.id > b.id;
+
+DROP INDEX IF EXISTS idx_sensor_data_sensor_type_timestamp;
+CREATE UNIQUE INDEX idx_sensor_data_sensor_type_timestamp ON sensor_data(sensor_type, timestamp);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_security_events_natural_key ON security_events(timestamp, event_type, details);
+
+CREATE TABLE IF NOT EXISTS sync_checkpoints (
+    file_name VARCHAR(255) PRIMARY KEY,
+    inode BIGINT NOT NULL,
+    mtime DOUBLE PRECISION NOT NULL,
+    byte_offset BIGINT NOT NULL,
+    last_timestamp TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Rebuild the rollups from the de-duplicated rows
+TRUNCATE sensor_rollups, security_event_rollups;
+
+INSERT INTO sensor_rollups (grain, sensor_type, bucket, reading_count, value_sum, min_value, max_value)
+SELECT g.grain, s.sensor_type, date_trunc(g.grain, s.timestamp),
+       COUNT(*), SUM(s.value), MIN(s.value), MAX(s.value)
+FROM sensor_data s
+CROSS JOIN (VALUES ('minute'), ('hour'), ('day')) AS g(grain)
+GROUP BY 1, 2, 3;
+
+INSERT INTO security_event_rollups (grain, event_type, bucket, event_count)
+SELECT g.grain, e.event_type, date_trunc(g.grain, e.timestamp), COUNT(*)
+FROM security_events e
+CROSS JOIN (VALUES ('hour'), ('day')) AS g(grain)
+GROUP BY 1, 2, 3;
+
+COMMIT;
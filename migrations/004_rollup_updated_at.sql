@@ -0,0 +1,37 @@
+-- Migration: record when each day rollup last changed
+--
+--   psql $DATABASE_URL -f migrations/004_rollup_updated_at.sql
+--
+-- Adds sensor_rollups.updated_at, set on the 'day' rows whenever readings are
+-- folded in, and an index the web hosts poll to invalidate cached chart
+-- responses for sensor-days written from elsewhere (sync_data.py on the Pi).
+-- minute/hour rows leave it NULL so their updates stay HOT.
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+ALTER TABLE sensor_rollups ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+UPDATE sensor_rollups SET updated_at = LOCALTIMESTAMP WHERE grain = 'day' AND updated_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_sensor_rollups_day_updated_at ON sensor_rollups(updated_at) WHERE grain = 'day';
+
+CREATE OR REPLACE FUNCTION rollup_sensor_data() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO sensor_rollups AS r (grain, sensor_type, bucket, reading_count, value_sum, min_value, max_value, updated_at)
+    SELECT g.grain, n.sensor_type, date_trunc(g.grain, n.timestamp),
+           COUNT(*), SUM(n.value), MIN(n.value), MAX(n.value),
+           CASE WHEN g.grain = 'day' THEN clock_timestamp()::timestamp END
+    FROM new_rows n
+    CROSS JOIN (VALUES ('minute'), ('hour'), ('day')) AS g(grain)
+    GROUP BY 1, 2, 3
+    ON CONFLICT (grain, sensor_type, bucket) DO UPDATE SET
+        reading_count = r.reading_count + EXCLUDED.reading_count,
+        value_sum = r.value_sum + EXCLUDED.value_sum,
+        min_value = LEAST(r.min_value, EXCLUDED.min_value),
+        max_value = GREATEST(r.max_value, EXCLUDED.max_value),
+        updated_at = EXCLUDED.updated_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
@@ -0,0 +1,18 @@
+-- Migration: hash of the start of each synced log file
+--
+--   psql $DATABASE_URL -f migrations/005_sync_checkpoint_head_hash.sql
+--
+-- sync_data.py stores a SHA-256 of the first bytes of every log file it has
+-- synced, up to 4096 and never past the checkpoint offset, and reads the file
+-- again from the start when that part changed. Without it a file rewritten
+-- in place with the same size or longer resumed at the old offset and
+-- skipped the rewritten lines. Existing checkpoints keep a NULL hash until
+-- their next sync.
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+ALTER TABLE sync_checkpoints ADD COLUMN IF NOT EXISTS head_hash TEXT;
+
+COMMIT;
@@ -0,0 +1,39 @@
+-- Migration: key security_events on a hash of details
+--
+--   psql $DATABASE_URL -f migrations/006_security_events_details_hash_key.sql
+--
+-- Replaces the (timestamp, event_type, details) unique key from migration 003
+-- with (timestamp, event_type, md5(COALESCE(details, ''))). Raw TEXT could
+-- exceed the btree row size limit and fail the insert, and NULL details were
+-- never equal, so NULL-detail events were stored again on every re-sync.
+-- The INSERT ... ON CONFLICT statements in app.py and sync_data.py name this
+-- key and need it to exist.
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+LOCK TABLE security_events IN SHARE ROW EXCLUSIVE MODE;
+
+-- Keep the first copy of events the old key let through (NULL details)
+DELETE FROM security_events a
+USING security_events b
+WHERE a.timestamp = b.timestamp
+  AND a.event_type = b.event_type
+  AND md5(COALESCE(a.details, '')) = md5(COALESCE(b.details, ''))
+  AND a.id > b.id;
+
+DROP INDEX IF EXISTS idx_security_events_natural_key;
+CREATE UNIQUE INDEX idx_security_events_natural_key
+    ON security_events(timestamp, event_type, md5(COALESCE(details, '')));
+
+-- Rebuild the event rollups so they no longer count the removed duplicates
+TRUNCATE security_event_rollups;
+
+INSERT INTO security_event_rollups (grain, event_type, bucket, event_count)
+SELECT g.grain, e.event_type, date_trunc(g.grain, e.timestamp), COUNT(*)
+FROM security_events e
+CROSS JOIN (VALUES ('hour'), ('day')) AS g(grain)
+GROUP BY 1, 2, 3;
+
+COMMIT;
@@ -0,0 +1,399 @@
+"""
+Response Cache
+Memory LRU plus optional on-disk tier for chart responses, invalidated per sensor-day
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+try:
+    import fcntl
+except ImportError:  # without flock every worker polls for changes itself
+    fcntl = None
+
+# Touched whenever readings for a sensor-day change. Shared by every process on
+# the host, so an entry built before the touch is recognised as stale wherever
+# it is cached. Writers on other hosts reach it through ResponseCache's poll of
+# the day rollups. Defaults to Flask's instance folder next to this file, which
+# sync_data.py finds without the app; not /tmp, where anyone could plant files.
+DEFAULT_MARKER_DIR = os.getenv(
+    'RESPONSE_CACHE_MARKER_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'response-cache-markers')
+)
+
+SAFE_NAME = re.compile(r'^[a-z0-9_-]{1,50}$')
+
+log = logging.getLogger(__name__)
+
+
+def make_private_dir(path):
+    """Create `path` (mode 0o700) and check no other user can write to it.
+
+    Raises PermissionError when an existing directory belongs to someone else
+    or is group/world-writable.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if hasattr(os, 'getuid') and info.st_uid != os.getuid():
+        raise PermissionError(f'{path} is owned by another user')
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f'{path} is writable by other users')
+
+
+def _marker_path(marker_dir, sensor, day):
+    if not SAFE_NAME.match(sensor):
+        sensor = hashlib.sha256(sensor.encode()).hexdigest()[:16]
+    return os.path.join(marker_dir, sensor, day.isoformat())
+
+
+def mark_changed(sensor, day, marker_dir=DEFAULT_MARKER_DIR):
+    """Invalidate every cached response covering `sensor` on `day`"""
+    path = _marker_path(marker_dir, sensor, day)
+    try:
+        make_private_dir(marker_dir)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        with open(path, 'a'):
+            pass
+        os.utime(path, None)
+    except OSError as e:
+        log.warning('Could not mark sensor-day as changed', extra={'sensor': sensor, 'day': day, 'error': str(e)})
+
+
+def range_days(start, end):
+    """Dates touched by the half-open range [start, end)"""
+    day = start.date()
+    last = (end - timedelta(microseconds=1)).date()
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+
+class ResponseCache:
+    """Caches rendered responses keyed on the request that produced them.
+
+    Closed ranges (entirely before today) stay cached until evicted or until
+    new readings land in one of their days; they are also written to the disk
+    tier when `disk_dir` is set, one file per entry: a JSON header line, then
+    the body bytes. Open ranges expire after `open_ttl` seconds. Freshness is
+    checked against the sensor-day markers on every hit.
+
+    Local writers touch the markers directly. For writers elsewhere (e.g.
+    sync_data.py on the Pi) a background poll, run by one worker per host,
+    calls `load_changes(since, lookback)` every `poll_interval` seconds for
+    (sensor_type, day, updated_at) rows of the day rollups changed after
+    `since` (the newest updated_at already seen, None at first) minus
+    `lookback` seconds, and touches the markers of those it has not seen.
+    The lookback catches transactions that commit after later ones; what
+    was seen is kept next to the markers so workers taking turns at the
+    poll do not mark the same change twice.
+    """
+
+    def __init__(self, max_bytes, open_ttl=30.0, disk_dir=None, disk_max_bytes=0,
+                 marker_dir=DEFAULT_MARKER_DIR, load_changes=None, poll_interval=30.0,
+                 poll_lookback=600.0):
+        self.max_bytes = max_bytes
+        self.open_ttl = open_ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.marker_dir = marker_dir
+        self.load_changes = load_changes
+        self.poll_interval = poll_interval
+        self.poll_lookback = poll_lookback
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> entry
+        self._bytes = 0
+        self._puts = 0
+        self.counters = {
+            'hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stale': 0,
+            'evictions': 0,
+            'disk_errors': 0,
+            'changes_marked': 0,
+            'poll_errors': 0
+        }
+        if disk_dir:
+            try:
+                make_private_dir(disk_dir)
+            except OSError as e:
+                log.error('Response cache disk tier disabled', extra={'path': disk_dir, 'error': str(e)})
+                self.disk_dir = None
+        self._poll_thread = None
+        os.register_at_fork(after_in_child=self._forget_poll_thread)
+
+    def _forget_poll_thread(self):
+        # Run in a forked child: the poll thread stays with the parent
+        self._poll_thread = None
+
+    @staticmethod
+    def key_for(*parts):
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def _is_fresh(self, entry):
+        if not entry['closed'] and time.time_ns() - entry['created_ns'] > self.open_ttl * 1e9:
+            return False
+        for day in range_days(entry['start'], entry['end']):
+            try:
+                if os.stat(_marker_path(self.marker_dir, entry['sensor'], day)).st_mtime_ns > entry['created_ns']:
+                    return False
+            except FileNotFoundError:
+                continue
+        return True
+
+    def _remember(self, key, entry):
+        """Add to the memory tier, evicting least recently used entries (caller holds the lock)"""
+        old = self._entries.pop(key, None)
+        if old:
+            self._bytes -= len(old['body'])
+        self._entries[key] = entry
+        self._bytes += len(entry['body'])
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted['body'])
+            self.counters['evictions'] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f'{key}.cache')
+
+    def get(self, key):
+        self._start_poll()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is None and self.disk_dir:
+            entry = self._read_disk(key)
+            if entry is not None:
+                with self._lock:
+                    self.counters['disk_hits'] += 1
+                    self._remember(key, entry)
+
+        if entry is None:
+            with self._lock:
+                self.counters['misses'] += 1
+            return None
+
+        if not self._is_fresh(entry):
+            with self._lock:
+                self.counters['stale'] += 1
+                if self._entries.get(key) is entry:
+                    self._bytes -= len(self._entries.pop(key)['body'])
+            if entry['closed'] and self.disk_dir:
+                self._remove_disk(key)
+            return None
+
+        with self._lock:
+            self.counters['hits'] += 1
+        return entry
+
+    def put(self, key, body, headers, sensor, start, end, closed, created_ns):
+        """Store a rendered response.
+
+        `created_ns` must be taken before the data was read, so readings
+        committed while the query ran still invalidate the entry.
+        """
+        entry = {
+            'body': body,
+            'headers': headers,
+            'etag': hashlib.sha256(body).hexdigest()[:32],
+            'last_modified': datetime.fromtimestamp(created_ns / 1e9, timezone.utc).replace(microsecond=0),
+            'sensor': sensor,
+            'start': start,
+            'end': end,
+            'closed': closed,
+            'created_ns': created_ns
+        }
+        if len(body) <= self.max_bytes:
+            with self._lock:
+                self._remember(key, entry)
+        if closed and self.disk_dir:
+            self._write_disk(key, entry)
+        return entry
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                header = json.loads(f.readline())
+                body = f.read()
+            if len(body) != header['size']:
+                raise ValueError('truncated body')
+            return {
+                'body': body,
+                'headers': [tuple(pair) for pair in header['headers']],
+                'etag': header['etag'],
+                'last_modified': datetime.fromisoformat(header['last_modified']),
+                'sensor': header['sensor'],
+                'start': datetime.fromisoformat(header['start']),
+                'end': datetime.fromisoformat(header['end']),
+                'closed': header['closed'],
+                'created_ns': header['created_ns']
+            }
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            with self._lock:
+                self.counters['disk_errors'] += 1
+            log.warning('Response cache read failed', extra={'error': str(e)})
+            self._remove_disk(key)
+            return None
+
+    def _write_disk(self, key, entry):
+        path = self._disk_path(key)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            header = {
+                'size': len(entry['body']),
+                'headers': entry['headers'],
+                'etag': entry['etag'],
+                'last_modified': entry['last_modified'].isoformat(),
+                'sensor': entry['sensor'],
+                'start': entry['start'].isoformat(),
+                'end': entry['end'].isoformat(),
+                'closed': entry['closed'],
+                'created_ns': entry['created_ns']
+            }
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps(header).encode() + b'\n')
+                f.write(entry['body'])
+            os.replace(tmp_path, path)
+        except OSError as e:
+            with self._lock:
+                self.counters['disk_errors'] += 1
+            log.warning('Response cache write failed', extra={'error': str(e)})
+            return
+
+        with self._lock:
+            self._puts += 1
+            prune = self._puts % 50 == 0
+        if prune:
+            self._prune_disk()
+
+    def _remove_disk(self, key):
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+    def _prune_disk(self):
+        """Delete the oldest disk entries once the tier exceeds disk_max_bytes"""
+        if not self.disk_max_bytes:
+            return
+        try:
+            files = [entry for entry in os.scandir(self.disk_dir) if entry.name.endswith('.cache')]
+            files = sorted(((f.stat().st_mtime, f.stat().st_size, f.path) for f in files))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def mark_rows(self, rows):
+        """BatchWriter listener: invalidate the sensor-days new readings fall in"""
+        changed = {(sensor, timestamp.date()) for timestamp, sensor, *_ in rows}
+        for sensor, day in changed:
+            mark_changed(sensor, day, self.marker_dir)
+
+    def _start_poll(self):
+        if self.load_changes is not None and self._poll_thread is None:
+            with self._lock:
+                if self._poll_thread is None:
+                    self._poll_thread = threading.Thread(target=self._poll, name='response-cache-poll', daemon=True)
+                    self._poll_thread.start()
+
+    def _poll_state_path(self):
+        return os.path.join(self.marker_dir, '.rollups-seen.json')
+
+    def _read_poll_state(self):
+        """(newest updated_at seen, {(sensor, day): updated_at marked}) shared by the host's workers"""
+        try:
+            with open(self._poll_state_path()) as f:
+                state = json.load(f)
+            seen = {tuple(key.split('|', 1)): value for key, value in state['seen'].items()}
+            return datetime.fromisoformat(state['watermark']), seen
+        except (OSError, ValueError, KeyError, TypeError):
+            return None, {}
+
+    def _write_poll_state(self, watermark, seen):
+        state = {'watermark': watermark.isoformat(), 'seen': {'|'.join(key): value for key, value in seen.items()}}
+        fd, tmp_path = tempfile.mkstemp(dir=self.marker_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._poll_state_path())
+
+    def poll_changes(self):
+        """Touch the markers of sensor-days changed in the database since the last poll"""
+        watermark, seen = self._read_poll_state()
+        changes = self.load_changes(watermark, self.poll_lookback)
+        marked = 0
+        for sensor, day, updated_at in changes:
+            key, version = (sensor, day.isoformat()), updated_at.isoformat()
+            if seen.get(key) != version:
+                mark_changed(sensor, day, self.marker_dir)
+                seen[key] = version
+                marked += 1
+
+        newest = max((updated_at for *_, updated_at in changes), default=watermark)
+        if marked or newest != watermark:
+            # Forget what the next poll's lookback can no longer return
+            horizon = (newest - timedelta(seconds=self.poll_lookback)).isoformat()
+            self._write_poll_state(newest, {key: version for key, version in seen.items() if version > horizon})
+        with self._lock:
+            self.counters['changes_marked'] += marked
+        return marked
+
+    def _poll(self):
+        try:
+            make_private_dir(self.marker_dir)
+        except OSError as e:
+            log.error('Response cache change poll disabled', extra={'path': self.marker_dir, 'error': str(e)})
+            return
+        lock_file = open(os.path.join(self.marker_dir, '.poll.lock'), 'a') if fcntl else None
+        while True:
+            try:
+                # One worker per host polls; the markers are shared
+                if lock_file is None or self._try_lock(lock_file):
+                    try:
+                        self.poll_changes()
+                    finally:
+                        if lock_file is not None:
+                            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            except Exception as e:
+                with self._lock:
+                    self.counters['poll_errors'] += 1
+                log.warning('Response cache change poll failed', extra={'error': str(e)})
+            time.sleep(self.poll_interval)
+
+    @staticmethod
+    def _try_lock(lock_file):
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            counters['entries'] = len(self._entries)
+            counters['bytes'] = self._bytes
+        lookups = counters['hits'] + counters['misses'] + counters['stale']
+        counters['hit_ratio'] = round(counters['hits'] / lookups, 3) if lookups else 0.0
+        counters['disk'] = bool(self.disk_dir)
+        return counters
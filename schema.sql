@@ -3,7 +3,7 @@
 -- Table for sensor data (temperature, humidity, light, etc.)
 CREATE TABLE IF NOT EXISTS sensor_data (
     id SERIAL PRIMARY KEY,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     sensor_type VARCHAR(50) NOT NULL,
     value DECIMAL(10, 2) NOT NULL,
     unit VARCHAR(20),
@@ -11,8 +11,10 @@ CREATE TABLE IF NOT EXISTS sensor_data (
 );
 
 -- Index for faster queries by date and sensor type
+-- (sensor_type, timestamp) serves the per-sensor range scans used by the API
+-- and is the natural key that makes re-syncing a log file idempotent
 CREATE INDEX idx_sensor_data_timestamp ON sensor_data(timestamp);
-CREATE INDEX idx_sensor_data_sensor_type ON sensor_data(sensor_type);
+CREATE UNIQUE INDEX idx_sensor_data_sensor_type_timestamp ON sensor_data(sensor_type, timestamp);
 CREATE INDEX idx_sensor_data_date ON sensor_data(DATE(timestamp));
 
 -- Table for security events (alerts, intrusions, system state changes)
@@ -30,6 +32,21 @@ CREATE TABLE IF NOT EXISTS security_events (
 CREATE INDEX idx_security_events_timestamp ON security_events(timestamp);
 CREATE INDEX idx_security_events_event_type ON security_events(event_type);
 CREATE INDEX idx_security_events_date ON security_events(DATE(timestamp));
+-- Natural key so the same logged event is never stored twice. details is
+-- hashed: long TEXT would exceed the btree row limit, and NULLs would never
+-- count as equal.
+CREATE UNIQUE INDEX idx_security_events_natural_key ON security_events(timestamp, event_type, md5(COALESCE(details, '')));
+
+-- Per-file progress of sync_data.py so repeated runs only read new lines
+CREATE TABLE IF NOT EXISTS sync_checkpoints (
+    file_name VARCHAR(255) PRIMARY KEY,
+    inode BIGINT NOT NULL,
+    mtime DOUBLE PRECISION NOT NULL,
+    byte_offset BIGINT NOT NULL,
+    last_timestamp TIMESTAMP,
+    head_hash TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
 
 -- Table for device control logs
 CREATE TABLE IF NOT EXISTS device_logs (
@@ -55,27 +72,100 @@ CREATE TABLE IF NOT EXISTS system_status (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- View for daily sensor statistics
+-- Rollup tables, maintained incrementally by the triggers below so that
+-- aggregate reads cost O(buckets) instead of O(rows).
+-- grain is one of 'minute', 'hour', 'day'; bucket is date_trunc(grain, timestamp).
+-- updated_at is set on 'day' rows only; web hosts poll it to invalidate
+-- cached chart responses for sensor-days written from elsewhere.
+CREATE TABLE IF NOT EXISTS sensor_rollups (
+    grain VARCHAR(10) NOT NULL,
+    sensor_type VARCHAR(50) NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    reading_count BIGINT NOT NULL,
+    value_sum NUMERIC NOT NULL,
+    min_value DECIMAL(10, 2) NOT NULL,
+    max_value DECIMAL(10, 2) NOT NULL,
+    updated_at TIMESTAMP,
+    PRIMARY KEY (grain, sensor_type, bucket)
+);
+
+CREATE INDEX IF NOT EXISTS idx_sensor_rollups_day_updated_at ON sensor_rollups(updated_at) WHERE grain = 'day';
+
+-- grain is one of 'hour', 'day'
+CREATE TABLE IF NOT EXISTS security_event_rollups (
+    grain VARCHAR(10) NOT NULL,
+    event_type VARCHAR(50) NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    event_count BIGINT NOT NULL,
+    PRIMARY KEY (grain, event_type, bucket)
+);
+
+-- Fold each inserted batch into the rollups (one statement, not one per row)
+CREATE OR REPLACE FUNCTION rollup_sensor_data() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO sensor_rollups AS r (grain, sensor_type, bucket, reading_count, value_sum, min_value, max_value, updated_at)
+    SELECT g.grain, n.sensor_type, date_trunc(g.grain, n.timestamp),
+           COUNT(*), SUM(n.value), MIN(n.value), MAX(n.value),
+           CASE WHEN g.grain = 'day' THEN clock_timestamp()::timestamp END
+    FROM new_rows n
+    CROSS JOIN (VALUES ('minute'), ('hour'), ('day')) AS g(grain)
+    GROUP BY 1, 2, 3
+    ON CONFLICT (grain, sensor_type, bucket) DO UPDATE SET
+        reading_count = r.reading_count + EXCLUDED.reading_count,
+        value_sum = r.value_sum + EXCLUDED.value_sum,
+        min_value = LEAST(r.min_value, EXCLUDED.min_value),
+        max_value = GREATEST(r.max_value, EXCLUDED.max_value),
+        updated_at = EXCLUDED.updated_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rollup_security_events() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO security_event_rollups AS r (grain, event_type, bucket, event_count)
+    SELECT g.grain, n.event_type, date_trunc(g.grain, n.timestamp), COUNT(*)
+    FROM new_rows n
+    CROSS JOIN (VALUES ('hour'), ('day')) AS g(grain)
+    GROUP BY 1, 2, 3
+    ON CONFLICT (grain, event_type, bucket) DO UPDATE SET
+        event_count = r.event_count + EXCLUDED.event_count;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sensor_data_rollup ON sensor_data;
+CREATE TRIGGER sensor_data_rollup
+    AFTER INSERT ON sensor_data
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_sensor_data();
+
+DROP TRIGGER IF EXISTS security_events_rollup ON security_events;
+CREATE TRIGGER security_events_rollup
+    AFTER INSERT ON security_events
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_security_events();
+
+-- View for daily sensor statistics (served from the day rollup)
 CREATE OR REPLACE VIEW daily_sensor_stats AS
 SELECT 
-    DATE(timestamp) as date,
+    bucket::date as date,
     sensor_type,
-    MIN(value) as min_value,
-    MAX(value) as max_value,
-    AVG(value) as avg_value,
-    COUNT(*) as reading_count
-FROM sensor_data
-GROUP BY DATE(timestamp), sensor_type
+    min_value,
+    max_value,
+    value_sum / reading_count as avg_value,
+    reading_count
+FROM sensor_rollups
+WHERE grain = 'day'
 ORDER BY date DESC, sensor_type;
 
--- View for daily security summary
+-- View for daily security summary (served from the day rollup)
 CREATE OR REPLACE VIEW daily_security_summary AS
 SELECT 
-    DATE(timestamp) as date,
+    bucket::date as date,
     event_type,
-    COUNT(*) as event_count
-FROM security_events
-GROUP BY DATE(timestamp), event_type
+    event_count
+FROM security_event_rollups
+WHERE grain = 'day'
 ORDER BY date DESC, event_type;
 
 -- Example queries for testing:
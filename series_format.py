@@ -0,0 +1,137 @@
+"""
+Series encoding
+Compact columnar encodings for time-series chart responses
+"""
+
+import gzip
+import json
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+
+try:
+    import brotli
+except ImportError:  # brotli compression is optional, gzip is always available
+    brotli = None
+
+SERIES_FORMATS = ('json', 'compact', 'binary')
+
+# Media types that select a format through the Accept header
+COMPACT_MIMETYPE = 'application/x-sensor-series+json'
+BINARY_MIMETYPE = 'application/x-sensor-series'
+
+# magic, point count, flags, timestamp unit (ms), first timestamp (epoch seconds)
+BINARY_MAGIC = b'SRS1'
+BINARY_HEADER = struct.Struct('<4sIII d')
+FLAG_MIN_MAX = 1
+# Deltas are float64 instead of int32 (a gap longer than int32 units, ~24.8 days in ms)
+FLAG_WIDE_DELTAS = 2
+INT32_RANGE = range(-2**31, 2**31)
+
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+
+# sensor_data stores local wall-clock time; it is encoded as if it were UTC so
+# clients render the same clock time with their UTC accessors.
+EPOCH = datetime(1970, 1, 1)
+ONE_SECOND = timedelta(seconds=1)
+
+
+def encode_timestamps(rows):
+    """Delta-encode row timestamps.
+
+    Returns (t0, unit_ms, deltas): t0 is the first timestamp in epoch seconds
+    and deltas[i] is the gap to the previous point in units of unit_ms
+    milliseconds (seconds when every timestamp is whole, else milliseconds).
+    """
+    if not rows:
+        return 0.0, 1000, []
+    epochs = [(row['timestamp'] - EPOCH) / ONE_SECOND for row in rows]
+    whole = all(epoch.is_integer() for epoch in epochs)
+    unit_ms = 1000 if whole else 1
+    scale = 1 if whole else 1000
+    ticks = [round(epoch * scale) for epoch in epochs]
+    deltas = [0] + [b - a for a, b in zip(ticks, ticks[1:])]
+    return epochs[0], unit_ms, deltas
+
+
+def encode_compact(rows):
+    """Columnar JSON-ready dict: delta timestamps plus value columns"""
+    t0, unit_ms, deltas = encode_timestamps(rows)
+    data = {
+        't0': t0,
+        'unit_ms': unit_ms,
+        'dt': deltas,
+        'values': [float(row['value']) for row in rows]
+    }
+    if rows and 'min_value' in rows[0]:
+        data['min'] = [float(row['min_value']) for row in rows]
+        data['max'] = [float(row['max_value']) for row in rows]
+    return data
+
+
+def encode_binary(rows):
+    """Pack a series as a little-endian typed-array body.
+
+    Layout: 24-byte header (BINARY_HEADER), then int32 deltas (float64 when
+    FLAG_WIDE_DELTAS is set), float32 values and, when FLAG_MIN_MAX is set,
+    float32 min and max columns. Every column starts aligned to its element
+    size so browsers can view it without copying.
+    """
+    t0, unit_ms, deltas = encode_timestamps(rows)
+    has_bands = bool(rows) and 'min_value' in rows[0]
+    # float64 holds integers exactly up to 2**53, far beyond any real gap
+    wide = any(delta not in INT32_RANGE for delta in deltas)
+
+    columns = [array('d' if wide else 'i', deltas), array('f', [row['value'] for row in rows])]
+    if has_bands:
+        columns.append(array('f', [row['min_value'] for row in rows]))
+        columns.append(array('f', [row['max_value'] for row in rows]))
+    if sys.byteorder != 'little':
+        for column in columns:
+            column.byteswap()
+
+    flags = (FLAG_MIN_MAX if has_bands else 0) | (FLAG_WIDE_DELTAS if wide else 0)
+    header = BINARY_HEADER.pack(BINARY_MAGIC, len(rows), flags, unit_ms, t0)
+    return header + b''.join(column.tobytes() for column in columns)
+
+
+def negotiate_format(requested, accept_mimetypes):
+    """Pick a series format from ?format= or, failing that, the Accept header"""
+    if requested:
+        if requested not in SERIES_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(SERIES_FORMATS)}")
+        return requested
+    best = accept_mimetypes.best_match(['application/json', COMPACT_MIMETYPE, BINARY_MIMETYPE])
+    if best == BINARY_MIMETYPE:
+        return 'binary'
+    if best == COMPACT_MIMETYPE:
+        return 'compact'
+    return 'json'
+
+
+def preferred_encoding(accept_encodings):
+    """Best content coding the client accepts: 'br', 'gzip' or None"""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    """Compress a body with an encoding from preferred_encoding().
+
+    Returns (body, content_encoding or None).
+    """
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if encoding == 'br':
+        return brotli.compress(body, quality=4), 'br'
+    return gzip.compress(body, compresslevel=5), 'gzip'
+
+
+def dumps_compact(payload):
+    """Serialize a compact payload without whitespace"""
+    return json.dumps(payload, separators=(',', ':')).encode()
@@ -0,0 +1,144 @@
+"""
+Structured logging
+JSON log records written by a background thread, plus per-request timing spans
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# LogRecord attributes that are not `extra` fields supplied by the caller
+RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_timings = contextvars.ContextVar('request_timings', default=None)
+_listener = None
+_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra` fields become top-level keys"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _start_listener():
+    global _listener, _handler
+    records = queue.SimpleQueue()
+    # Records are rendered on the calling thread (cheap) and written to
+    # stdout by the listener thread, so a slow pipe never blocks a request.
+    handler = QueueHandler(records)
+    handler.setFormatter(JsonFormatter())
+    _listener = QueueListener(records, logging.StreamHandler(sys.stdout))
+    _listener.start()
+
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+    root.addHandler(handler)
+    _handler = handler
+
+
+def configure_logging(level='INFO'):
+    """Route every logger through a JSON queue handler (idempotent)"""
+    if _listener is not None:
+        return
+    logging.getLogger().setLevel(level.upper() if isinstance(level, str) else level)
+    _start_listener()
+    atexit.register(lambda: _listener.stop())
+    # The listener thread does not survive fork; children start their own
+    os.register_at_fork(after_in_child=_start_listener)
+
+
+class Timings:
+    """Spans recorded while serving one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._spans = {}  # (name, desc) -> [total ms, count]
+
+    def add(self, name, duration_ms, desc=None):
+        with self._lock:
+            span = self._spans.setdefault((name, desc), [0.0, 0])
+            span[0] += duration_ms
+            span[1] += 1
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def summary(self):
+        """{name: total ms}, summed over descriptions"""
+        totals = {}
+        with self._lock:
+            for (name, _), (duration, _) in self._spans.items():
+                totals[name] = round(totals.get(name, 0.0) + duration, 2)
+        return totals
+
+    def header(self, total_ms=None):
+        """Server-Timing header value; repeated spans are summed"""
+        with self._lock:
+            spans = list(self._spans.items())
+        parts = []
+        for (name, desc), (duration, count) in spans:
+            if count > 1:
+                desc = f'{desc or name} x{count}'
+            part = f'{name};dur={duration:.1f}'
+            if desc:
+                part += ';desc="{}"'.format(desc.replace('"', "'"))
+            parts.append(part)
+        if total_ms is not None:
+            parts.append(f'total;dur={total_ms:.1f}')
+        return ', '.join(parts)
+
+
+def start_request():
+    """Begin collecting spans for the request served by this context"""
+    timings = Timings()
+    _timings.set(timings)
+    return timings
+
+
+def current_timings():
+    return _timings.get()
+
+
+def add_span(name, duration_ms, desc=None):
+    """Record an already measured span against the current request, if any"""
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(name, duration_ms, desc)
+
+
+@contextmanager
+def span(name, desc=None):
+    """Time the enclosed block as a span of the current request"""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, (time.perf_counter() - started) * 1000, desc)
@@ -3,105 +3,338 @@ Data Sync Script
 Synchronizes local CSV log files with cloud PostgreSQL database
 """
 
+import argparse
 import csv
+import hashlib
 import os
-import psycopg2
-from datetime import datetime
+import threading
+import time
+import psycopg
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from pathlib import Path
+from psycopg_pool import ConnectionPool
+from db_schema import LOG_TYPES, STAGING_SQL, LogType
 
+# metrics and response_cache read their settings on import
 load_dotenv()
 
+from metrics import observe_sync, push_sync
+from response_cache import mark_changed
+
+
+def time_parser(date_str):
+    """Build a parser for 'HH:MM:SS[.ffffff]' log times on a fixed date.
+
+    The date is parsed once per file; each row then only splits the time,
+    which is much cheaper than strptime on a concatenated string.
+    """
+    day = datetime.strptime(date_str, "%Y-%m-%d")
+    year, month, dom = day.year, day.month, day.day
+    
+    def parse(value):
+        clock, _, fraction = value.strip().partition('.')
+        hour, minute, second = clock.split(':')
+        microsecond = int(fraction.ljust(6, '0')[:6]) if fraction else 0
+        return datetime(year, month, dom, int(hour), int(minute), int(second), microsecond)
+    
+    return parse
+
+
+class Quarantine:
+    """Collects log lines that failed to parse into a side file for later review"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+        self._writer = None
+    
+    def add(self, raw_line, error):
+        if self._writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            new_file = not self.path.exists()
+            self._file = open(self.path, 'a', newline='')
+            self._writer = csv.writer(self._file)
+            if new_file:
+                self._writer.writerow(['quarantined_at', 'error', 'line'])
+        self._writer.writerow([datetime.now().isoformat(timespec='seconds'), str(error), raw_line.rstrip('\r\n')])
+        self.count += 1
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+
+# How much of the start of a log file is hashed into its checkpoint
+HEAD_HASH_BYTES = 4096
+
+
 class DataSync:
     def __init__(self):
         self.db_url = os.getenv('DATABASE_URL')
+        # Neon requires TLS; a local database (e.g. the benchmark's) may not offer it
+        self.sslmode = os.getenv('DATABASE_SSLMODE', 'require')
         self.logs_dir = Path(__file__).resolve().parents[1] / 'backend' / 'logs'
+        self.pool = None
+        self.totals_lock = threading.Lock()
+        self.totals = {'files': 0, 'copied': 0, 'synced': 0}
         
     def get_db_connection(self):
         """Create database connection"""
         try:
-            conn = psycopg2.connect(self.db_url, sslmode='require')
+            conn = psycopg.connect(self.db_url, sslmode=self.sslmode)
             return conn
         except Exception as e:
             print(f"Database connection error: {e}")
             return None
     
-    def sync_sensor_data(self, date_str):
-        """Sync sensor data from CSV to database"""
-        conn = self.get_db_connection()
-        if not conn:
-            return False
+    @contextmanager
+    def connection(self):
+        """Borrow a connection from the shared pool, or open a one-off one (None on failure)"""
+        if self.pool is None:
+            conn = self.get_db_connection()
+            try:
+                yield conn
+            finally:
+                if conn:
+                    conn.close()
+            return
         
-        cursor = conn.cursor()
-        synced_count = 0
+        try:
+            conn = self.pool.getconn()
+        except Exception as e:
+            print(f"Database connection error: {e}")
+            yield None
+            return
+        try:
+            yield conn
+        finally:
+            self.pool.putconn(conn)
+    
+    def open_pool(self, size):
+        """Share `size` connections between all sync workers"""
+        self.pool = ConnectionPool(
+            self.db_url,
+            min_size=1,
+            max_size=size,
+            kwargs={'sslmode': self.sslmode},
+            name='sync',
+            open=True
+        )
+    
+    def close_pool(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+    
+    def copy_and_merge(self, cursor, staging_ddl, copy_sql, merge_sql, rows):
+        """Stream rows into a temporary staging table with COPY, then merge them.
+
+        The whole file costs a handful of round trips instead of one per row.
+        Returns (rows_copied, rows_inserted).
+        """
+        cursor.execute(staging_ddl)
+        copied = 0
+        with cursor.copy(copy_sql) as copy:
+            for row in rows:
+                copy.write_row(row)
+                copied += 1
+        cursor.execute(merge_sql)
+        return copied, cursor.rowcount
+    
+    @staticmethod
+    def head_hash(path, offset):
+        """SHA-256 of the first min(offset, HEAD_HASH_BYTES) bytes of a file.
+
+        Appending never changes these bytes, so a different hash for the same
+        offset means the synced part of the file was rewritten.
+        """
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read(min(offset, HEAD_HASH_BYTES))).hexdigest()
+    
+    def load_checkpoint(self, cursor, path):
+        """Work out where to resume reading a log file.
+
+        The stored checkpoint is only trusted if it still describes the same
+        file: same inode, not truncated, and not rewritten in place. A rewrite
+        shows as a changed mtime without any growth past the offset, or as a
+        different hash of the start of the file. Otherwise the file is read
+        again from the start and the unique keys drop anything already
+        loaded. The row is locked so overlapping cron runs cannot sync the
+        same file twice.
+        """
+        stat = path.stat()
+        state = {
+            'inode': stat.st_ino,
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'offset': 0,
+            'last_timestamp': None
+        }
         
-        # Sync temperature data
-        temp_file = self.logs_dir / f"{date_str}_temperature.csv"
-        if temp_file.exists():
-            with open(temp_file, 'r') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    try:
-                        timestamp = datetime.strptime(f"{date_str} {row['timestamp']}", "%Y-%m-%d %H:%M:%S")
-                        value = float(row['message'])
-                        
-                        cursor.execute("""
-                            INSERT INTO sensor_data (timestamp, sensor_type, value, unit)
-                            VALUES (%s, %s, %s, %s)
-                            ON CONFLICT DO NOTHING
-                        """, (timestamp, 'temperature', value, '°C'))
-                        synced_count += cursor.rowcount
-                    except Exception as e:
-                        print(f"Error syncing temperature row: {e}")
+        cursor.execute("""
+            SELECT inode, byte_offset, mtime, last_timestamp, head_hash
+            FROM sync_checkpoints
+            WHERE file_name = %s
+            FOR UPDATE
+        """, (path.name,))
+        checkpoint = cursor.fetchone()
         
-        # You can add more sensors here (humidity, light, etc.)
+        if checkpoint:
+            inode, offset, mtime, last_timestamp, head_hash = checkpoint
+            same_file = inode == stat.st_ino and offset <= stat.st_size
+            rewritten = (
+                (mtime != stat.st_mtime and stat.st_size <= offset)
+                # Checkpoints saved before migration 005 have no hash
+                or (same_file and head_hash is not None and head_hash != self.head_hash(path, offset))
+            )
+            if same_file and not rewritten:
+                state['offset'] = offset
+                state['last_timestamp'] = last_timestamp
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+        return state
+    
+    def save_checkpoint(self, cursor, path, state):
+        """Record how far into the file has been synced"""
+        cursor.execute("""
+            INSERT INTO sync_checkpoints (file_name, inode, mtime, byte_offset, last_timestamp, head_hash, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (file_name) DO UPDATE SET
+                inode = EXCLUDED.inode,
+                mtime = EXCLUDED.mtime,
+                byte_offset = EXCLUDED.byte_offset,
+                last_timestamp = EXCLUDED.last_timestamp,
+                head_hash = EXCLUDED.head_hash,
+                updated_at = EXCLUDED.updated_at
+        """, (path.name, state['inode'], state['mtime'], state['offset'], state['last_timestamp'],
+              self.head_hash(path, state['offset'])))
+    
+    def read_new_records(self, path, state):
+        """Yield (raw_line, record) for CSV lines appended after state['offset'].
+
+        The offset advances line by line. A trailing line without a newline
+        is still being written by the logger, so it is left for the next run.
+        """
+        with open(path, 'rb') as f:
+            header = f.readline()
+            if not header.endswith(b'\n'):
+                return
+            fieldnames = next(csv.reader([header.decode('utf-8')]))
+            
+            state['offset'] = max(state['offset'], len(header))
+            f.seek(state['offset'])
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                state['offset'] += len(line)
+                text = line.decode('utf-8', errors='replace')
+                values = next(csv.reader([text]), None)
+                if values:
+                    yield text, dict(zip(fieldnames, values))
+    
+    def parse_records(self, records, date_str, log_type, state, quarantine):
+        """Parse and validate log records into rows for the staging table.
+
+        Bad lines are written to the quarantine file instead of stopping the
+        sync or printing one message per row.
+        """
+        parse_time = time_parser(date_str)
+        for raw, record in records:
+            try:
+                timestamp = parse_time(record['timestamp'])
+                row = log_type.to_row(timestamp, record['message'])
+            except (KeyError, ValueError, TypeError) as e:
+                quarantine.add(raw, e)
+                continue
+            
+            if state['last_timestamp'] is None or timestamp > state['last_timestamp']:
+                state['last_timestamp'] = timestamp
+            yield row
+    
+    def discover_logs(self, date_str, kind):
+        """Find every log file for a date whose type loads into `kind` ('sensor' or 'security')"""
+        logs = []
+        for path in sorted(self.logs_dir.glob(f"{date_str}_*.csv")):
+            name = path.stem[len(date_str) + 1:]
+            log_type = LOG_TYPES.get(name)
+            if log_type is None:
+                # Unregistered logs are assumed to be numeric sensor readings
+                log_type = LogType('sensor', name)
+            if log_type.kind == kind:
+                logs.append((path, log_type))
+        return logs
+    
+    def sync_file(self, conn, path, date_str, log_type):
+        """Load the lines appended to one log file since its last checkpoint.
+
+        Pipeline: read new lines -> parse/validate -> COPY into staging ->
+        merge. Rows and the new checkpoint are committed in the same
+        transaction, so a failed run leaves the checkpoint where it was.
+        Returns (rows_copied, rows_inserted).
+        """
+        staging_ddl, copy_sql, merge_sql = STAGING_SQL[log_type.kind]
+        quarantine = Quarantine(self.logs_dir / 'quarantine' / f"{path.stem}.rejected.csv")
+        try:
+            with conn.transaction(), conn.cursor() as cursor:
+                state = self.load_checkpoint(cursor, path)
+                if state['offset'] and state['offset'] >= state['size']:
+                    print(f"{path.name} is up to date")
+                    return 0, 0
+                
+                records = self.read_new_records(path, state)
+                rows = self.parse_records(records, date_str, log_type, state, quarantine)
+                copied, synced = self.copy_and_merge(cursor, staging_ddl, copy_sql, merge_sql, rows)
+                self.save_checkpoint(cursor, path, state)
+        finally:
+            quarantine.close()
         
-        print(f"Synced {synced_count} sensor readings for {date_str}")
-        return True
+        if quarantine.count:
+            print(f"{path.name}: {quarantine.count} invalid lines quarantined in {quarantine.path}")
+        if synced and log_type.kind == 'sensor':
+            # Cached chart responses for this sensor-day are now stale
+            mark_changed(log_type.name, datetime.strptime(date_str, '%Y-%m-%d').date())
+        return copied, synced
+    
+    def report(self, label, date_str, copied, synced, started):
+        """Print how many rows were synced and the throughput"""
+        elapsed = time.perf_counter() - started
+        rate = copied / elapsed if elapsed > 0 else 0
+        print(f"Synced {synced} {label} for {date_str} "
+              f"({copied} new rows read in {elapsed:.2f}s, {rate:,.0f} rows/sec)")
+        with self.totals_lock:
+            self.totals['files'] += 1
+            self.totals['copied'] += copied
+            self.totals['synced'] += synced
+    
+    def sync_logs(self, conn, date_str, kind):
+        """Sync every discovered log of one kind for a date, one transaction per file"""
+        total = 0
+        for path, log_type in self.discover_logs(date_str, kind):
+            started = time.perf_counter()
+            copied, synced = self.sync_file(conn, path, date_str, log_type)
+            self.report(f"{log_type.name} rows", date_str, copied, synced, started)
+            observe_sync(log_type.name, copied, synced, time.perf_counter() - started)
+            total += synced
+        return total
+    
+    def sync_sensor_data(self, date_str):
+        """Sync sensor data from CSV to database (returns rows inserted, None if the database is unavailable)"""
+        with self.connection() as conn:
+            if not conn:
+                return None
+            return self.sync_logs(conn, date_str, 'sensor')
     
     def sync_security_events(self, date_str):
-        """Sync security events from CSV to database"""
-        conn = self.get_db_connection()
-        if not conn:
-            return False
-        
-        cursor = conn.cursor()
-        synced_count = 0
-        
-        # Sync alarm status changes
-        alarm_file = self.logs_dir / f"{date_str}_alarm-status.csv"
-        if alarm_file.exists():
-            with open(alarm_file, 'r') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    try:
-                        timestamp = datetime.strptime(f"{date_str} {row['timestamp']}", "%Y-%m-%d %H:%M:%S")
-                        status = row['message']
-                        
-                        # Log state changes as security events
-                        event_type = 'state_change'
-                        if status == 'alert':
-                            event_type = 'alert'
-                        
-                        cursor.execute("""
-                            INSERT INTO security_events (timestamp, event_type, details)
-                            VALUES (%s, %s, %s)
-                            ON CONFLICT DO NOTHING
-                        """, (timestamp, event_type, f"System {status}"))
-                        synced_count += cursor.rowcount
-                    except Exception as e:
-                        print(f"Error syncing security event: {e}")
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        print(f"Synced {synced_count} security events for {date_str}")
-        return True
+        """Sync security events from CSV to database (returns rows inserted, None if the database is unavailable)"""
+        with self.connection() as conn:
+            if not conn:
+                return None
+            return self.sync_logs(conn, date_str, 'security')
     
     def sync_today(self):
         """Sync today's data"""
@@ -110,47 +343,114 @@ class DataSync:
         self.sync_sensor_data(today)
         self.sync_security_events(today)
     
-    def sync_date_range(self, start_date, end_date):
-        """Sync data for a date range"""
-        from datetime import timedelta
-        
+    def sync_date_range(self, start_date, end_date, jobs=1):
+        """Sync data for a date range.
+
+        Each (day, file type) pair is an independent task. Up to `jobs` tasks
+        run at once, sharing a pool of `jobs` connections, so a backfill is
+        no longer serial or dominated by connection setup.
+        Returns {date_str: {task: rows inserted or error message}}.
+        """
         start = datetime.strptime(start_date, "%Y-%m-%d")
         end = datetime.strptime(end_date, "%Y-%m-%d")
         
+        dates = []
         current = start
         while current <= end:
-            date_str = current.strftime("%Y-%m-%d")
-            print(f"\nSyncing data for {date_str}...")
-            self.sync_sensor_data(date_str)
-            self.sync_security_events(date_str)
+            dates.append(current.strftime("%Y-%m-%d"))
             current += timedelta(days=1)
+        
+        tasks = {'sensor': self.sync_sensor_data, 'security': self.sync_security_events}
+        results = {date_str: {} for date_str in dates}
+        total = len(dates) * len(tasks)
+        started = time.perf_counter()
+        
+        self.open_pool(max(1, jobs))
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix='sync') as executor:
+                futures = {
+                    executor.submit(sync, date_str): (date_str, name)
+                    for date_str in dates
+                    for name, sync in tasks.items()
+                }
+                for done, future in enumerate(as_completed(futures), start=1):
+                    date_str, name = futures[future]
+                    try:
+                        synced = future.result()
+                        results[date_str][name] = synced if synced is not None else 'database unavailable'
+                    except Exception as e:
+                        results[date_str][name] = f"{type(e).__name__}: {e}"
+                    print(f"[{done}/{total}] {date_str} {name} done")
+        finally:
+            self.close_pool()
+        
+        self.print_summary(results, time.perf_counter() - started)
+        return results
+    
+    def print_summary(self, results, elapsed):
+        """Print a per-day success/failure report and overall throughput"""
+        print("\n=== SYNC SUMMARY ===")
+        failed_days = 0
+        for date_str, outcome in sorted(results.items()):
+            failures = {name: value for name, value in outcome.items() if not isinstance(value, int)}
+            if failures:
+                failed_days += 1
+                details = ', '.join(f"{name}: {error}" for name, error in failures.items())
+                print(f"✗ {date_str}  {details}")
+            else:
+                details = ', '.join(f"{name} {value}" for name, value in outcome.items())
+                print(f"✓ {date_str}  {details}")
+        
+        rate = self.totals['copied'] / elapsed if elapsed > 0 else 0
+        print(f"\n{len(results) - failed_days}/{len(results)} days synced, "
+              f"{self.totals['synced']} rows inserted from {self.totals['copied']} rows read "
+              f"in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+
+def push_metrics():
+    """Send this run's samples to METRICS_PUSHGATEWAY, if set"""
+    gateway = os.getenv('METRICS_PUSHGATEWAY')
+    try:
+        if push_sync(gateway):
+            print(f"Pushed sync metrics to {gateway}")
+    except Exception as e:
+        # The data is synced either way; a missing gateway must not fail the run
+        print(f"✗ Could not push sync metrics to {gateway}: {e}")
 
 def main():
     """Main function"""
-    import sys
+    parser = argparse.ArgumentParser(
+        description="Sync local CSV log files to the cloud database",
+        epilog=(
+            "examples:\n"
+            "  python sync_data.py                                # Sync today's data\n"
+            "  python sync_data.py 2025-12-01                     # Sync specific date\n"
+            "  python sync_data.py 2025-12-01 2025-12-07          # Sync date range\n"
+            "  python sync_data.py 2025-11-01 2025-11-30 --jobs 8 # Parallel backfill"
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('start_date', nargs='?', help="date to sync (YYYY-MM-DD), or start of a range")
+    parser.add_argument('end_date', nargs='?', help="end of the range (inclusive)")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="number of files synced concurrently (default: 1)")
+    args = parser.parse_args()
     
     sync = DataSync()
     
-    if len(sys.argv) == 1:
-        # No arguments - sync today
-        sync.sync_today()
-    elif len(sys.argv) == 2:
-        # Single date argument
-        date = sys.argv[1]
-        print(f"Syncing data for {date}...")
-        sync.sync_sensor_data(date)
-        sync.sync_security_events(date)
-    elif len(sys.argv) == 3:
-        # Date range
-        start_date = sys.argv[1]
-        end_date = sys.argv[2]
-        print(f"Syncing data from {start_date} to {end_date}...")
-        sync.sync_date_range(start_date, end_date)
-    else:
-        print("Usage:")
-        print("  python sync_data.py                    # Sync today's data")
-        print("  python sync_data.py 2025-12-01         # Sync specific date")
-        print("  python sync_data.py 2025-12-01 2025-12-07  # Sync date range")
+    try:
+        if not args.start_date:
+            # No arguments - sync today
+            sync.sync_today()
+            return 0
+        
+        end_date = args.end_date or args.start_date
+        print(f"Syncing data from {args.start_date} to {end_date} with {args.jobs} job(s)...")
+        results = sync.sync_date_range(args.start_date, end_date, jobs=args.jobs)
+        
+        all_ok = all(isinstance(value, int) for outcome in results.values() for value in outcome.values())
+        return 0 if all_ok else 1
+    finally:
+        push_metrics()
 
 if __name__ == '__main__':
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,102 @@
+"""
+Shared test setup
+Points the app's host-level state at a temporary directory before app.py is
+imported, and provides a stand-in database for route tests
+"""
+
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import pytest
+
+STATE_DIR = tempfile.mkdtemp(prefix='iot-tests-')
+
+os.environ.update({
+    'COMMAND_STATE_DIR': os.path.join(STATE_DIR, 'commands'),
+    'ALERT_LOCK_PATH': os.path.join(STATE_DIR, 'alert-engine.lock'),
+    'RESPONSE_CACHE_MARKER_DIR': os.path.join(STATE_DIR, 'markers'),
+    'RESPONSE_CACHE_CHANGE_POLL': '0',
+    'HOT_TIER_HOURS': '0',
+    'ALERT_RULES': '[]',
+    'LOG_LEVEL': 'WARNING',
+    'MQTT_USERNAME': 'tests'
+})
+os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+
+class FakeCursor:
+    """Records statements and answers fetches from a list of scripted results"""
+
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None):
+        self.db.executed.append((' '.join(query.split()), params))
+
+    def fetchall(self):
+        return self.db.results.pop(0) if self.db.results else []
+
+    def fetchone(self):
+        rows = self.fetchall()
+        return rows[0] if rows else None
+
+    def close(self):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.executed = []  # (whitespace-collapsed query, params)
+        self.results = []   # one list of rows per fetch
+
+    def cursor(self, row_factory=None):
+        return FakeCursor(self)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Serve app.get_db_connection() from a FakeDatabase with an empty response cache"""
+    import app
+    from response_cache import ResponseCache
+
+    db = FakeDatabase()
+
+    @contextmanager
+    def get_db_connection():
+        yield db
+
+    monkeypatch.setattr(app, 'get_db_connection', get_db_connection)
+    monkeypatch.setattr(app, 'response_cache', ResponseCache(
+        1024 * 1024, marker_dir=os.environ['RESPONSE_CACHE_MARKER_DIR']
+    ))
+    return db
+
+
+@pytest.fixture
+def pg_conn():
+    """Autocommit connection to TEST_DATABASE_URL with schema.sql loaded into a throwaway schema"""
+    url = os.environ.get('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    import psycopg
+
+    schema = f'iot_test_{os.getpid()}_{time.time_ns()}'
+    conn = psycopg.connect(url, autocommit=True)
+    try:
+        conn.execute(f'CREATE SCHEMA {schema}')
+        conn.execute(f'SET search_path TO {schema}')
+        with open(os.path.join(os.path.dirname(__file__), '..', 'schema.sql')) as f:
+            conn.execute(f.read())
+        yield conn
+    finally:
+        conn.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        conn.close()
@@ -0,0 +1,175 @@
+"""Shared rate budget, circuit breaker and retry policy of the Adafruit IO client"""
+
+import pytest
+import requests
+
+import adafruit_client
+from adafruit_client import AdafruitClient, CircuitBreaker, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(adafruit_client.time, 'monotonic', clock)
+    return clock
+
+
+def test_bucket_spends_its_burst_then_reports_the_wait(tmp_path):
+    bucket = TokenBucket(rate_per_minute=1, burst=2, path=str(tmp_path / 'io.bucket'))
+
+    assert bucket.take() == 0.0
+    assert bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(60.0, abs=0.5)
+    assert not bucket.acquire(max_wait=0.01)
+
+
+def test_bucket_state_is_shared_through_its_file(tmp_path):
+    path = str(tmp_path / 'io.bucket')
+    first = TokenBucket(rate_per_minute=1, burst=2, path=path)
+    second = TokenBucket(rate_per_minute=1, burst=2, path=path)
+
+    assert first.take() == 0.0
+    assert first.take() == 0.0
+    assert second.take() > 0.0
+
+
+def test_pause_blocks_every_bucket_on_the_host(tmp_path):
+    path = str(tmp_path / 'io.bucket')
+    TokenBucket(rate_per_minute=600, burst=10, path=path).pause(30)
+    bucket = TokenBucket(rate_per_minute=600, burst=10, path=path)
+
+    assert bucket.take() == pytest.approx(30.0, abs=0.5)
+    assert bucket.available() < 1
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == 'closed' and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+
+def test_half_open_breaker_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    assert not breaker.allow()
+
+    breaker.release()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+
+class Response:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def json(self):
+        return self.body
+
+
+class Session:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs.get('json')))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def make_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(adafruit_client.time, 'sleep', lambda seconds: None)
+
+    def make_client(*outcomes, **options):
+        client = AdafruitClient('tests', 'key', bucket_path=str(tmp_path / 'io.bucket'), **options)
+        client.session = Session(*outcomes)
+        return client
+
+    return make_client
+
+
+def test_reads_are_retried_on_transient_failures(make_client):
+    client = make_client(
+        requests.ConnectionError('reset'),
+        Response(503),
+        Response(200, {'value': '21.5'})
+    )
+
+    assert client.get_last('temperature') == {'value': '21.5'}
+    assert len(client.session.calls) == 3
+    assert client.stats()['retries'] == 2
+
+
+def test_reads_give_up_on_client_errors(make_client):
+    client = make_client(Response(404))
+
+    assert client.get_last('missing') is None
+    assert len(client.session.calls) == 1
+
+
+def test_writes_are_never_retried(make_client):
+    client = make_client(Response(503))
+
+    assert client.send('light', 'ON') is False
+    assert client.session.calls == [('POST', 'https://io.adafruit.com/api/v2/tests/feeds/light/data', {'value': 'ON'})]
+
+
+def test_throttling_pauses_the_budget(make_client):
+    client = make_client(Response(429, headers={'Retry-After': '120'}))
+
+    assert client.get_last('temperature') is None
+    assert client.bucket.take() == pytest.approx(120.0, abs=0.5)
+    assert client.stats()['circuit'] == 'closed'
+
+
+def test_open_circuit_rejects_without_calling_upstream(make_client):
+    client = make_client(Response(500), breaker_threshold=1, retries=0)
+
+    assert client.get_last('temperature') is None
+    assert client.send('light', 'ON') is False
+    stats = client.stats()
+    assert stats['circuit'] == 'open'
+    assert stats['circuit_rejected'] == 1
+    assert len(client.session.calls) == 1
@@ -0,0 +1,179 @@
+"""Alert rules, their rolling windows and the follower that feeds them"""
+
+import statistics
+from datetime import datetime, timedelta
+
+import pytest
+
+from alert_engine import (
+    DEFAULT_RULES,
+    AlertEngine,
+    AlertFollower,
+    RateRule,
+    RollingWindow,
+    ThresholdRule,
+    ZScoreRule,
+    build_rules,
+)
+
+START = datetime(2025, 12, 1, 8, 0)
+
+
+def fire(rule, readings):
+    """Seconds at which `rule` fires over (seconds, value) readings"""
+    return [ts for ts, value in readings if rule.check(ts, value) is not None]
+
+
+def test_window_statistics_follow_expiry():
+    window = RollingWindow(10)
+    values = [1e6 + value for value in (1.0, 2.0, 4.0, 8.0)]
+    for ts, value in enumerate(values):
+        window.append(ts * 5, value)
+
+    assert window.mean() == pytest.approx(statistics.mean(values))
+    assert window.std() == pytest.approx(statistics.stdev(values))
+
+    window.expire(17)
+    assert [value for _, value in window.points] == values[2:]
+    assert window.std() == pytest.approx(statistics.stdev(values[2:]))
+
+    window.expire(100)
+    assert len(window) == 0
+    window.append(100, 3.0)
+    assert window.mean() == 3.0 and window.std() == 0.0
+
+
+def test_threshold_waits_for_the_duration_and_fires_once():
+    rule = ThresholdRule('hot', 'temperature', above=35, duration=60, cooldown=0)
+    readings = [(0, 36), (30, 37), (60, 36), (90, 38), (120, 30), (130, 36), (190, 36)]
+
+    assert fire(rule, readings) == [60, 190]
+    assert rule.check(200, 36.5) is None and rule.active
+
+
+def test_threshold_below_describes_the_breach():
+    rule = ThresholdRule('cold', 'temperature', below=5)
+    assert rule.check(0, 4.5) == 'temperature 4.5 below 5 for 0s'
+
+
+def test_threshold_needs_a_bound():
+    with pytest.raises(ValueError):
+        ThresholdRule('nothing', 'temperature')
+
+
+def test_cooldown_suppresses_a_returning_condition():
+    rule = ThresholdRule('hot', 'temperature', above=35, cooldown=300)
+    readings = [(0, 40), (10, 30), (100, 40), (110, 30), (400, 40)]
+
+    assert fire(rule, readings) == [0, 400]
+
+
+def test_rate_compares_with_the_oldest_reading_in_the_window():
+    rule = RateRule('jump', 'temperature', limit=5, per=300, cooldown=0)
+    readings = [(0, 20), (100, 23), (200, 25.5), (290, 25.9), (350, 26)]
+
+    assert fire(rule, readings) == [200]
+    assert not rule.active
+
+
+def test_rate_reports_the_direction():
+    rule = RateRule('drop', 'temperature', limit=5, per=300)
+    rule.check(0, 25)
+    assert rule.check(60, 18) == 'temperature fell 7.00 to 18 in 60s (limit 5 per 300s)'
+
+
+def test_zscore_needs_enough_samples_and_scores_against_the_past():
+    rule = ZScoreRule('odd', 'humidity', limit=4, window=900, min_samples=30, cooldown=0)
+    steady = [(ts, 45 + (ts % 3) * 0.1) for ts in range(0, 290, 10)]
+
+    assert fire(rule, steady + [(290, 90)]) == []
+    rule.reset()
+    assert fire(rule, steady + [(290, 45.1), (300, 90)]) == [300]
+
+
+def test_build_rules_from_specs():
+    rules = build_rules(DEFAULT_RULES)
+
+    assert [rule.kind for rule in rules] == ['threshold', 'threshold', 'rate', 'zscore', 'threshold', 'zscore']
+    assert rules[0].duration == 60
+    assert build_rules([{'sensor': 'humidity', 'kind': 'rate', 'limit': 10}])[0].name == 'humidity-rate'
+    with pytest.raises(ValueError, match='unknown rule kind'):
+        build_rules([{'sensor': 'humidity', 'kind': 'median'}])
+
+
+def test_horizon_covers_the_longest_rule():
+    assert AlertEngine(build_rules(DEFAULT_RULES), print).horizon() == 900
+    assert AlertEngine([], print).horizon() == 0
+
+
+def test_engine_fires_in_time_order_and_skips_old_readings():
+    alerts = []
+    engine = AlertEngine([ThresholdRule('hot', 'temperature', above=35)], alerts.append)
+    rows = [
+        (START + timedelta(seconds=10), 'temperature', 40, 'C'),
+        (START, 'temperature', 20, 'C'),
+        (START, 'humidity', 99, '%')
+    ]
+
+    assert engine.evaluate(rows) == alerts
+    assert [alert['timestamp'] for alert in alerts] == [(START + timedelta(seconds=10)).isoformat()]
+    assert alerts[0]['details'].startswith('hot: temperature 40 above 35')
+
+    engine.evaluate([(START + timedelta(seconds=5), 'temperature', 50, 'C')])
+    stats = engine.stats()
+    assert stats['evaluated'] == 2 and stats['out_of_order'] == 1
+    assert stats['active'] == ['hot'] and len(stats['recent']) == 1
+
+
+def test_notification_errors_are_counted():
+    def broken(alert):
+        raise RuntimeError('audit unavailable')
+
+    engine = AlertEngine([ThresholdRule('hot', 'temperature', above=35)], broken)
+    assert len(engine.evaluate([(START, 'temperature', 40, 'C')])) == 1
+    assert engine.stats()['notify_errors'] == 1
+
+
+class Readings:
+    """sensor_data stand-in with the HotStore loader contract"""
+
+    def __init__(self, rows):
+        self.rows = rows  # (id, timestamp, sensor_type, value)
+        self.load_calls = []
+
+    def load_window(self, since, after, limit):
+        rows = sorted((row for row in self.rows if row[1] >= since), key=lambda row: (row[1], row[0]))
+        if after:
+            rows = [row for row in rows if (row[1], row[0]) > after]
+        return rows[:limit]
+
+    def load(self, after_id, since, limit):
+        self.load_calls.append(after_id)
+        return sorted(row for row in self.rows if row[0] > after_id and row[1] >= since)[:limit]
+
+
+def test_follower_rebuilds_the_windows_then_follows_new_ids(tmp_path):
+    now = datetime.now().replace(microsecond=0)
+    alerts = []
+    engine = AlertEngine([RateRule('jump', 'temperature', limit=5, per=300)], alerts.append)
+    source = Readings([(i, now - timedelta(seconds=100 - i * 10), 'temperature', 20.0) for i in range(1, 6)])
+    follower = AlertFollower(engine, source.load, source.load_window, str(tmp_path / 'lock'),
+                             batch_size=2, id_overlap=3)
+
+    follower.catch_up()
+    assert follower.last_id == 5
+    assert engine.stats()['evaluated'] == 5 and alerts == []
+
+    source.rows.append((6, now, 'temperature', 30.0))
+    follower.catch_up()
+    assert source.load_calls[0] == 2
+    assert follower.last_id == 6
+    assert [alert['rule'] for alert in alerts] == ['jump']
+    stats = follower.stats()
+    assert stats['rows_followed'] == 5 + 4 and engine.stats()['out_of_order'] == 3
+
+
+def test_follower_without_rules_never_starts(tmp_path):
+    follower = AlertFollower(AlertEngine([], print), None, None, str(tmp_path / 'lock'))
+    follower.start()
+    assert follower._thread is None
@@ -0,0 +1,141 @@
+"""Async serving mode: the event-loop routes and the Flask fallback mount"""
+
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('a2wsgi')
+
+from starlette.testclient import TestClient  # noqa: E402
+
+import app  # noqa: E402
+import asgi  # noqa: E402
+from app import FeedCache  # noqa: E402
+
+
+class AsyncCursor:
+    def __init__(self, db):
+        self.db = db
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, query, params=None):
+        self.db.executed.append((' '.join(query.split()), params))
+
+    async def fetchall(self):
+        return self.db.results.pop(0) if self.db.results else []
+
+
+class AsyncPool:
+    """AsyncConnectionPool stand-in whose connections share the FakeDatabase script"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def getconn(self):
+        return self
+
+    async def putconn(self, conn):
+        pass
+
+    def cursor(self, row_factory=None):
+        return AsyncCursor(self.db)
+
+
+class Feeds:
+    def __init__(self, values):
+        self.values = values
+
+    async def get_last(self, feed_key):
+        return self.values.get(feed_key)
+
+
+@pytest.fixture
+def client(fake_db, monkeypatch):
+    """TestClient without the lifespan: the pool and Adafruit client are fakes"""
+    monkeypatch.setattr(asgi, 'response_cache', app.response_cache)
+    monkeypatch.setattr(asgi, 'feed_cache', FeedCache(None, default_ttl=0))
+    monkeypatch.setattr(asgi.app.state, 'db_pool', AsyncPool(fake_db), raising=False)
+    monkeypatch.setattr(asgi.app.state, 'adafruit', Feeds({}), raising=False)
+    return TestClient(asgi.app)
+
+
+def test_intrusions_rejects_bad_parameters_before_querying(client, fake_db):
+    response = client.get('/api/intrusions?date=2025-12-01&limit=ten')
+
+    assert response.status_code == 400
+    assert response.json()['error'] == 'limit must be an integer'
+    assert client.get('/api/intrusions').status_code == 400
+    assert fake_db.executed == []
+
+
+def test_intrusions_pages_match_the_flask_route(client, fake_db):
+    rows = [
+        {'id': 9, 'timestamp': datetime(2025, 12, 1, 22, 0), 'event_type': 'intrusion', 'details': 'door'},
+        {'id': 4, 'timestamp': datetime(2025, 12, 1, 21, 0), 'event_type': 'alert', 'details': None}
+    ]
+    fake_db.results = [list(rows)]
+
+    body = client.get('/api/intrusions?date=2025-12-01&limit=1').json()
+
+    assert body == app.format_intrusions_page(rows, 1)
+    assert [event['id'] for event in body['data']] == [9]
+    assert body['has_more'] and body['next_cursor']
+    (query, params), = fake_db.executed
+    assert params[-1] == 2
+
+
+def test_series_are_cached_and_revalidated(client, fake_db):
+    fake_db.results = [[
+        {'timestamp': datetime(2025, 12, 1, 8, 0, 0), 'value': 21.5},
+        {'timestamp': datetime(2025, 12, 1, 8, 0, 5), 'value': 21.75}
+    ]]
+    url = '/api/historical-data?date=2025-12-01&sensor=temperature'
+
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.json()['data'] == {'labels': ['08:00:00', '08:00:05'], 'values': [21.5, 21.75]}
+
+    second = client.get(url)
+    assert second.content == first.content
+    assert len(fake_db.executed) == 1
+
+    revalidated = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b''
+
+
+def test_series_report_a_missing_database(client, monkeypatch):
+    monkeypatch.setattr(asgi.app.state, 'db_pool', None)
+
+    response = client.get('/api/daily-averages?start_date=2025-12-01&end_date=2025-12-02')
+
+    assert response.status_code == 500
+    assert response.json()['error'] == 'Database connection failed'
+
+
+def test_system_status_marks_missing_feeds_partial(client, monkeypatch):
+    monkeypatch.setattr(asgi.app.state, 'adafruit', Feeds({
+        'status': {'value': 'armed'},
+        'temperature': {'value': '21.5'}
+    }))
+
+    body = client.get('/api/system-status').json()
+
+    assert body['partial'] is True
+    assert body['status']['alarm'] == 'armed'
+    assert body['status']['temperature'] == 21.5
+    assert body['status']['humidity'] is None
+
+
+def test_other_routes_fall_through_to_flask(client):
+    response = client.post('/api/control', json={'device': 'toaster', 'action': 'ON'})
+
+    assert response.status_code == 400
+    assert response.json()['error'] == 'Unknown device'
@@ -0,0 +1,75 @@
+"""DataSync.sync_date_range: parallel per-(day, type) backfill"""
+
+import threading
+
+import pytest
+
+import app
+from sync_data import DataSync
+
+
+@pytest.fixture
+def sync(monkeypatch):
+    sync = DataSync()
+    monkeypatch.setattr(sync, 'open_pool', lambda size: setattr(sync, 'pool_size', size))
+    monkeypatch.setattr(sync, 'close_pool', lambda: setattr(sync, 'closed', True))
+    return sync
+
+
+def test_every_day_and_type_is_a_task(sync):
+    calls = []
+    sync.sync_sensor_data = lambda date_str: calls.append(('sensor', date_str)) or 3
+    sync.sync_security_events = lambda date_str: calls.append(('security', date_str)) or 1
+
+    results = sync.sync_date_range('2025-11-29', '2025-12-01', jobs=4)
+
+    assert sorted(calls) == sorted(
+        (name, day) for name in ('sensor', 'security') for day in ('2025-11-29', '2025-11-30', '2025-12-01')
+    )
+    assert results['2025-11-30'] == {'sensor': 3, 'security': 1}
+    assert sync.pool_size == 4 and sync.closed
+
+
+def test_tasks_run_concurrently(sync):
+    barrier = threading.Barrier(4, timeout=5)
+
+    def task(date_str):
+        barrier.wait()
+        return 0
+
+    sync.sync_sensor_data = sync.sync_security_events = task
+    results = sync.sync_date_range('2025-12-01', '2025-12-02', jobs=4)
+
+    assert all(value == 0 for outcome in results.values() for value in outcome.values())
+
+
+def test_one_failing_day_does_not_stop_the_others(sync):
+    def sensor(date_str):
+        if date_str == '2025-12-02':
+            raise ValueError('bad file')
+        return 5
+
+    sync.sync_sensor_data = sensor
+    sync.sync_security_events = lambda date_str: None
+
+    results = sync.sync_date_range('2025-12-01', '2025-12-03', jobs=2)
+
+    assert results['2025-12-01']['sensor'] == 5
+    assert results['2025-12-02']['sensor'] == 'ValueError: bad file'
+    assert results['2025-12-03']['security'] == 'database unavailable'
+    assert sync.closed
+
+
+@pytest.mark.parametrize('name', ['max_points', 'resolution', 'limit'])
+def test_integer_parameters_name_themselves_when_malformed(name):
+    with pytest.raises(ValueError, match=f'^{name} must be an integer$'):
+        app.int_arg({name: '1.5'}, name)
+    assert app.int_arg({name: ' '}, name, 7) == 7
+    assert app.int_arg({name: '12'}, name) == 12
+
+
+def test_intrusions_limit_error_names_the_parameter():
+    response = app.app.test_client().get('/api/intrusions?date=2025-12-01&limit=ten')
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'limit must be an integer'
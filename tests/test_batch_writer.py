@@ -0,0 +1,171 @@
+"""BatchWriter flushing, retries and listeners, and the audit rows it writes"""
+
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+from psycopg.errors import InvalidColumnReference
+
+import app
+from batch_writer import BatchWriter
+
+
+class Sink:
+    """write_batch stand-in that can fail a number of times first"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+        self.written = threading.Event()
+
+    def __call__(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('database unavailable')
+        self.batches.append(list(rows))
+        self.written.set()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_full_batches_flush_without_waiting_for_the_interval():
+    sink = Sink()
+    writer = BatchWriter('test', sink, flush_rows=3, flush_interval=60)
+    writer.offer([1, 2])
+    writer.offer([3, 4, 5, 6, 7])
+
+    assert wait_for(lambda: sum(map(len, sink.batches)) >= 6)
+    assert sink.batches[:2] == [[1, 2, 3], [4, 5, 6]]
+    writer.close()
+    assert sum(sink.batches, []) == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_partial_batches_flush_after_the_interval():
+    sink = Sink()
+    writer = BatchWriter('test', sink, flush_rows=100, flush_interval=0.05)
+    writer.offer(['a'])
+
+    assert sink.written.wait(5)
+    assert sink.batches == [['a']]
+    writer.close()
+
+
+def test_offer_refuses_rows_beyond_capacity():
+    release = threading.Event()
+    writer = BatchWriter('test', lambda rows: release.wait(5), max_rows=4, flush_rows=100, flush_interval=60)
+    try:
+        assert writer.offer([1, 2, 3])
+        assert not writer.offer([4, 5])
+        assert writer.offer([4])
+        assert writer.stats()['rejected'] == 2
+        assert writer.stats()['depth'] == 4
+    finally:
+        release.set()
+        writer.close()
+
+
+def test_failed_batches_are_retried_in_order():
+    sink = Sink(failures=2)
+    writer = BatchWriter('test', sink, flush_rows=2, flush_interval=0.01)
+    writer.offer([1, 2, 3])
+
+    assert wait_for(lambda: sum(map(len, sink.batches)) == 3)
+    writer.close()
+    assert sum(sink.batches, []) == [1, 2, 3]
+    stats = writer.stats()
+    assert stats['flush_errors'] == 2 and stats['written'] == 3 and stats['dropped'] == 0
+
+
+def test_listeners_see_written_rows_only():
+    sink = Sink(failures=1)
+    seen = []
+    writer = BatchWriter('test', sink, flush_rows=1, flush_interval=0.01)
+
+    def broken(rows):
+        raise RuntimeError('listener bug')
+
+    writer.add_listener(broken)
+    writer.add_listener(seen.append)
+    writer.offer(['row'])
+
+    assert wait_for(lambda: seen == [['row']])
+    writer.close()
+    assert seen == [['row']]
+
+
+def test_close_gives_up_when_the_database_stays_down():
+    writer = BatchWriter('test', Sink(failures=10**6), flush_rows=100, flush_interval=0.01)
+    writer.offer([1, 2, 3])
+    writer.close(timeout=5)
+
+    assert writer.stats()['dropped'] == 3
+    assert not writer.offer([4])
+
+
+class AuditCursor:
+    def __init__(self, key_exists=True):
+        self.key_exists = key_exists
+        self.connection = self
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def transaction(self):
+        return nullcontext()
+
+    def cursor(self):
+        return self
+
+    def executemany(self, query, rows):
+        if 'ON CONFLICT' in query and not self.key_exists:
+            raise InvalidColumnReference('no unique or exclusion constraint matching the ON CONFLICT specification')
+        self.statements.append((' '.join(query.split()), list(rows)))
+
+
+def test_audit_rows_are_grouped_per_table(monkeypatch):
+    db = AuditCursor()
+    monkeypatch.setattr(app, 'get_db_connection', lambda: nullcontext(db))
+    now = datetime(2025, 12, 1, 8, 0)
+
+    app.write_audit_rows([
+        ('device_logs', (now, 'light', 'ON', 'sent')),
+        ('security_events', (now, 'alert', 'temperature too high')),
+        ('device_logs', (now, 'buzzer', 'OFF', 'superseded'))
+    ])
+
+    tables = [query.split()[2] for query, _ in db.statements]
+    assert tables == ['device_logs', 'security_events']
+    assert len(db.statements[0][1]) == 2
+    assert 'ON CONFLICT (timestamp, event_type, md5(COALESCE(details, \'\'))) DO NOTHING' in db.statements[1][0]
+
+
+def test_security_events_fall_back_to_plain_inserts_without_the_key(monkeypatch):
+    monkeypatch.setattr(app, '_security_events_key_missing', False)
+    cursor = AuditCursor(key_exists=False)
+    rows = [(datetime(2025, 12, 1), 'alert', None)]
+
+    app.insert_security_events(cursor, rows)
+    app.insert_security_events(cursor, rows)
+
+    assert app._security_events_key_missing
+    assert [('ON CONFLICT' in query, written) for query, written in cursor.statements] == [(False, rows), (False, rows)]
+
+
+def test_device_commands_log_every_final_status(monkeypatch):
+    offered = []
+    monkeypatch.setattr(app, 'audit_writer', type('Writer', (), {'offer': lambda self, rows: offered.extend(rows) or True})())
+
+    for status in ('delivered', 'failed', 'superseded'):
+        app.record_device_command('light', 'ON', status)
+
+    assert [values[3] for _, values in offered] == ['sent', 'failed', 'superseded']
@@ -0,0 +1,84 @@
+"""Benchmark scenarios, percentiles and the regression check"""
+
+import random
+from datetime import date
+
+import pytest
+
+import app
+import benchmark
+from ingest import parse_readings
+
+FIRST_DAY, LAST_DAY = date(2025, 11, 1), date(2025, 11, 30)
+
+
+@pytest.fixture
+def scenarios():
+    return benchmark.build_scenarios(FIRST_DAY, LAST_DAY)
+
+
+def requests_for(scenarios, name, count=50):
+    rng = random.Random(7)
+    return [scenarios[name](rng) for _ in range(count)]
+
+
+def test_chart_scenarios_only_ask_for_sensors_the_api_serves(scenarios):
+    assert set(benchmark.CHART_SENSORS) <= set(app.SENSOR_TYPES)
+    for name in ('historical-data', 'historical-data-binary', 'daily-averages', 'export'):
+        for method, path, kwargs in requests_for(scenarios, name):
+            assert kwargs['params']['sensor'] in app.SENSOR_TYPES
+
+
+def test_dates_stay_inside_the_seeded_range(scenarios):
+    for _, _, kwargs in requests_for(scenarios, 'historical-data'):
+        assert FIRST_DAY <= date.fromisoformat(kwargs['params']['date']) <= LAST_DAY
+    for _, _, kwargs in requests_for(scenarios, 'daily-averages'):
+        start, end = (date.fromisoformat(kwargs['params'][key]) for key in ('start_date', 'end_date'))
+        assert FIRST_DAY <= start <= end <= LAST_DAY
+        assert (end - start).days <= 6
+
+
+def test_ingest_batches_are_accepted_by_the_api(scenarios):
+    (method, path, kwargs), = requests_for(scenarios, 'ingest', count=1)
+
+    rows, errors = parse_readings(kwargs['json'])
+    assert errors == []
+    assert len(rows) == 100
+
+
+def test_multi_request_scenarios_return_flows(scenarios):
+    assert callable(requests_for(scenarios, 'control-roundtrip', count=1)[0])
+    assert callable(requests_for(scenarios, 'live-stream', count=1)[0])
+
+
+def test_scenario_routes_exist():
+    routes = {rule.rule for rule in app.app.url_map.iter_rules()}
+    for name, make_request in benchmark.build_scenarios(FIRST_DAY, LAST_DAY).items():
+        flow = make_request(random.Random(1))
+        if not callable(flow):
+            assert app.app.url_map.bind('localhost').test(flow[1], flow[0]), name
+    assert '/api/live-stream' in routes and '/api/control/commands/<command_id>' in routes
+
+
+@pytest.mark.parametrize('fraction, expected', [(0.5, 5), (0.3, 3), (0.25, 3), (0.99, 10), (0.0, 1), (1.0, 10)])
+def test_nearest_rank_percentile(fraction, expected):
+    assert benchmark.percentile(list(range(1, 11)), fraction) == expected
+
+
+def test_percentile_of_nothing():
+    assert benchmark.percentile([], 0.5) is None
+
+
+def run(p99, rps, sync_rate=None):
+    result = {'run': {'id': 'baseline'}, 'routes': {'live-data': {'p99_ms': p99, 'throughput_rps': rps}}}
+    if sync_rate is not None:
+        result['sync'] = {'rows_per_second': sync_rate}
+    return result
+
+
+def test_compare_flags_latency_and_throughput_regressions(capsys):
+    assert benchmark.compare(run(100, 50), run(100, 50), 0.1) == []
+    assert benchmark.compare(run(120, 50), run(100, 50), 0.1) == ['live-data']
+    assert benchmark.compare(run(100, 40), run(100, 50), 0.1) == ['live-data']
+    assert benchmark.compare(run(100, 50, sync_rate=800), run(100, 50, sync_rate=1000), 0.1) == ['sync']
+    assert 'regression' in capsys.readouterr().out
@@ -0,0 +1,160 @@
+"""Per-feed debounce, supersede and ordered delivery of device commands"""
+
+import threading
+import time
+
+import pytest
+
+import app
+from command_queue import CommandQueue
+
+
+class Device:
+    """send() stand-in that records deliveries and can be held open"""
+
+    def __init__(self, result=True):
+        self.result = result
+        self.sent = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, feed_key, value):
+        self.gate.wait(5)
+        self.sent.append((feed_key, value))
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def wait_for(condition, timeout=5):
+    """on_done callbacks run just after waiters are woken, so poll for them"""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues = []
+
+    def make_queue(send, **options):
+        options.setdefault('debounce', 0.05)
+        options.setdefault('max_delay', 1.0)
+        queue = CommandQueue(send, state_dir=str(tmp_path / 'commands'), **options)
+        queues.append(queue)
+        return queue
+
+    yield make_queue
+    for queue in queues:
+        queue.close()
+
+
+def test_a_burst_collapses_to_the_last_value(make_queue):
+    device = Device()
+    done = []
+    queue = make_queue(device)
+
+    first = queue.submit('light', 'ON', on_done=done.append)
+    second = queue.submit('light', 'OFF', on_done=done.append)
+    last = queue.submit('light', 'ON', on_done=done.append)
+
+    assert queue.wait(last['id'], 5)['status'] == 'delivered'
+    assert device.sent == [('light', 'ON')]
+    assert queue.get(first['id'])['superseded_by'] == second['id']
+    assert queue.get(second['id'])['superseded_by'] == last['id']
+    assert wait_for(lambda: len(done) == 3)
+    assert [command['status'] for command in done] == ['superseded', 'superseded', 'delivered']
+    assert queue.stats()['superseded'] == 2
+
+
+def test_feeds_are_debounced_independently(make_queue):
+    device = Device()
+    queue = make_queue(device)
+
+    light = queue.submit('light', 'ON')
+    buzzer = queue.submit('buzzer', 'OFF')
+
+    assert queue.wait(light['id'], 5)['status'] == 'delivered'
+    assert queue.wait(buzzer['id'], 5)['status'] == 'delivered'
+    assert sorted(device.sent) == [('buzzer', 'OFF'), ('light', 'ON')]
+
+
+def test_max_delay_bounds_a_continuous_burst(make_queue):
+    device = Device()
+    queue = make_queue(device, debounce=0.2, max_delay=0.3)
+
+    started = time.monotonic()
+    command = queue.submit('light', 'ON')
+    while queue.get(command['id'])['status'] == 'queued' and time.monotonic() - started < 5:
+        command = queue.submit('light', 'ON' if command['value'] == 'OFF' else 'OFF')
+        time.sleep(0.05)
+
+    assert time.monotonic() - started < 1.0
+    assert len(device.sent) == 1
+
+
+def test_only_one_command_per_feed_is_in_flight(make_queue):
+    device = Device()
+    device.gate.clear()
+    queue = make_queue(device, debounce=0.0)
+
+    first = queue.submit('light', 'ON')
+    assert queue.wait(first['id'], 5, previous='queued')['status'] == 'sending'
+    second = queue.submit('light', 'OFF')
+    time.sleep(0.1)
+    assert queue.get(second['id'])['status'] == 'queued'
+
+    device.gate.set()
+    assert queue.wait(second['id'], 5)['status'] == 'delivered'
+    assert device.sent == [('light', 'ON'), ('light', 'OFF')]
+
+
+def test_send_errors_fail_the_command(make_queue):
+    queue = make_queue(Device(result=ConnectionError('upstream down')))
+
+    command = queue.wait(queue.submit('light', 'ON')['id'], 5)
+    assert command['status'] == 'failed'
+    assert command['error'] == 'upstream down'
+    assert queue.stats()['failed'] == 1
+
+
+def test_other_workers_read_the_state_files(make_queue, tmp_path):
+    queue = make_queue(Device())
+    command = queue.submit('light', 'ON')
+    queue.wait(command['id'], 5)
+
+    other = CommandQueue(Device(), state_dir=str(tmp_path / 'commands'))
+    assert other.get(command['id'])['status'] == 'delivered'
+    assert other.wait(command['id'], 0.1)['status'] == 'delivered'
+    assert other.get('../../etc/passwd') is None
+
+
+def test_security_toggle_is_queued_and_audited(monkeypatch, make_queue):
+    device = Device()
+    queue = make_queue(device)
+    audited, alarms = [], []
+    monkeypatch.setattr(app, 'command_queue', queue)
+    monkeypatch.setattr(app, 'record_device_command', lambda *args: audited.append(args))
+    monkeypatch.setattr(app, 'record_alarm_status', alarms.append)
+    client = app.app.test_client()
+
+    client.post('/api/security-toggle', json={'enabled': False})
+    response = client.post('/api/security-toggle', json={'enabled': True})
+
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body['command']['status'] == 'queued'
+    assert body['status_url'] == f"/api/control/commands/{body['command']['id']}"
+
+    status = client.get(f"{body['status_url']}?wait=5").get_json()
+    assert status['command']['status'] == 'delivered'
+    assert device.sent == [('status', 'armed')]
+    assert wait_for(lambda: len(audited) == 2 and alarms)
+    assert audited == [('security', 'disarmed', 'superseded'), ('security', 'armed', 'delivered')]
+    assert alarms == ['armed']
+
+
+def test_control_rejects_unknown_devices():
+    response = app.app.test_client().post('/api/control', json={'device': 'toaster', 'action': 'ON'})
+    assert response.status_code == 400
@@ -0,0 +1,85 @@
+"""get_db_pool / get_db_connection: one lazily created pool per process"""
+
+import threading
+
+import pytest
+
+import app
+
+
+class FakePool:
+    created = 0
+
+    def __init__(self, conninfo, **kwargs):
+        FakePool.created += 1
+        self.kwargs = kwargs
+        self.borrowed = []
+        self.returned = []
+
+    def getconn(self):
+        conn = object()
+        self.borrowed.append(conn)
+        return conn
+
+    def putconn(self, conn):
+        self.returned.append(conn)
+
+    @staticmethod
+    def check_connection(conn):
+        pass
+
+
+class BrokenPool(FakePool):
+    def getconn(self):
+        raise RuntimeError('connection refused')
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    FakePool.created = 0
+    monkeypatch.setattr(app, 'ConnectionPool', FakePool)
+    monkeypatch.setattr(app, '_db_pool', None)
+    yield FakePool
+    monkeypatch.setattr(app, '_db_pool', None)
+
+
+def test_pool_is_created_once_and_shared_by_threads(fake_pool):
+    pools = []
+    threads = [threading.Thread(target=lambda: pools.append(app.get_db_pool())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fake_pool.created == 1
+    assert all(pool is pools[0] for pool in pools)
+    assert pools[0].kwargs['max_size'] == app.DB_POOL_MAX_SIZE
+
+
+def test_connection_goes_back_to_the_pool_even_when_the_caller_fails(fake_pool):
+    with pytest.raises(ValueError):
+        with app.get_db_connection() as conn:
+            assert conn is not None
+            raise ValueError('query failed')
+
+    pool = app.get_db_pool()
+    assert pool.returned == pool.borrowed == [conn]
+
+
+def test_connection_is_none_when_the_pool_cannot_connect(fake_pool, monkeypatch):
+    monkeypatch.setattr(app, 'ConnectionPool', BrokenPool)
+    with app.get_db_connection() as conn:
+        assert conn is None
+
+
+def test_fork_reset_forgets_the_parent_pool(fake_pool):
+    parent = app.get_db_pool()
+    app._reset_db_pool()
+
+    assert app.get_db_pool() is not parent
+    assert fake_pool.created == 2
+
+
+def test_stats_before_first_use(fake_pool):
+    assert app.get_db_pool_stats()['initialized'] is False
+    assert fake_pool.created == 0
@@ -0,0 +1,98 @@
+"""Server-side downsampling: LTTB, bucket widths and the reduction queries"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import app
+from downsample import bucket_width, lttb
+
+
+def series(values, start=datetime(2025, 12, 1), step=timedelta(seconds=5)):
+    return [{'timestamp': start + i * step, 'value': value} for i, value in enumerate(values)]
+
+
+def test_lttb_keeps_endpoints_and_point_budget():
+    rows = series([i % 7 for i in range(1000)])
+    sampled = lttb(rows, 50)
+
+    assert len(sampled) == 50
+    assert sampled[0] is rows[0] and sampled[-1] is rows[-1]
+    timestamps = [row['timestamp'] for row in sampled]
+    assert timestamps == sorted(timestamps)
+
+
+def test_lttb_keeps_a_lone_spike():
+    values = [20.0] * 500
+    values[321] = 35.0
+    sampled = lttb(series(values), 20)
+
+    assert max(row['value'] for row in sampled) == 35.0
+
+
+@pytest.mark.parametrize('threshold', [0, 2, 10, 11])
+def test_lttb_returns_short_series_unchanged(threshold):
+    rows = series(range(10))
+    assert lttb(rows, threshold) == rows
+
+
+def test_bucket_width_bounds_the_bucket_count():
+    start = datetime(2025, 12, 1)
+    end = start + timedelta(days=1)
+
+    assert bucket_width(start, end, 1000) == timedelta(seconds=87)
+    # A finer resolution than the budget allows is widened
+    assert bucket_width(start, end, 1000, resolution_seconds=10) == timedelta(seconds=87)
+    assert bucket_width(start, end, 1000, resolution_seconds=600) == timedelta(seconds=600)
+    assert bucket_width(start, start + timedelta(seconds=10), 1000) == timedelta(seconds=1)
+
+
+def test_minute_aligned_buckets_use_the_rollups():
+    start = datetime(2025, 12, 1)
+    end = start + timedelta(days=7)
+
+    query, params, width = app.reduction_query('temperature', start, end, 500, method='avg')
+    assert width == timedelta(minutes=21)
+    assert 'FROM sensor_rollups' in query
+    assert 'minute' in params
+
+    assert app.rollup_grain_for(timedelta(hours=2), start) == 'hour'
+    assert app.rollup_grain_for(timedelta(minutes=5), start + timedelta(seconds=30)) is None
+
+
+def test_sub_minute_buckets_read_raw_rows():
+    start = datetime(2025, 12, 1)
+    query, params, width = app.reduction_query('temperature', start, start + timedelta(hours=1), 500, method='minmax')
+
+    assert width == timedelta(seconds=15)
+    assert 'FROM sensor_data' in query and 'sensor_rollups' not in query
+
+
+def test_small_ranges_are_returned_raw(fake_db):
+    rows = series([1, 2, 3])
+    fake_db.results = [rows]
+    cursor = fake_db.cursor()
+
+    result, downsampled = app.fetch_sensor_series(cursor, 'temperature', datetime(2025, 12, 1), datetime(2025, 12, 2), 10)
+
+    assert result == rows and downsampled is None
+    assert len(fake_db.executed) == 1
+
+
+def test_large_ranges_are_reduced_to_max_points(fake_db):
+    # The probe finds more rows than asked for, then min/max candidates come back
+    fake_db.results = [series(range(11)), series([v % 13 for v in range(400)])]
+    cursor = fake_db.cursor()
+
+    result, downsampled = app.fetch_sensor_series(cursor, 'temperature', datetime(2025, 12, 1), datetime(2025, 12, 2), 10)
+
+    assert len(result) == 10
+    assert downsampled == {'method': 'lttb', 'bucket_seconds': 4320, 'points': 10}
+    assert len(fake_db.executed) == 2
+
+
+def test_downsample_args_are_clamped_and_validated():
+    assert app.parse_downsample_args({'max_points': '5'})[0] == 10
+    assert app.parse_downsample_args({'max_points': '999999'})[0] == app.CHART_MAX_POINTS_LIMIT
+    with pytest.raises(ValueError, match='downsample must be one of'):
+        app.parse_downsample_args({'downsample': 'median'})
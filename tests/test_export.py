@@ -0,0 +1,154 @@
+"""Streamed CSV/NDJSON export from a server-side cursor"""
+
+import json
+from contextlib import nullcontext
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+import app
+
+ROWS = [
+    (datetime(2025, 12, 1, 8, 0), 'temperature', Decimal('21.5'), 'C'),
+    (datetime(2025, 12, 1, 8, 0, 5), 'humidity', Decimal('40.25'), '%')
+]
+
+
+class NamedCursor:
+    def __init__(self, conn, name):
+        self.conn = conn
+        self.name = name
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params):
+        self.conn.executed.append((self.name, self.itersize, ' '.join(query.split()), params))
+
+    def __iter__(self):
+        for row in self.conn.rows:
+            if isinstance(row, Exception):
+                raise row
+            yield row
+
+
+class ExportConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def transaction(self):
+        return nullcontext()
+
+    def cursor(self, name=None):
+        return NamedCursor(self, name)
+
+
+def test_export_query_filters_and_orders_by_the_dataset():
+    query, params = app.build_export_query('security_events', datetime(2025, 12, 1), datetime(2025, 12, 2), ['intrusion'])
+
+    assert ' '.join(query.split()) == (
+        'SELECT id, timestamp, event_type, details FROM security_events '
+        'WHERE timestamp >= %s AND timestamp < %s AND event_type = ANY(%s) ORDER BY timestamp, id'
+    )
+    assert params == [datetime(2025, 12, 1), datetime(2025, 12, 2), ['intrusion']]
+
+
+def test_export_query_without_a_filter():
+    query, params = app.build_export_query('sensor_data', datetime(2025, 12, 1), datetime(2025, 12, 2), [])
+
+    assert 'ANY' not in query
+    assert params == [datetime(2025, 12, 1), datetime(2025, 12, 2)]
+
+
+def test_csv_export_streams_from_a_named_cursor():
+    conn = ExportConnection(ROWS)
+    columns = app.EXPORT_DATASETS['sensor_data']['columns']
+
+    body = ''.join(app.stream_export(conn, 'SELECT 1', ['p'], columns, 'csv'))
+
+    assert body.splitlines() == [
+        'timestamp,sensor_type,value,unit',
+        '2025-12-01T08:00:00,temperature,21.5,C',
+        '2025-12-01T08:00:05,humidity,40.25,%'
+    ]
+    assert conn.executed == [('export', app.EXPORT_ITERSIZE, 'SELECT 1', ['p'])]
+
+
+def test_ndjson_export_writes_one_object_per_row():
+    columns = app.EXPORT_DATASETS['sensor_data']['columns']
+
+    lines = ''.join(app.stream_export(ExportConnection(ROWS), 'SELECT 1', [], columns, 'ndjson')).splitlines()
+
+    assert [json.loads(line) for line in lines] == [
+        {'timestamp': '2025-12-01T08:00:00', 'sensor_type': 'temperature', 'value': 21.5, 'unit': 'C'},
+        {'timestamp': '2025-12-01T08:00:05', 'sensor_type': 'humidity', 'value': 40.25, 'unit': '%'}
+    ]
+
+
+def test_export_is_flushed_in_chunks(monkeypatch):
+    monkeypatch.setattr(app, 'EXPORT_CHUNK_BYTES', 40)
+    columns = app.EXPORT_DATASETS['sensor_data']['columns']
+
+    chunks = list(app.stream_export(ExportConnection(ROWS * 3), 'SELECT 1', [], columns, 'csv'))
+
+    assert len(chunks) > 1
+    assert all(chunk for chunk in chunks)
+    assert len(''.join(chunks).splitlines()) == 7
+
+
+def test_a_failing_export_ends_the_body_early():
+    conn = ExportConnection([ROWS[0], RuntimeError('connection lost'), ROWS[1]])
+    columns = app.EXPORT_DATASETS['sensor_data']['columns']
+
+    body = ''.join(app.stream_export(conn, 'SELECT 1', [], columns, 'csv'))
+
+    # Nothing after the failure is sent; the short body is the only signal
+    assert 'humidity' not in body
+
+
+class Pool:
+    def __init__(self, conn):
+        self.conn = conn
+        self.returned = []
+
+    def getconn(self):
+        return self.conn
+
+    def putconn(self, conn):
+        self.returned.append(conn)
+
+
+def test_export_route_returns_its_connection_when_the_stream_closes(monkeypatch):
+    conn = ExportConnection(ROWS)
+    pool = Pool(conn)
+    monkeypatch.setattr(app, 'get_db_pool', lambda: pool)
+
+    response = app.app.test_client().get('/api/export?start_date=2025-12-01&sensor=humidity,%20temperature')
+
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename="sensor_data_2025-12-01_2025-12-01.csv"'
+    assert len(response.get_data(as_text=True).splitlines()) == 3
+    response.close()
+    assert pool.returned == [conn]
+    (_, _, _, params), = conn.executed
+    assert params[2] == ['humidity', 'temperature']
+
+
+@pytest.mark.parametrize('query, error', [
+    ('dataset=users&start_date=2025-12-01', 'dataset must be one of sensor_data, security_events'),
+    ('format=xml&start_date=2025-12-01', 'format must be one of csv, ndjson'),
+    ('', 'start_date parameter required'),
+])
+def test_export_rejects_bad_requests(monkeypatch, query, error):
+    monkeypatch.setattr(app, 'get_db_pool', lambda: pytest.fail('no connection should be taken'))
+
+    response = app.app.test_client().get(f'/api/export?{query}')
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == error
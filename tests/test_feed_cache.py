@@ -0,0 +1,126 @@
+"""FeedCache: TTL hits, single-flight misses and stale fallback"""
+
+import asyncio
+import threading
+import time
+
+from app import FeedCache
+
+
+class SlowFetch:
+    """Upstream stand-in that blocks until released and counts its calls"""
+
+    def __init__(self, value=None):
+        self.calls = 0
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.value = value
+
+    def __call__(self, feed_key):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return self.value if self.value is not None else {'value': f'{feed_key}-{self.calls}'}
+
+
+def test_hit_within_ttl_skips_upstream():
+    fetch = SlowFetch()
+    fetch.release.set()
+    cache = FeedCache(fetch, default_ttl=60)
+
+    assert cache.get('temperature') == {'value': 'temperature-1'}
+    assert cache.get('temperature') == {'value': 'temperature-1'}
+    assert fetch.calls == 1
+    assert cache.counters['hits'] == 1
+
+
+def test_per_feed_ttl_overrides_default():
+    fetch = SlowFetch()
+    fetch.release.set()
+    cache = FeedCache(fetch, default_ttl=60, ttls={'status': 0})
+
+    cache.get('status')
+    cache.get('status')
+    assert fetch.calls == 2
+
+
+def test_concurrent_misses_share_one_upstream_call():
+    fetch = SlowFetch()
+    cache = FeedCache(fetch, default_ttl=60)
+    results = []
+
+    def read():
+        results.append(cache.get('humidity'))
+
+    leader = threading.Thread(target=read)
+    leader.start()
+    assert fetch.started.wait(5)
+    followers = [threading.Thread(target=read) for _ in range(5)]
+    for thread in followers:
+        thread.start()
+    # Followers are parked on the leader's flight before it completes
+    deadline = time.monotonic() + 5
+    while cache.counters['coalesced'] < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    fetch.release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert fetch.calls == 1
+    assert results == [{'value': 'humidity-1'}] * 6
+    assert cache.counters['coalesced'] == 5
+
+
+def test_failed_read_serves_last_good_value_until_max_stale():
+    values = iter([{'value': '21.5'}, None, None])
+    cache = FeedCache(lambda feed_key: next(values), default_ttl=0, max_stale=60)
+
+    assert cache.get('temperature') == {'value': '21.5'}
+    assert cache.get('temperature') == {'value': '21.5'}
+    assert cache.counters['stale'] == 1
+
+    cache.max_stale = 0
+    assert cache.get('temperature') is None
+    assert cache.counters['errors'] == 2
+
+
+def test_fetch_exception_counts_as_a_failed_read():
+    def fetch(feed_key):
+        raise ConnectionError('upstream down')
+
+    cache = FeedCache(fetch, default_ttl=60)
+    assert cache.get('status') is None
+    assert cache.counters['errors'] == 1
+    # The flight is cleared, so the next read tries again
+    assert cache._inflight == {}
+
+
+def test_invalidate_forces_a_fresh_read():
+    fetch = SlowFetch()
+    fetch.release.set()
+    cache = FeedCache(fetch, default_ttl=60)
+
+    cache.get('status')
+    cache.invalidate('status')
+    assert cache.get('status') == {'value': 'status-2'}
+
+
+def test_async_readers_join_a_threaded_flight():
+    fetch = SlowFetch()
+    cache = FeedCache(fetch, default_ttl=60)
+    leader = threading.Thread(target=cache.get, args=('temperature',))
+    leader.start()
+    assert fetch.started.wait(5)
+
+    async def read():
+        async def never(feed_key):
+            raise AssertionError('async reader must not fetch while a flight is in progress')
+
+        waiter = asyncio.ensure_future(cache.aget('temperature', never))
+        await asyncio.sleep(0.05)
+        fetch.release.set()
+        return await asyncio.wait_for(waiter, 5)
+
+    assert asyncio.run(read()) == {'value': 'temperature-1'}
+    leader.join(5)
+    assert fetch.calls == 1
@@ -0,0 +1,61 @@
+"""get_adafruit_feeds: concurrent feed reads under one deadline"""
+
+import threading
+import time
+
+import app
+
+
+def test_feeds_are_read_concurrently(monkeypatch):
+    barrier = threading.Barrier(3, timeout=5)
+
+    def read(feed_key):
+        # Only returns if all three reads are in flight at once
+        barrier.wait()
+        return {'value': feed_key}
+
+    monkeypatch.setattr(app, 'get_adafruit_feed_data', read)
+    feeds = app.get_adafruit_feeds(['status', 'temperature', 'humidity'], deadline=5)
+
+    assert feeds == {key: {'value': key} for key in ('status', 'temperature', 'humidity')}
+
+
+def test_late_and_failed_feeds_map_to_none(monkeypatch):
+    release = threading.Event()
+
+    def read(feed_key):
+        if feed_key == 'humidity':
+            release.wait(5)
+        if feed_key == 'status':
+            raise ConnectionError('upstream down')
+        return {'value': '21.0'}
+
+    monkeypatch.setattr(app, 'get_adafruit_feed_data', read)
+    started = time.monotonic()
+    try:
+        feeds = app.get_adafruit_feeds(['status', 'temperature', 'humidity'], deadline=0.2)
+    finally:
+        release.set()
+
+    assert time.monotonic() - started < 2
+    assert feeds == {'status': None, 'temperature': {'value': '21.0'}, 'humidity': None}
+
+
+def test_live_data_reports_partial_results(monkeypatch):
+    monkeypatch.setattr(app, 'get_adafruit_feeds', lambda feed_keys: {
+        'status': {'value': 'armed'},
+        'temperature': {'value': '22.5'},
+        'humidity': None
+    })
+    body = app.app.test_client().get('/api/live-data').get_json()
+
+    assert body['partial'] is True
+    assert body['data']['alarm_status'] == 'armed'
+    assert body['data']['temperature'] == 22.5
+    assert body['data']['humidity'] is None
+
+
+def test_feed_value_as_float_tolerates_bad_values():
+    assert app.feed_value_as_float({'value': '19.25'}) == 19.25
+    assert app.feed_value_as_float({'value': 'n/a'}) is None
+    assert app.feed_value_as_float(None) is None
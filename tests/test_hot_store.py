@@ -0,0 +1,126 @@
+"""Local SQLite hot tier: warm-up, catch-up, coverage and series reads"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from hot_store import HotStore
+
+NOW = datetime.now().replace(microsecond=0)
+
+
+class Source:
+    """sensor_data stand-in serving the two loaders HotStore follows"""
+
+    def __init__(self, rows):
+        self.rows = rows  # (id, timestamp, sensor_type, value)
+        self.window_calls = []
+        self.load_calls = []
+
+    def load_window(self, since, after, limit):
+        self.window_calls.append(after)
+        rows = sorted((row for row in self.rows if row[1] >= since), key=lambda row: (row[1], row[0]))
+        if after:
+            rows = [row for row in rows if (row[1], row[0]) > after]
+        return rows[:limit]
+
+    def load(self, after_id, since, limit):
+        self.load_calls.append(after_id)
+        return sorted(row for row in self.rows if row[0] > after_id and row[1] >= since)[:limit]
+
+
+@pytest.fixture
+def make_store(tmp_path, monkeypatch):
+    # Syncs are driven by the tests, not the background thread
+    monkeypatch.setattr(HotStore, '_start', lambda self: None)
+
+    def make_store(source, **options):
+        return HotStore(str(tmp_path / 'hot.db'), source.load, source.load_window, window_hours=2, **options)
+
+    return make_store
+
+
+def reading(row_id, minutes_ago, value, sensor='temperature'):
+    return (row_id, NOW - timedelta(minutes=minutes_ago), sensor, value)
+
+
+def test_nothing_is_covered_before_the_first_sync(make_store):
+    store = make_store(Source([]))
+    assert not store.covers(NOW - timedelta(minutes=30), NOW)
+
+
+def test_warm_up_pages_through_the_window(make_store):
+    source = Source([reading(i, 100 - i, float(i)) for i in range(1, 8)] + [reading(99, 300, 0.0)])
+    store = make_store(source, batch_size=3)
+
+    assert store.sync() == 7
+    assert source.window_calls == [None, (NOW - timedelta(minutes=97), 3), (NOW - timedelta(minutes=94), 6)]
+    stats = store.stats()
+    assert stats['rows'] == 7 and stats['last_id'] == 7
+    assert store.covers(NOW - timedelta(minutes=100), NOW)
+    assert not store.covers(NOW - timedelta(hours=3), NOW)
+
+
+def test_catch_up_rereads_recent_ids(make_store):
+    source = Source([reading(10, 50, 1.0), reading(11, 40, 2.0)])
+    store = make_store(source, id_overlap=5)
+    store.sync()
+
+    # id 8 committed after 11 was already copied
+    source.rows += [reading(8, 45, 3.0), reading(12, 30, 4.0)]
+    assert store.sync() == 4
+    assert source.load_calls == [6]
+    assert store.stats()['rows'] == 4 and store.stats()['last_id'] == 12
+
+
+def test_rows_leave_the_store_with_the_window(make_store):
+    store = make_store(Source([reading(1, 60, 1.0)]))
+    store.sync()
+
+    store.add([(NOW - timedelta(hours=5), 'temperature', 9.0, 'C'), (NOW - timedelta(minutes=5), 'temperature', 2.0, 'C')])
+    assert store.stats()['rows'] == 2
+    assert store.stats()['rows_added'] == 1
+
+
+def test_series_reads_raw_rows_when_they_fit(make_store):
+    store = make_store(Source([reading(1, 30, 20.0), reading(2, 20, 21.0), reading(3, 10, 22.0, sensor='humidity')]))
+    store.sync()
+
+    rows, downsampled = store.series('temperature', NOW - timedelta(hours=1), NOW, max_points=10)
+
+    assert downsampled is None
+    assert rows == [
+        {'timestamp': NOW - timedelta(minutes=30), 'value': 20.0},
+        {'timestamp': NOW - timedelta(minutes=20), 'value': 21.0}
+    ]
+
+
+@pytest.mark.parametrize('method', ['lttb', 'avg', 'minmax'])
+def test_series_downsample_long_ranges(make_store, method):
+    store = make_store(Source([reading(i, 100 - i, float(i % 7)) for i in range(1, 100)]))
+    store.sync()
+
+    rows, downsampled = store.series('temperature', NOW - timedelta(hours=2), NOW, max_points=10, method=method)
+
+    assert downsampled['method'] == method
+    assert downsampled['points'] == len(rows) <= 10
+    assert [row['timestamp'] for row in rows] == sorted(row['timestamp'] for row in rows)
+    if method == 'avg':
+        assert all(row['min_value'] <= row['value'] <= row['max_value'] for row in rows)
+
+
+def test_sync_errors_are_counted_by_the_catch_up_thread(make_store, monkeypatch):
+    def load_window(since, after, limit):
+        raise ConnectionError('database unavailable')
+
+    def stop(seconds):
+        raise SystemExit
+
+    store = make_store(Source([]))
+    store.load_window = load_window
+    monkeypatch.setattr('hot_store.time.sleep', stop)
+
+    with pytest.raises(SystemExit):
+        store._run()
+    assert store.stats()['sync_errors'] == 1
+    assert store.stats()['last_sync']['error'] == 'ConnectionError: database unavailable'
@@ -0,0 +1,132 @@
+"""Device reading ingestion: body decoding, validation and the /api/ingest route"""
+
+import io
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import app
+import ingest
+from ingest import IngestError, decode_body, parse_readings, parse_timestamp
+
+
+@pytest.mark.parametrize('body, content_type', [
+    (b'[{"sensor": "temperature", "value": 21}]', 'application/json'),
+    (b'{"readings": [{"sensor": "temperature", "value": 21}]}', 'application/json; charset=utf-8'),
+    (b'{"sensor": "temperature", "value": 21}', None),
+    (b'{"sensor": "temperature", "value": 21}\n\n', 'application/x-ndjson'),
+])
+def test_decode_accepts_arrays_wrappers_single_objects_and_lines(body, content_type):
+    assert decode_body(body, content_type) == [{'sensor': 'temperature', 'value': 21}]
+
+
+def test_decode_msgpack():
+    msgpack = pytest.importorskip('msgpack')
+    body = msgpack.packb([{'sensor': 'humidity', 'value': 40.5}])
+    assert decode_body(body, 'application/msgpack') == [{'sensor': 'humidity', 'value': 40.5}]
+
+
+def test_msgpack_without_the_package_is_unsupported(monkeypatch):
+    monkeypatch.setattr(ingest, 'msgpack', None)
+    with pytest.raises(IngestError) as error:
+        decode_body(b'\x90', 'application/msgpack')
+    assert error.value.status == 415
+
+
+@pytest.mark.parametrize('body, content_type, status', [
+    (b'[1, 2', 'application/json', 400),
+    (b'"just a string"', 'application/json', 400),
+    (b'<readings/>', 'application/xml', 415),
+])
+def test_decode_rejects_malformed_bodies(body, content_type, status):
+    with pytest.raises(IngestError) as error:
+        decode_body(body, content_type)
+    assert error.value.status == status
+
+
+def test_parse_readings_keeps_valid_rows_and_reports_the_rest():
+    rows, errors = parse_readings([
+        {'sensor': 'temperature', 'value': '21.5', 'timestamp': '2025-12-01T08:00:00'},
+        {'sensor': 'Temperature', 'value': 1},
+        {'sensor': 'humidity', 'value': True},
+        {'sensor': 'humidity', 'value': float('nan')},
+        {'sensor_type': 'co2', 'value': 415, 'unit': 'ppm', 'timestamp': 1764576000},
+        'not an object',
+        {'sensor': 'light', 'value': 5, 'timestamp': 'yesterday'}
+    ])
+
+    assert rows[0] == (datetime(2025, 12, 1, 8, 0), 'temperature', 21.5, '°C')
+    assert rows[1][1:] == ('co2', 415.0, 'ppm')
+    assert [error['index'] for error in errors] == [1, 2, 3, 5, 6]
+
+
+def test_aware_timestamps_become_local_wall_clock():
+    utc = datetime(2025, 12, 1, 8, 0, tzinfo=timezone.utc)
+    assert parse_timestamp('2025-12-01T08:00:00Z') == utc.astimezone().replace(tzinfo=None)
+
+
+class FakeWriter:
+    def __init__(self, accept=True):
+        self.accept = accept
+        self.rows = []
+
+    def offer(self, rows):
+        if self.accept:
+            self.rows.extend(rows)
+        return self.accept
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    writer = FakeWriter()
+    monkeypatch.setattr(app, 'ingest_writer', writer)
+    monkeypatch.setattr(app, 'INGEST_TOKEN', None)
+    return writer
+
+
+def test_ingest_queues_valid_rows(writer):
+    response = app.app.test_client().post('/api/ingest', json=[
+        {'sensor': 'temperature', 'value': 21},
+        {'sensor': 'temperature', 'value': 'warm'}
+    ])
+
+    assert response.status_code == 202
+    assert response.get_json()['accepted'] == 1 and response.get_json()['rejected'] == 1
+    assert [row[1:3] for row in writer.rows] == [('temperature', 21.0)]
+
+
+def test_ingest_requires_the_token_when_configured(writer, monkeypatch):
+    monkeypatch.setattr(app, 'INGEST_TOKEN', 'secret')
+    client = app.app.test_client()
+    reading = [{'sensor': 'temperature', 'value': 21}]
+
+    assert client.post('/api/ingest', json=reading).status_code == 401
+    assert client.post('/api/ingest', json=reading, headers={'X-Ingest-Token': 'secret'}).status_code == 202
+
+
+def test_ingest_answers_429_when_the_buffer_is_full(writer):
+    writer.accept = False
+    response = app.app.test_client().post('/api/ingest', json=[{'sensor': 'temperature', 'value': 21}])
+
+    assert response.status_code == 429
+    assert 'Retry-After' in response.headers
+
+
+def test_oversized_bodies_are_refused_with_or_without_a_length(writer, monkeypatch):
+    monkeypatch.setattr(app, 'INGEST_MAX_BODY_BYTES', 64)
+    body = json.dumps([{'sensor': 'temperature', 'value': i} for i in range(10)]).encode()
+    client = app.app.test_client()
+
+    assert client.post('/api/ingest', data=body, content_type='application/json').status_code == 413
+
+    # Chunked upload: no Content-Length, the read itself must stop at the cap
+    response = client.post(
+        '/api/ingest',
+        input_stream=io.BytesIO(body),
+        content_type='application/json',
+        headers={'Transfer-Encoding': 'chunked'},
+        environ_overrides={'wsgi.input_terminated': True}
+    )
+    assert response.status_code == 413
+    assert writer.rows == []
@@ -0,0 +1,88 @@
+"""Keyset pagination of /api/intrusions"""
+
+from datetime import datetime
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import app
+
+
+def event(event_id, hour, event_type='intrusion'):
+    return {'id': event_id, 'timestamp': datetime(2025, 12, 1, hour, 0), 'event_type': event_type, 'details': None}
+
+
+def test_cursor_round_trip():
+    cursor = app.encode_page_cursor(datetime(2025, 12, 1, 21, 30, 0, 250000), 42)
+
+    assert '=' not in cursor
+    assert app.decode_page_cursor(cursor) == (datetime(2025, 12, 1, 21, 30, 0, 250000), 42)
+
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', 'MjAyNS0xMi0wMQ', app.encode_page_cursor(datetime(2025, 12, 1), 1)[:-3]])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        app.decode_page_cursor(cursor)
+
+
+def test_arguments_default_to_alert_types_and_clamp_the_limit():
+    start, end, limit, after, event_types = app.parse_intrusions_args(MultiDict({'date': '2025-12-01', 'limit': '100000'}))
+
+    assert (start, end) == (datetime(2025, 12, 1), datetime(2025, 12, 2))
+    assert limit == app.INTRUSIONS_MAX_PAGE_SIZE
+    assert after is None
+    assert event_types == app.ALERT_EVENT_TYPES
+    assert app.parse_intrusions_args(MultiDict({'date': '2025-12-01', 'limit': '0'}))[2] == 1
+    assert app.parse_intrusions_args(MultiDict()) is None
+
+
+def test_first_page_asks_for_one_extra_row():
+    query, params = app.intrusions_query(datetime(2025, 12, 1), datetime(2025, 12, 2), 10, None, ['alert'])
+
+    assert '(timestamp, id) <' not in query
+    assert params == [['alert'], datetime(2025, 12, 1), datetime(2025, 12, 2), 11]
+
+
+def test_later_pages_continue_after_the_cursor():
+    after = (datetime(2025, 12, 1, 21), 7)
+    query, params = app.intrusions_query(datetime(2025, 12, 1), datetime(2025, 12, 2), 10, after, ['alert'])
+
+    assert 'AND timestamp <= %s AND (timestamp, id) < (%s, %s)' in ' '.join(query.split())
+    assert 'OFFSET' not in query
+    assert params[3:] == [after[0], after[0], 7, 11]
+
+
+def test_page_reports_the_next_cursor_only_when_more_rows_exist():
+    page = app.format_intrusions_page([event(9, 22), event(8, 21), event(3, 20)], 2)
+
+    assert [row['id'] for row in page['data']] == [9, 8]
+    assert page['data'][0]['time'] == '22:00:00'
+    assert page['has_more']
+    assert app.decode_page_cursor(page['next_cursor']) == (datetime(2025, 12, 1, 21), 8)
+
+    last = app.format_intrusions_page([event(3, 20)], 2)
+    assert not last['has_more'] and last['next_cursor'] is None
+
+
+def test_route_follows_the_cursor_to_the_next_page(fake_db):
+    client = app.app.test_client()
+    fake_db.results = [[event(9, 22), event(8, 21), event(3, 20)], [event(3, 20)]]
+
+    first = client.get('/api/intrusions?date=2025-12-01&limit=2&event_type=intrusion').get_json()
+    second = client.get(
+        f"/api/intrusions?date=2025-12-01&limit=2&event_type=intrusion&cursor={first['next_cursor']}"
+    ).get_json()
+
+    assert [row['id'] for row in first['data'] + second['data']] == [9, 8, 3]
+    assert not second['has_more']
+    (_, first_params), (_, second_params) = fake_db.executed
+    assert first_params[0] == ['intrusion']
+    assert second_params[3:6] == [datetime(2025, 12, 1, 21), datetime(2025, 12, 1, 21), 8]
+
+
+def test_route_rejects_a_bad_cursor(fake_db):
+    response = app.app.test_client().get('/api/intrusions?date=2025-12-01&cursor=bogus')
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid cursor'
+    assert fake_db.executed == []
@@ -0,0 +1,120 @@
+"""LiveBroadcaster: one poller per worker pushing deltas and alerts to subscribers"""
+
+import queue
+from datetime import datetime
+
+import pytest
+
+import app
+from app import LiveBroadcaster, LiveSubscriber
+
+
+class Feeds:
+    """Feed reads returned by successive polls"""
+
+    def __init__(self, *snapshots):
+        self.snapshots = list(snapshots)
+
+    def __call__(self, feed_keys):
+        snapshot = self.snapshots.pop(0) if len(self.snapshots) > 1 else self.snapshots[0]
+        return {key: {'value': value} for key, value in snapshot.items()}
+
+
+def next_message(subscriber, timeout=5):
+    return subscriber.queue.get(timeout=timeout)
+
+
+@pytest.fixture
+def feeds(monkeypatch):
+    def install(*snapshots):
+        monkeypatch.setattr(app, 'get_adafruit_feeds', Feeds(*snapshots))
+    return install
+
+
+def test_first_poll_sends_everything_then_only_changes(feeds):
+    feeds(
+        {'status': 'armed', 'temperature': '21.0', 'humidity': '40'},
+        {'status': 'armed', 'temperature': '21.5', 'humidity': '40'}
+    )
+    broadcaster = LiveBroadcaster(['status', 'temperature', 'humidity'], interval=0.01)
+    subscriber = broadcaster.subscribe()
+    try:
+        event, data = next_message(subscriber)
+        assert event == 'live'
+        assert data['alarm_status'] == 'armed'
+        assert data['temperature'] == 21.0
+
+        event, data = next_message(subscriber)
+        assert set(data) == {'temperature', 'timestamp'}
+        assert data['temperature'] == 21.5
+
+        # Nothing changes after that
+        with pytest.raises(queue.Empty):
+            subscriber.queue.get(timeout=0.1)
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+def test_late_subscriber_gets_the_current_snapshot(feeds):
+    feeds({'status': 'disarmed', 'temperature': '20.0', 'humidity': '35'})
+    broadcaster = LiveBroadcaster(['status', 'temperature', 'humidity'], interval=0.01)
+    first = broadcaster.subscribe()
+    try:
+        next_message(first)
+        second = broadcaster.subscribe()
+        event, data = next_message(second, timeout=0)
+        assert event == 'live'
+        assert data['alarm_status'] == 'disarmed'
+        broadcaster.unsubscribe(second)
+    finally:
+        broadcaster.unsubscribe(first)
+
+
+def test_alerts_stored_after_subscribing_are_pushed(feeds):
+    feeds({'status': 'armed', 'temperature': '21.0', 'humidity': '40'})
+    calls = []
+
+    def load_alerts(after_id):
+        calls.append(after_id)
+        if after_id is None:
+            return 41, []
+        if after_id == 41:
+            return 42, [{'id': 42, 'timestamp': datetime(2025, 12, 1, 8, 30), 'details': 'temperature too high'}]
+        return after_id, []
+
+    broadcaster = LiveBroadcaster(['status', 'temperature', 'humidity'], interval=0.01, load_alerts=load_alerts)
+    subscriber = broadcaster.subscribe()
+    try:
+        messages = [next_message(subscriber) for _ in range(2)]
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+    assert ('alert', {'id': 42, 'timestamp': '2025-12-01T08:30:00', 'details': 'temperature too high'}) in messages
+    # The first poll only records where the history ends
+    assert calls[:2] == [None, 41]
+
+
+def test_subscriber_that_falls_behind_is_dropped():
+    broadcaster = LiveBroadcaster([], interval=60)
+    subscriber = LiveSubscriber(maxsize=1)
+    with broadcaster._lock:
+        broadcaster._subscribers.add(subscriber)
+
+    broadcaster.publish('live', {'temperature': 1})
+    broadcaster.publish('live', {'temperature': 2})
+
+    assert subscriber.dropped
+    assert subscriber not in broadcaster._subscribers
+
+
+def test_live_stream_refuses_clients_beyond_the_limit(monkeypatch):
+    slots = app.threading.BoundedSemaphore(1)
+    monkeypatch.setattr(app, 'live_stream_slots', slots)
+    assert slots.acquire(blocking=False)
+    try:
+        response = app.app.test_client().get('/api/live-stream')
+    finally:
+        slots.release()
+
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
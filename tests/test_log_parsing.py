@@ -0,0 +1,86 @@
+"""Streaming log parsing: time parser, log types, quarantine and discovery"""
+
+import csv
+from datetime import datetime
+
+import pytest
+
+from db_schema import LOG_TYPES
+from sync_data import DataSync, Quarantine, time_parser
+
+
+def test_time_parser_handles_fractions():
+    parse = time_parser('2025-12-01')
+
+    assert parse('08:15:30') == datetime(2025, 12, 1, 8, 15, 30)
+    assert parse(' 08:15:30.25 ') == datetime(2025, 12, 1, 8, 15, 30, 250000)
+    with pytest.raises(ValueError):
+        parse('8h15')
+
+
+def test_sensor_rows_carry_the_unit():
+    assert LOG_TYPES['humidity'].to_row(datetime(2025, 12, 1), '41.5') == (datetime(2025, 12, 1), 'humidity', 41.5, '%')
+
+
+@pytest.mark.parametrize('message', ['warm', 'nan', 'inf', '1e9'])
+def test_sensor_rows_reject_values_the_column_cannot_hold(message):
+    with pytest.raises(ValueError):
+        LOG_TYPES['temperature'].to_row(datetime(2025, 12, 1), message)
+
+
+def test_status_lines_become_security_events():
+    status = LOG_TYPES['alarm-status']
+
+    assert status.to_row(datetime(2025, 12, 1), 'armed')[1:] == ('state_change', 'System armed')
+    assert status.to_row(datetime(2025, 12, 1), 'alert')[1] == 'alert'
+    with pytest.raises(ValueError):
+        status.to_row(datetime(2025, 12, 1), '  ')
+
+
+def test_bad_lines_are_quarantined_and_the_rest_parsed(tmp_path):
+    path = tmp_path / '2025-12-01_temperature.csv'
+    path.write_text('timestamp,message\n08:00:00,20.5\n08:00:05,hot\n25:00:00,20\n08:00:10,21\n')
+    sync = DataSync()
+    state = {'offset': 0, 'last_timestamp': None}
+    quarantine = Quarantine(tmp_path / 'quarantine' / 'rejected.csv')
+
+    records = sync.read_new_records(path, state)
+    rows = list(sync.parse_records(records, '2025-12-01', LOG_TYPES['temperature'], state, quarantine))
+    quarantine.close()
+
+    assert [row[2] for row in rows] == [20.5, 21.0]
+    assert state['last_timestamp'] == datetime(2025, 12, 1, 8, 0, 10)
+    assert quarantine.count == 2
+    with open(quarantine.path, newline='') as f:
+        rejected = list(csv.reader(f))
+    assert rejected[0] == ['quarantined_at', 'error', 'line']
+    assert [line for *_, line in rejected[1:]] == ['08:00:05,hot', '25:00:00,20']
+
+
+def test_records_are_read_lazily(tmp_path):
+    path = tmp_path / '2025-12-01_temperature.csv'
+    path.write_text('timestamp,message\n' + ''.join(f'08:00:{i:02d},{i}\n' for i in range(50)))
+    state = {'offset': 0}
+
+    records = DataSync().read_new_records(path, state)
+    first = next(records)
+
+    assert first[1] == {'timestamp': '08:00:00', 'message': '0'}
+    # Only the header and the first line have been consumed
+    assert state['offset'] == len('timestamp,message\n08:00:00,0\n')
+
+
+def test_discovery_treats_unknown_logs_as_sensors(tmp_path):
+    for name in ('temperature', 'alarm-status', 'co2'):
+        (tmp_path / f'2025-12-01_{name}.csv').write_text('timestamp,message\n')
+    (tmp_path / '2025-12-02_temperature.csv').write_text('timestamp,message\n')
+    sync = DataSync()
+    sync.logs_dir = tmp_path
+
+    sensors = {path.name: log_type for path, log_type in sync.discover_logs('2025-12-01', 'sensor')}
+    security = [path.name for path, _ in sync.discover_logs('2025-12-01', 'security')]
+
+    assert set(sensors) == {'2025-12-01_temperature.csv', '2025-12-01_co2.csv'}
+    assert sensors['2025-12-01_co2.csv'].name == 'co2' and sensors['2025-12-01_co2.csv'].unit is None
+    assert security == ['2025-12-01_alarm-status.csv']
+
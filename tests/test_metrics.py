@@ -0,0 +1,91 @@
+"""Component counter export and the sync_data.py Pushgateway samples"""
+
+import pytest
+
+pytest.importorskip('prometheus_client')
+
+from prometheus_client import REGISTRY, generate_latest  # noqa: E402
+
+import metrics  # noqa: E402
+import sync_data  # noqa: E402
+from metrics import SYNC_REGISTRY, StatsExporter, observe_sync, push_sync  # noqa: E402
+
+
+def events(component, event):
+    return REGISTRY.get_sample_value('iot_component_events_total', {'component': component, 'event': event}) or 0.0
+
+
+def level(component, name):
+    return REGISTRY.get_sample_value('iot_component_level', {'component': component, 'name': name})
+
+
+def test_counters_are_exported_as_deltas(request):
+    component = request.node.name
+    stats = {'hits': 5, 'misses': 1, 'entries': 7}
+    exporter = StatsExporter()
+    exporter.register(component, lambda: stats, counters=('hits', 'misses'), levels=('entries',))
+
+    exporter.export()
+    stats.update(hits=8, entries=3)
+    exporter.export()
+
+    assert events(component, 'hits') == 8
+    assert events(component, 'misses') == 1
+    assert level(component, 'entries') == 3
+
+
+def test_a_reset_component_starts_counting_again(request):
+    component = request.node.name
+    stats = {'written': 100}
+    exporter = StatsExporter()
+    exporter.register(component, lambda: stats, counters=('written',))
+
+    exporter.export()
+    stats['written'] = 4
+    exporter.export()
+
+    assert events(component, 'written') == 104
+
+
+def test_failing_stats_do_not_stop_the_export(request):
+    component = request.node.name
+    exporter = StatsExporter()
+    exporter.register(f'{component}-broken', lambda: 1 / 0, counters=('hits',))
+    exporter.register(component, lambda: {'hits': 2}, counters=('hits',))
+
+    exporter.export()
+
+    assert events(component, 'hits') == 2
+
+
+def test_sync_samples_live_in_their_own_registry():
+    observe_sync('security', copied=10, synced=7, seconds=0.2)
+
+    assert SYNC_REGISTRY.get_sample_value('iot_sync_rows_total', {'log_type': 'security', 'result': 'synced'}) >= 7
+    names = {line.split('{')[0].split(' ')[0] for line in generate_latest(SYNC_REGISTRY).decode().splitlines()
+             if not line.startswith('#')}
+    assert names and all(name.startswith('iot_sync_') for name in names)
+
+
+def test_push_needs_a_gateway(monkeypatch):
+    pushed = []
+    monkeypatch.setattr(metrics, 'push_to_gateway', lambda gateway, **kwargs: pushed.append((gateway, kwargs)))
+
+    assert push_sync(None) is False
+    assert push_sync('') is False
+    assert pushed == []
+
+    assert push_sync('localhost:9091') is True
+    assert pushed == [('localhost:9091', {'job': 'sync_data', 'registry': SYNC_REGISTRY, 'timeout': 10})]
+
+
+def test_an_unreachable_gateway_does_not_fail_the_sync(monkeypatch, capsys):
+    def unreachable(gateway, **kwargs):
+        raise OSError('connection refused')
+
+    monkeypatch.setattr(metrics, 'push_to_gateway', unreachable)
+    monkeypatch.setenv('METRICS_PUSHGATEWAY', 'localhost:9091')
+
+    sync_data.push_metrics()
+
+    assert 'Could not push sync metrics to localhost:9091: connection refused' in capsys.readouterr().out
@@ -0,0 +1,162 @@
+"""Chart response cache: freshness, sensor-day invalidation and the disk tier"""
+
+import os
+import time
+from datetime import date, datetime
+
+import pytest
+
+from response_cache import ResponseCache, make_private_dir, mark_changed, range_days
+
+CLOSED = (datetime(2025, 12, 1), datetime(2025, 12, 3))
+
+
+@pytest.fixture
+def markers(tmp_path):
+    return str(tmp_path / 'markers')
+
+
+def earlier():
+    """A created_ns safely before any marker touched from now on"""
+    return time.time_ns() - 10**9
+
+
+def put(cache, key='k', body=b'{"values": []}', sensor='temperature', span=CLOSED, closed=True, created_ns=None):
+    return cache.put(key, body, [('Content-Type', 'application/json')], sensor, *span, closed,
+                     created_ns or earlier())
+
+
+def test_range_days_covers_the_half_open_range():
+    assert list(range_days(*CLOSED)) == [date(2025, 12, 1), date(2025, 12, 2)]
+    assert list(range_days(datetime(2025, 12, 1, 23), datetime(2025, 12, 2, 0, 0, 1))) == [
+        date(2025, 12, 1), date(2025, 12, 2)
+    ]
+
+
+def test_closed_entries_stay_until_one_of_their_days_changes(markers):
+    cache = ResponseCache(1024, marker_dir=markers)
+    entry = put(cache)
+    assert cache.get('k') is entry
+
+    mark_changed('temperature', date(2025, 12, 3), markers)
+    mark_changed('humidity', date(2025, 12, 2), markers)
+    assert cache.get('k') is entry
+
+    mark_changed('temperature', date(2025, 12, 2), markers)
+    assert cache.get('k') is None
+    assert cache.stats()['stale'] == 1
+    assert cache.stats()['entries'] == 0
+
+
+def test_open_entries_expire_after_their_ttl(markers):
+    cache = ResponseCache(1024, open_ttl=0.5, marker_dir=markers)
+    put(cache, key='recent', closed=False, created_ns=time.time_ns())
+    put(cache, key='old', closed=False, created_ns=time.time_ns() - 10**9)
+
+    assert cache.get('recent') is not None
+    assert cache.get('old') is None
+
+
+def test_entries_built_before_a_concurrent_write_are_stale(markers):
+    cache = ResponseCache(1024, marker_dir=markers)
+    created_ns = earlier()
+    mark_changed('temperature', date(2025, 12, 1), markers)
+
+    put(cache, created_ns=created_ns)
+    assert cache.get('k') is None
+
+
+def test_memory_tier_evicts_least_recently_used(markers):
+    cache = ResponseCache(20, marker_dir=markers)
+    put(cache, key='a', body=b'x' * 8)
+    put(cache, key='b', body=b'x' * 8)
+    cache.get('a')
+    put(cache, key='c', body=b'x' * 8)
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_disk_tier_round_trip(tmp_path, markers):
+    disk = str(tmp_path / 'disk')
+    entry = put(ResponseCache(1024, disk_dir=disk, marker_dir=markers), body=b'\x00binary\xff')
+
+    other = ResponseCache(1024, disk_dir=disk, marker_dir=markers)
+    loaded = other.get('k')
+
+    assert loaded == entry
+    assert other.stats()['disk_hits'] == 1
+    assert os.stat(disk).st_mode & 0o777 == 0o700
+
+
+def test_open_entries_stay_off_disk(tmp_path, markers):
+    disk = tmp_path / 'disk'
+    put(ResponseCache(1024, disk_dir=str(disk), marker_dir=markers), closed=False)
+    assert list(disk.iterdir()) == []
+
+
+@pytest.mark.parametrize('contents', [b'not json\nbody', b'{"size": 99, "headers": []}\nshort'])
+def test_unreadable_disk_entries_are_dropped(tmp_path, markers, contents):
+    disk = tmp_path / 'disk'
+    cache = ResponseCache(1024, disk_dir=str(disk), marker_dir=markers)
+    path = disk / 'k.cache'
+    path.write_bytes(contents)
+
+    assert cache.get('k') is None
+    assert cache.stats()['disk_errors'] == 1
+    assert not path.exists()
+
+
+def test_shared_writable_directories_are_refused(tmp_path, markers):
+    shared = tmp_path / 'shared'
+    shared.mkdir()
+    shared.chmod(0o777)
+
+    with pytest.raises(PermissionError):
+        make_private_dir(str(shared))
+    cache = ResponseCache(1024, disk_dir=str(shared), marker_dir=markers)
+    assert cache.stats()['disk'] is False
+
+
+def test_unusual_sensor_names_stay_inside_the_marker_dir(tmp_path, markers):
+    mark_changed('../../escape', date(2025, 12, 1), markers)
+
+    assert not (tmp_path / 'escape').exists()
+    (sensor_dir,) = os.listdir(markers)
+    assert len(sensor_dir) == 16
+
+
+def test_new_readings_invalidate_through_mark_rows(markers):
+    cache = ResponseCache(1024, marker_dir=markers)
+    put(cache)
+
+    cache.mark_rows([(datetime(2025, 12, 2, 8, 0), 'temperature', 21.5)])
+    assert cache.get('k') is None
+
+
+def test_poll_marks_each_remote_change_once(markers):
+    calls = []
+    changes = [('temperature', date(2025, 12, 2), datetime(2025, 12, 10, 8, 0))]
+
+    def load_changes(since, lookback):
+        calls.append((since, lookback))
+        return changes
+
+    # Only poll_changes is called, so the background poll never starts
+    poller = ResponseCache(1024, marker_dir=markers, load_changes=load_changes, poll_lookback=600)
+    cache = ResponseCache(1024, marker_dir=markers)
+    put(cache)
+
+    assert poller.poll_changes() == 1
+    assert cache.get('k') is None
+    put(cache, created_ns=time.time_ns())
+    assert poller.poll_changes() == 0
+    assert cache.get('k') is not None
+
+    # Another worker picks up where this one left off
+    changes = [('temperature', date(2025, 12, 2), datetime(2025, 12, 10, 8, 5))]
+    other = ResponseCache(1024, marker_dir=markers, load_changes=load_changes, poll_lookback=600)
+    assert other.poll_changes() == 1
+    assert calls == [(None, 600), (datetime(2025, 12, 10, 8, 0), 600), (datetime(2025, 12, 10, 8, 0), 600)]
+    assert poller.stats()['changes_marked'] == 1
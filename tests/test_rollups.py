@@ -0,0 +1,104 @@
+"""Rollup triggers and the queries served from them (needs TEST_DATABASE_URL)"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import app
+
+
+def insert_readings(conn, rows):
+    with conn.cursor() as cursor:
+        cursor.executemany("""
+            INSERT INTO sensor_data (timestamp, sensor_type, value)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (sensor_type, timestamp) DO NOTHING
+        """, rows)
+
+
+def rollup(conn, grain, sensor='temperature'):
+    return conn.execute("""
+        SELECT bucket, reading_count, value_sum, min_value, max_value, updated_at
+        FROM sensor_rollups
+        WHERE grain = %s AND sensor_type = %s
+        ORDER BY bucket
+    """, (grain, sensor)).fetchall()
+
+
+def test_inserts_fold_into_every_grain(pg_conn):
+    insert_readings(pg_conn, [
+        (datetime(2025, 12, 1, 8, 0, 10), 'temperature', 20.0),
+        (datetime(2025, 12, 1, 8, 0, 40), 'temperature', 22.0),
+        (datetime(2025, 12, 1, 9, 15, 0), 'temperature', 18.5)
+    ])
+
+    minutes = rollup(pg_conn, 'minute')
+    assert [(row[0], row[1]) for row in minutes] == [
+        (datetime(2025, 12, 1, 8, 0), 2),
+        (datetime(2025, 12, 1, 9, 15), 1)
+    ]
+    assert [row[5] for row in minutes] == [None, None]
+
+    (bucket, count, total, low, high, updated_at), = rollup(pg_conn, 'day')
+    assert (bucket, count, total, low, high) == (datetime(2025, 12, 1), 3, Decimal('60.50'), Decimal('18.50'), Decimal('22.00'))
+    assert updated_at is not None
+
+
+def test_later_batches_update_existing_buckets(pg_conn):
+    insert_readings(pg_conn, [(datetime(2025, 12, 1, 8, 0, 10), 'temperature', 20.0)])
+    insert_readings(pg_conn, [
+        (datetime(2025, 12, 1, 8, 30, 0), 'temperature', 25.0),
+        (datetime(2025, 12, 1, 8, 45, 0), 'temperature', 15.0)
+    ])
+
+    (bucket, count, total, low, high, _), = rollup(pg_conn, 'hour')
+    assert (count, total, low, high) == (3, Decimal('60.00'), Decimal('15.00'), Decimal('25.00'))
+
+
+def test_skipped_duplicates_are_not_counted(pg_conn):
+    reading = (datetime(2025, 12, 1, 8, 0, 10), 'temperature', 20.0)
+    insert_readings(pg_conn, [reading])
+    insert_readings(pg_conn, [reading])
+
+    (_, count, *_), = rollup(pg_conn, 'day')
+    assert count == 1
+
+
+def test_security_events_roll_up_by_hour_and_day(pg_conn):
+    with pg_conn.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO security_events (timestamp, event_type, details) VALUES (%s, %s, %s)",
+            [
+                (datetime(2025, 12, 1, 2, 5), 'intrusion', 'door'),
+                (datetime(2025, 12, 1, 2, 50), 'intrusion', 'window'),
+                (datetime(2025, 12, 1, 23, 0), 'alert', None)
+            ]
+        )
+
+    rows = pg_conn.execute(app.DAILY_ALERTS_SQL, (['intrusion', 'alert'], datetime(2025, 12, 1), datetime(2025, 12, 2))).fetchall()
+    assert [(int(hour), int(count)) for hour, count in rows] == [(2, 2), (23, 1)]
+
+
+def test_rollup_buckets_match_raw_averages(pg_conn):
+    start = datetime(2025, 12, 1)
+    readings = [(start + timedelta(minutes=7 * i), 'temperature', 15 + (i * 37) % 11) for i in range(400)]
+    insert_readings(pg_conn, readings)
+    end = start + timedelta(days=2)
+    width = timedelta(hours=3)
+
+    query, params = app.sensor_buckets_query('temperature', start, end, width)
+    assert 'sensor_rollups' in query
+    from_rollups = pg_conn.execute(query, params).fetchall()
+
+    from_rows = pg_conn.execute("""
+        SELECT date_bin(%s, timestamp, %s) + %s / 2, AVG(value), MIN(value), MAX(value)
+        FROM sensor_data
+        WHERE sensor_type = 'temperature' AND timestamp >= %s AND timestamp < %s
+        GROUP BY 1
+        ORDER BY 1
+    """, (width, start, width, start, end)).fetchall()
+
+    assert len(from_rollups) == len(from_rows) > 1
+    for rolled, raw in zip(from_rollups, from_rows):
+        assert rolled[0] == raw[0]
+        assert abs(rolled[1] - raw[1]) < Decimal('0.0001')
+        assert rolled[2:] == raw[2:]
@@ -0,0 +1,167 @@
+"""Compact and binary chart series, checked against the chart.html decoder"""
+
+import gzip
+import json
+import os
+import struct
+from datetime import datetime, timedelta
+
+import pytest
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+import app
+from series_format import (
+    BINARY_MIMETYPE,
+    COMPACT_MIMETYPE,
+    COMPRESS_MIN_BYTES,
+    FLAG_MIN_MAX,
+    FLAG_WIDE_DELTAS,
+    compress,
+    encode_binary,
+    encode_compact,
+    negotiate_format,
+)
+
+CHART_TEMPLATE = os.path.join(os.path.dirname(__file__), '..', 'templates', 'chart.html')
+
+
+def decode_series(body):
+    """Python port of decodeSeries() in templates/chart.html"""
+    count, flags, unit_ms = struct.unpack_from('<III', body, 4)
+    time_ms = struct.unpack_from('<d', body, 16)[0] * 1000
+    wide = flags & 2
+    deltas = struct.unpack_from(f"<{count}{'d' if wide else 'i'}", body, 24)
+    values_at = 24 + count * (8 if wide else 4)
+
+    def column(index):
+        return [round(value, 2) for value in struct.unpack_from(f'<{count}f', body, values_at + count * 4 * (index - 1))]
+
+    times = []
+    for delta in deltas:
+        time_ms += delta * unit_ms
+        times.append(datetime(1970, 1, 1) + timedelta(milliseconds=time_ms))
+    data = {'times': times, 'values': column(1)}
+    if flags & 1:
+        data['min'] = column(2)
+        data['max'] = column(3)
+    return data
+
+
+def test_template_decoder_reads_the_documented_layout():
+    with open(CHART_TEMPLATE) as f:
+        template = f.read()
+
+    for offset in (4, 8, 12):
+        assert f'view.getUint32({offset}, true)' in template
+    assert 'view.getFloat64(16, true)' in template
+    assert f'flags & {FLAG_WIDE_DELTAS}' in template
+    assert f'flags & {FLAG_MIN_MAX}' in template
+    assert 'new Float64Array(buffer, 24, count)' in template
+    assert 'new Int32Array(buffer, 24, count)' in template
+
+
+def test_binary_round_trip_in_whole_seconds():
+    start = datetime(2025, 12, 1, 8, 0)
+    rows = [{'timestamp': start + timedelta(seconds=5 * i), 'value': 20 + i / 4} for i in range(5)]
+
+    body = encode_binary(rows)
+
+    assert body[:4] == b'SRS1'
+    assert struct.unpack_from('<III', body, 4) == (5, 0, 1000)
+    assert decode_series(body) == {'times': [row['timestamp'] for row in rows], 'values': [20, 20.25, 20.5, 20.75, 21]}
+
+
+def test_binary_round_trip_with_bands_and_milliseconds():
+    start = datetime(2025, 12, 1, 8, 0)
+    rows = [
+        {'timestamp': start, 'value': 21.5, 'min_value': 21, 'max_value': 22},
+        {'timestamp': start + timedelta(milliseconds=1500), 'value': 22.25, 'min_value': 22, 'max_value': 23.5}
+    ]
+
+    body = encode_binary(rows)
+    decoded = decode_series(body)
+
+    assert struct.unpack_from('<III', body, 4) == (2, FLAG_MIN_MAX, 1)
+    assert decoded['times'] == [row['timestamp'] for row in rows]
+    assert decoded['min'] == [21, 22] and decoded['max'] == [22, 23.5]
+
+
+def test_gaps_beyond_int32_switch_to_wide_deltas():
+    start = datetime(2025, 1, 1, 0, 0, 0, 500000)
+    rows = [{'timestamp': start, 'value': 1}, {'timestamp': start + timedelta(days=40), 'value': 2}]
+
+    body = encode_binary(rows)
+
+    assert struct.unpack_from('<I', body, 8)[0] == FLAG_WIDE_DELTAS
+    assert decode_series(body)['times'] == [row['timestamp'] for row in rows]
+    assert len(body) == 24 + 2 * 8 + 2 * 4
+
+
+def test_empty_series_is_just_a_header():
+    assert decode_series(encode_binary([])) == {'times': [], 'values': []}
+
+
+def test_compact_columns():
+    start = datetime(2025, 12, 1, 8, 0)
+    rows = [{'timestamp': start, 'value': 21}, {'timestamp': start + timedelta(seconds=30), 'value': 21.5}]
+
+    assert encode_compact(rows) == {
+        't0': (start - datetime(1970, 1, 1)).total_seconds(),
+        'unit_ms': 1000,
+        'dt': [0, 30],
+        'values': [21.0, 21.5]
+    }
+
+
+@pytest.mark.parametrize('requested, accept, expected', [
+    ('binary', 'application/json', 'binary'),
+    (None, BINARY_MIMETYPE, 'binary'),
+    (None, f'{COMPACT_MIMETYPE}, application/json;q=0.5', 'compact'),
+    (None, '*/*', 'json'),
+    (None, None, 'json'),
+])
+def test_format_negotiation(requested, accept, expected):
+    assert negotiate_format(requested, parse_accept_header(accept, MIMEAccept)) == expected
+
+
+def test_unknown_formats_are_rejected():
+    with pytest.raises(ValueError):
+        negotiate_format('csv', MIMEAccept())
+
+
+def test_small_bodies_and_json_stay_uncompressed():
+    body = b'x' * COMPRESS_MIN_BYTES
+    assert compress(body[:-1], 'gzip') == (body[:-1], None)
+    compressed, encoding = compress(body, 'gzip')
+    assert encoding == 'gzip' and gzip.decompress(compressed) == body
+
+    accepts_gzip = parse_accept_header('gzip')
+    assert app.series_encoding('json', accepts_gzip) is None
+    assert app.series_encoding('binary', accepts_gzip) == 'gzip'
+    assert app.series_encoding('compact', parse_accept_header('identity')) is None
+
+
+def test_binary_route_carries_downsampling_in_headers(fake_db):
+    fake_db.results = [[{'timestamp': datetime(2025, 12, 1, 8, 0), 'value': 21.5}]]
+
+    response = app.app.test_client().get(
+        '/api/historical-data?date=2025-12-01&sensor=temperature',
+        headers={'Accept': BINARY_MIMETYPE}
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == BINARY_MIMETYPE
+    assert decode_series(response.data)['values'] == [21.5]
+    assert json.loads(response.headers['X-Downsampled']) is None
+    assert response.headers['Vary'] == 'Accept, Accept-Encoding'
+
+
+def test_compact_route_body(fake_db):
+    fake_db.results = [[{'timestamp': datetime(2025, 12, 1, 8, 0), 'value': 21.5}]]
+
+    response = app.app.test_client().get('/api/historical-data?date=2025-12-01&format=compact')
+
+    body = json.loads(response.data)
+    assert response.mimetype == COMPACT_MIMETYPE
+    assert body['data']['values'] == [21.5] and body['downsampled'] is None
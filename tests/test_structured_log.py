@@ -0,0 +1,87 @@
+"""Request timing spans, the Server-Timing header and JSON log records"""
+
+import contextvars
+import json
+import logging
+import sys
+from datetime import datetime
+
+import app
+from structured_log import JsonFormatter, Timings, add_span, current_timings, span, start_request
+
+
+def test_header_sums_repeated_spans():
+    timings = Timings()
+    timings.add('db-query', 2.0)
+    timings.add('db-query', 3.5)
+    timings.add('adafruit', 10.0, 'GET /feeds/"light"/data/last')
+
+    assert timings.header(20.0) == (
+        'db-query;dur=5.5;desc="db-query x2", '
+        'adafruit;dur=10.0;desc="GET /feeds/\'light\'/data/last", '
+        'total;dur=20.0'
+    )
+    assert Timings().header() == ''
+
+
+def test_summary_totals_spans_by_name():
+    timings = Timings()
+    timings.add('adafruit', 1.234, 'GET /feeds/a')
+    timings.add('adafruit', 2.0, 'GET /feeds/b')
+    timings.add('serialize', 0.5)
+
+    assert timings.summary() == {'adafruit': 3.23, 'serialize': 0.5}
+
+
+def test_spans_outside_a_request_are_ignored():
+    def outside():
+        with span('db-query'):
+            pass
+        add_span('adafruit', 1.0)
+        return current_timings()
+
+    assert contextvars.Context().run(outside) is None
+
+
+def test_spans_attach_to_their_own_request():
+    def request(name):
+        timings = start_request()
+        with span(name):
+            pass
+        return timings
+
+    first = contextvars.Context().run(request, 'db-query')
+    second = contextvars.Context().run(request, 'hot-tier')
+
+    assert list(first.summary()) == ['db-query']
+    assert list(second.summary()) == ['hot-tier']
+
+
+def test_json_records_carry_extra_fields_and_tracebacks():
+    try:
+        raise ValueError('bad reading')
+    except ValueError:
+        exc_info = sys.exc_info()
+    record = logging.makeLogRecord({
+        'name': 'ingest', 'levelname': 'WARNING', 'msg': 'Rejected %d rows', 'args': (3,),
+        'exc_info': exc_info, 'sensor': 'temperature', 'day': datetime(2025, 12, 1)
+    })
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry['level'] == 'WARNING' and entry['logger'] == 'ingest'
+    assert entry['msg'] == 'Rejected 3 rows'
+    assert entry['sensor'] == 'temperature'
+    assert entry['day'] == '2025-12-01 00:00:00'
+    assert 'ValueError: bad reading' in entry['exc']
+    assert 'args' not in entry and 'exc_info' not in entry
+
+
+def test_flask_responses_report_server_timing(fake_db):
+    fake_db.results = [[{'timestamp': datetime(2025, 12, 1, 8, 0), 'value': 21.5}]]
+
+    response = app.app.test_client().get('/api/historical-data?date=2025-12-01')
+
+    parts = [part.split(';')[0] for part in response.headers['Server-Timing'].split(', ')]
+    assert 'db-query' in parts and 'serialize' in parts
+    assert parts[-1] == 'total'
@@ -0,0 +1,137 @@
+"""sync_checkpoints: resume after appends, start over after rewrites"""
+
+import os
+from datetime import datetime
+
+import pytest
+
+from db_schema import LOG_TYPES
+from sync_data import DataSync
+
+HEADER = b'timestamp,message\n'
+
+
+class CheckpointCursor:
+    """Keeps the one sync_checkpoints row the way PostgreSQL would"""
+
+    def __init__(self):
+        self.row = None  # (inode, byte_offset, mtime, last_timestamp, head_hash)
+
+    def execute(self, query, params=None):
+        if query.lstrip().startswith('INSERT INTO sync_checkpoints'):
+            _, inode, mtime, offset, last_timestamp, head_hash = params
+            self.row = (inode, offset, mtime, last_timestamp, head_hash)
+
+    def fetchone(self):
+        return self.row
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / '2025-12-01_temperature.csv'
+    path.write_bytes(HEADER + b'08:00:00,20.5\n08:00:05,20.6\n')
+    return path
+
+
+def sync_once(sync, cursor, path):
+    """Read what the checkpoint says is new, save the new checkpoint, return the lines read"""
+    state = sync.load_checkpoint(cursor, path)
+    lines = [raw.strip() for raw, _ in sync.read_new_records(path, state)]
+    sync.save_checkpoint(cursor, path, state)
+    return lines
+
+
+def touch_later(path):
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_resumes_after_appended_lines(log_file):
+    sync, cursor = DataSync(), CheckpointCursor()
+    assert sync_once(sync, cursor, log_file) == ['08:00:00,20.5', '08:00:05,20.6']
+
+    with open(log_file, 'ab') as f:
+        f.write(b'08:00:10,20.7\n')
+    touch_later(log_file)
+
+    assert sync_once(sync, cursor, log_file) == ['08:00:10,20.7']
+    assert sync_once(sync, cursor, log_file) == []
+
+
+def test_unfinished_last_line_waits_for_the_next_run(log_file):
+    sync, cursor = DataSync(), CheckpointCursor()
+    with open(log_file, 'ab') as f:
+        f.write(b'08:00:10,2')
+    assert sync_once(sync, cursor, log_file) == ['08:00:00,20.5', '08:00:05,20.6']
+
+    with open(log_file, 'ab') as f:
+        f.write(b'0.7\n')
+    assert sync_once(sync, cursor, log_file) == ['08:00:10,20.7']
+
+
+def test_truncated_file_is_read_from_the_start(log_file):
+    sync, cursor = DataSync(), CheckpointCursor()
+    sync_once(sync, cursor, log_file)
+    log_file.write_bytes(HEADER + b'09:00:00,1.0\n')
+
+    assert sync_once(sync, cursor, log_file) == ['09:00:00,1.0']
+
+
+def test_replaced_file_is_read_from_the_start(log_file, tmp_path):
+    sync, cursor = DataSync(), CheckpointCursor()
+    sync_once(sync, cursor, log_file)
+    replacement = tmp_path / 'new.csv'
+    replacement.write_bytes(HEADER + b'08:00:00,20.5\n08:00:05,20.6\n08:00:10,20.7\n')
+    os.replace(replacement, log_file)
+
+    assert len(sync_once(sync, cursor, log_file)) == 3
+
+
+def test_same_size_rewrite_is_read_again(log_file):
+    sync, cursor = DataSync(), CheckpointCursor()
+    sync_once(sync, cursor, log_file)
+    with open(log_file, 'r+b') as f:
+        f.write(HEADER + b'08:00:00,99.9\n')
+    touch_later(log_file)
+
+    assert sync_once(sync, cursor, log_file) == ['08:00:00,99.9', '08:00:05,20.6']
+
+
+def test_rewrite_that_grows_the_file_is_caught_by_the_head_hash(log_file):
+    sync, cursor = DataSync(), CheckpointCursor()
+    sync_once(sync, cursor, log_file)
+    with open(log_file, 'r+b') as f:
+        f.write(HEADER + b'08:00:00,99.9\n08:00:05,20.6\n08:00:10,20.7\n')
+    touch_later(log_file)
+
+    assert sync_once(sync, cursor, log_file) == ['08:00:00,99.9', '08:00:05,20.6', '08:00:10,20.7']
+
+
+def test_checkpoint_without_a_hash_still_resumes(log_file):
+    sync, cursor = DataSync(), CheckpointCursor()
+    sync_once(sync, cursor, log_file)
+    # As saved before migration 005
+    cursor.row = cursor.row[:4] + (None,)
+    with open(log_file, 'ab') as f:
+        f.write(b'08:00:10,20.7\n')
+
+    assert sync_once(sync, cursor, log_file) == ['08:00:10,20.7']
+
+
+def test_sync_file_commits_rows_and_checkpoint_together(pg_conn, log_file):
+    sync = DataSync()
+    sync.logs_dir = log_file.parent
+    log_type = LOG_TYPES['temperature']
+
+    assert sync.sync_file(pg_conn, log_file, '2025-12-01', log_type) == (2, 2)
+    assert sync.sync_file(pg_conn, log_file, '2025-12-01', log_type) == (0, 0)
+
+    with open(log_file, 'ab') as f:
+        f.write(b'08:00:10,20.7\nnot-a-time,1\n')
+    assert sync.sync_file(pg_conn, log_file, '2025-12-01', log_type) == (1, 1)
+
+    last_timestamp, = pg_conn.execute(
+        "SELECT last_timestamp FROM sync_checkpoints WHERE file_name = %s", (log_file.name,)
+    ).fetchone()
+    assert last_timestamp == datetime(2025, 12, 1, 8, 0, 10)
+    assert (log_file.parent / 'quarantine' / f'{log_file.stem}.rejected.csv').exists()
@@ -0,0 +1,84 @@
+"""COPY into staging, then INSERT ... ON CONFLICT into the real tables"""
+
+from datetime import datetime
+
+from db_schema import STAGING_SQL
+from sync_data import DataSync
+
+
+class RecordingCopy:
+    def __init__(self):
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def write_row(self, row):
+        self.rows.append(row)
+
+
+class RecordingCursor:
+    def __init__(self, inserted):
+        self.statements = []
+        self.copy_ = RecordingCopy()
+        self.rowcount = -1
+        self.inserted = inserted
+
+    def execute(self, query):
+        self.statements.append(query)
+        self.rowcount = self.inserted
+
+    def copy(self, statement):
+        self.statements.append(statement)
+        return self.copy_
+
+
+def test_rows_are_streamed_through_copy_then_merged_once():
+    cursor = RecordingCursor(inserted=2)
+    rows = ((datetime(2025, 12, 1, 8, 0, i), 'temperature', 20.0 + i, '°C') for i in range(3))
+
+    copied, synced = DataSync().copy_and_merge(cursor, *STAGING_SQL['sensor'], rows)
+
+    assert (copied, synced) == (3, 2)
+    assert len(cursor.copy_.rows) == 3
+    staging, copy, merge = cursor.statements
+    assert 'CREATE TEMP TABLE sensor_data_staging' in staging
+    assert copy.startswith('COPY sensor_data_staging')
+    assert 'ON CONFLICT (sensor_type, timestamp) DO NOTHING' in merge
+
+
+def test_merge_is_idempotent_in_postgres(pg_conn):
+    sync = DataSync()
+    rows = [(datetime(2025, 12, 1, 8, 0, i), 'temperature', 20.0 + i, '°C') for i in range(5)]
+
+    with pg_conn.transaction(), pg_conn.cursor() as cursor:
+        assert sync.copy_and_merge(cursor, *STAGING_SQL['sensor'], iter(rows)) == (5, 5)
+    # The staging table is dropped at commit, so a second run can create it again
+    with pg_conn.transaction(), pg_conn.cursor() as cursor:
+        assert sync.copy_and_merge(cursor, *STAGING_SQL['sensor'], iter(rows + [
+            (datetime(2025, 12, 1, 8, 1, 0), 'temperature', 30.0, '°C')
+        ])) == (6, 1)
+
+    assert pg_conn.execute("SELECT COUNT(*) FROM sensor_data").fetchone()[0] == 6
+    assert pg_conn.execute(
+        "SELECT reading_count FROM sensor_rollups WHERE grain = 'day'"
+    ).fetchone()[0] == 6
+
+
+def test_security_events_merge_on_the_hashed_key(pg_conn):
+    sync = DataSync()
+    long_details = 'x' * 10000
+    rows = [
+        (datetime(2025, 12, 1, 8, 0), 'state_change', 'System armed'),
+        (datetime(2025, 12, 1, 8, 5), 'alert', None),
+        (datetime(2025, 12, 1, 8, 9), 'alert', long_details)
+    ]
+
+    for _ in range(2):
+        with pg_conn.transaction(), pg_conn.cursor() as cursor:
+            sync.copy_and_merge(cursor, *STAGING_SQL['security'], iter(rows))
+
+    assert pg_conn.execute("SELECT COUNT(*) FROM security_events").fetchone()[0] == 3
@@ -0,0 +1,57 @@
+"""Date ranges pushed down to indexed [start, end) queries"""
+
+from datetime import datetime
+
+import pytest
+
+import app
+
+
+def test_date_range_is_half_open_over_whole_days():
+    assert app.parse_date_range('2025-12-01') == (datetime(2025, 12, 1), datetime(2025, 12, 2))
+    assert app.parse_date_range('2025-12-01', '2025-12-07') == (datetime(2025, 12, 1), datetime(2025, 12, 8))
+
+
+@pytest.mark.parametrize('start_date, end_date', [('2025-12-07', '2025-12-01'), ('12/01/2025', None)])
+def test_bad_date_ranges_are_rejected(start_date, end_date):
+    with pytest.raises(ValueError):
+        app.parse_date_range(start_date, end_date)
+
+
+def test_range_query_bounds_the_sensor_and_time():
+    query, params = app.sensor_range_query('humidity', datetime(2025, 12, 1), datetime(2025, 12, 2), limit=11)
+
+    assert 'timestamp >= %s' in query and 'timestamp < %s' in query
+    assert 'DATE(' not in query
+    assert params == ('humidity', datetime(2025, 12, 1), datetime(2025, 12, 2), 11)
+
+
+def test_historical_data_reads_only_the_requested_day(fake_db):
+    fake_db.results = [[
+        {'timestamp': datetime(2025, 12, 1, 8, 0, 0), 'value': 21.5},
+        {'timestamp': datetime(2025, 12, 1, 8, 0, 5), 'value': 21.75}
+    ]]
+    response = app.app.test_client().get('/api/historical-data?date=2025-12-01&sensor=temperature')
+
+    assert response.status_code == 200
+    assert response.get_json()['data'] == {'labels': ['08:00:00', '08:00:05'], 'values': [21.5, 21.75]}
+    (query, params), = fake_db.executed
+    assert params[:3] == ('temperature', datetime(2025, 12, 1), datetime(2025, 12, 2))
+
+
+def test_daily_averages_labels_multi_day_ranges_with_the_date(fake_db):
+    fake_db.results = [[{'timestamp': datetime(2025, 12, 2, 9, 30), 'value': 40}]]
+    response = app.app.test_client().get(
+        '/api/daily-averages?start_date=2025-12-01&end_date=2025-12-03&sensor=humidity'
+    )
+
+    assert response.get_json()['data']['labels'] == ['12-02 09:30']
+    (query, params), = fake_db.executed
+    assert params[1:3] == (datetime(2025, 12, 1), datetime(2025, 12, 4))
+
+
+def test_unknown_sensor_never_reaches_the_database(fake_db):
+    response = app.app.test_client().get('/api/historical-data?date=2025-12-01&sensor=pressure')
+
+    assert response.status_code == 400
+    assert fake_db.executed == []